@@ -0,0 +1,94 @@
+import sys
+import os
+import time
+import argparse
+import statistics
+
+# Setup Path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from backend.src import embeddings
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS_PATH = os.path.join(BASE_DIR, 'data', 'course_materials', 'CSE111_week01_project.txt')
+
+QUERIES = [
+    "How do I compute the volume of a tire?",
+    "The essay argues that computers help people stay in touch with friends.",
+    "Write the results to volumes.txt with the current date.",
+]
+
+def load_chunks(target):
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        text = f.read()
+    chunks = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200).split_text(text)
+    # Repeat the corpus to get a stable measurement
+    return (chunks * (target // len(chunks) + 1))[:target]
+
+def bench_backend(backend, chunks, batch_size, reference):
+    start = time.perf_counter()
+    model = embeddings.build_embeddings(backend, batch_size=batch_size)
+    model.embed_query("warm-up")
+    load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    model.embed_documents(chunks)
+    ingest_time = time.perf_counter() - start
+
+    latencies = []
+    for i in range(30):
+        start = time.perf_counter()
+        model.embed_query(QUERIES[i % len(QUERIES)])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    min_cosine = embeddings.parity(model, reference, embeddings.PARITY_PROBES + chunks[:20]) if reference else 1.0
+    return {
+        "backend": backend,
+        "load": load_time,
+        "chunks_per_sec": len(chunks) / ingest_time,
+        "query_p50": statistics.median(latencies),
+        "min_cosine": min_cosine,
+        "model": model
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare embedding backends for all-MiniLM-L6-v2.")
+    parser.add_argument("--backends", default=",".join(embeddings.BACKENDS))
+    parser.add_argument("--chunks", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=embeddings.EMBEDDING_BATCH_SIZE)
+    args = parser.parse_args()
+
+    chunks = load_chunks(args.chunks)
+    backends = args.backends.split(",")
+    results = []
+    reference = None
+
+    # torch runs first so the others can be checked against it
+    for backend in sorted(backends, key=lambda b: b != "torch"):
+        print(f"Benchmarking '{backend}' on {len(chunks)} chunks (batch size {args.batch_size})...")
+        try:
+            result = bench_backend(backend, chunks, args.batch_size, reference)
+        except Exception as e:
+            print(f"Skipping '{backend}': {e}")
+            continue
+        if backend == "torch":
+            reference = result["model"]
+        results.append(result)
+
+    if "onnx-int8" in backends:
+        print(f"\nonnx-int8 file: {embeddings.onnx_int8_file()}")
+    print("\n### Embedding Backends")
+    print(f"| Backend | Load (s) | Chunks/sec | Query p50 (ms) | Min cosine vs torch | Within {embeddings.PARITY_MIN_COSINE} |")
+    print("|---------|----------|------------|----------------|---------------------|------|")
+    failed = False
+    for r in results:
+        ok = r["min_cosine"] >= embeddings.PARITY_MIN_COSINE
+        failed = failed or not ok
+        print(f"| {r['backend']} | {r['load']:.1f} | {r['chunks_per_sec']:.1f} | {r['query_p50']:.1f} | {r['min_cosine']:.4f} | {'yes' if ok else 'NO'} |")
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import httpx
+import asyncio
+import argparse
+import os
+import time
+
+# Measures /extract-text throughput when many uploads arrive at once.
+# All concurrent uploads share the same filename on purpose: extraction must not
+# depend on a shared temp path.
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_URL = "http://127.0.0.1:8000/extract-text"
+DEFAULT_FILES = [
+    os.path.join(BASE_DIR, 'data', 'course_materials', 'CSE111_week01_project.txt'),
+    os.path.join(BASE_DIR, 'data', 'rubrics', 'CSE111_week1_project_rubric - Sheet1.csv'),
+]
+
+async def upload(client, semaphore, filename, content, expected_length):
+    async with semaphore:
+        try:
+            response = await client.post(API_URL, files={"file": (filename, content)})
+            response.raise_for_status()
+            # A mismatched length means another upload's content leaked into this one
+            return len(response.json()["text"]) == expected_length
+        except Exception as e:
+            print(f"Upload failed: {e!r}")
+            return False
+
+async def run_level(client, concurrency, total, samples):
+    semaphore = asyncio.Semaphore(concurrency)
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(*[
+        upload(client, semaphore, *samples[i % len(samples)]) for i in range(total)
+    ])
+    elapsed = time.perf_counter() - start
+    ok = sum(1 for o in outcomes if o)
+    return concurrency, ok, total - ok, elapsed, ok / elapsed if elapsed > 0 else 0.0
+
+async def main(paths, levels, total):
+    async with httpx.AsyncClient(timeout=120.0) as client:
+        # Reference lengths from a single serial upload of each file
+        samples = []
+        for path in paths:
+            with open(path, "rb") as f:
+                content = f.read()
+            ext = os.path.splitext(path)[1]
+            response = await client.post(API_URL, files={"file": (f"essay{ext}", content)})
+            response.raise_for_status()
+            samples.append((f"essay{ext}", content, len(response.json()["text"])))
+
+        results = []
+        for concurrency in levels:
+            print(f"Uploading {total} files at concurrency {concurrency}...")
+            results.append(await run_level(client, concurrency, total, samples))
+
+    print("\n### /extract-text Throughput")
+    print("| Concurrency | OK | Failed/Mismatched | Wall Time (s) | Files/sec |")
+    print("|-------------|----|-------------------|---------------|-----------|")
+    for concurrency, ok, failed, elapsed, rate in results:
+        print(f"| {concurrency} | {ok} | {failed} | {elapsed:.2f} | {rate:.1f} |")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent load benchmark for /extract-text.")
+    parser.add_argument("files", nargs="*", default=DEFAULT_FILES, help="Files to upload (PDF, DOCX, TXT, CSV, XLSX)")
+    parser.add_argument("--levels", default="1,8,32")
+    parser.add_argument("--requests", type=int, default=200, help="Uploads per concurrency level")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.files, [int(level) for level in args.levels.split(",")], args.requests))
@@ -0,0 +1,73 @@
+import sys
+import os
+import time
+import asyncio
+import argparse
+
+# Measures tail latency of LLM calls with and without request hedging.
+# Run against backend/scripts/fake_openai_server.py with stragglers, e.g.:
+#   python backend/scripts/fake_openai_server.py --error-rate 0 --latency 0.3 --slow-rate 0.03 --slow-latency 8
+#   LLM_BASE_URL=http://127.0.0.1:8001 DEEPSEEK_API_KEY=fake python backend/scripts/bench_hedging.py
+
+# Setup Path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from langchain_core.messages import HumanMessage
+from backend.src import llm_cache, hedging, llm_gateway
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[int(p / 100 * (len(ordered) - 1))]
+
+async def call(llm, index, semaphore, latencies):
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            await llm_cache.ainvoke_cached(
+                llm, [HumanMessage(content=f"Request {index}: write one sentence of feedback.")], "bench-hedging",
+                use_cache=False, hedge=True
+            )
+        except Exception as e:
+            print(f"Request {index} failed: {e!r}")
+            return
+        latencies.append(time.perf_counter() - start)
+
+async def run(llm, total, concurrency, hedge):
+    hedging.HEDGE_ENABLED = hedge
+    before = hedging.stats()
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    await asyncio.gather(*[call(llm, i, semaphore, latencies) for i in range(total)])
+    after = hedging.stats()
+    hedged = after["hedged"] - before["hedged"]
+    return {
+        "mode": "hedged" if hedge else "plain",
+        "ok": len(latencies),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies),
+        "hedged": hedged,
+        "wins": after["hedge_wins"] - before["hedge_wins"],
+        "extra": hedged / total
+    }
+
+async def main(total, concurrency):
+    llm = llm_gateway.get_llm()
+    results = [await run(llm, total, concurrency, False), await run(llm, total, concurrency, True)]
+
+    print(f"\n### Request Hedging (p{hedging.HEDGE_PERCENTILE:g} delay, max {hedging.HEDGE_MAX_EXTRA_PERCENT:g}% extra load)")
+    print("| Mode | OK | p50 (s) | p95 (s) | p99 (s) | Max (s) | Hedged | Hedge Wins | Extra Load |")
+    print("|------|----|---------|---------|---------|---------|--------|------------|------------|")
+    for r in results:
+        print(f"| {r['mode']} | {r['ok']} | {r['p50']:.2f} | {r['p95']:.2f} | {r['p99']:.2f} | {r['max']:.2f} | "
+              f"{r['hedged']} | {r['wins']} | {r['extra']:.1%} |")
+    print(f"\nHedge delays: {hedging.stats()['delay_seconds']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tail latency with and without hedged LLM requests.")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.requests, args.concurrency))
@@ -0,0 +1,50 @@
+import sys
+import os
+import time
+import asyncio
+import argparse
+
+# Fires concurrent chat completions through the shared LLM gateway and reports how many
+# succeed, how many retries were needed and the request rate achieved.
+# Run against backend/scripts/fake_openai_server.py, e.g.:
+#   python backend/scripts/fake_openai_server.py --rpm 120 --error-rate 0.2
+#   LLM_BASE_URL=http://127.0.0.1:8001 DEEPSEEK_API_KEY=fake LLM_RPM=110 python backend/scripts/bench_llm_gateway.py
+# --tier cheap exercises the cascade's cheap model (CASCADE_CHEAP_* settings) instead.
+
+# Setup Path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from langchain_core.messages import HumanMessage
+from backend.src import llm_gateway
+
+async def call(llm, index):
+    try:
+        await llm.ainvoke([HumanMessage(content=f"Request {index}: write one sentence of feedback.")])
+        return True
+    except Exception as e:
+        print(f"Request {index} failed: {e!r}")
+        return False
+
+async def main(total, tier):
+    llm = llm_gateway.get_llm(tier)
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(*[call(llm, i) for i in range(total)])
+    elapsed = time.perf_counter() - start
+    stats = llm_gateway.stats()[tier]
+
+    print("\n### LLM Gateway")
+    print("| Requests | OK | Failed | Retries | Wall Time (s) | Achieved RPM | RPM Limit | Throttled (s, all callers) |")
+    print("|----------|----|--------|---------|---------------|--------------|-----------|----------------------------|")
+    ok = sum(outcomes)
+    print(f"| {total} | {ok} | {total - ok} | {stats['retries']} | {elapsed:.1f} | {ok / elapsed * 60:.0f} | {stats['rpm_limit']} | {stats['throttled_seconds']:.1f} |")
+    print(f"\nHTTP status counts: {stats['status_counts']}")
+    if ok < total:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test for the shared LLM gateway.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--tier", choices=["strong", "cheap"], default="strong")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.requests, args.tier))
@@ -0,0 +1,89 @@
+import sys
+import os
+import time
+import random
+import argparse
+import statistics
+
+# Setup Path (run from the repository root so CHROMA_PATH resolves)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from backend.src import rag, context_cache
+from backend.src.models import RubricItem
+
+# Synthetic long submissions: passages copied from several ingested chunks, spread
+# through filler text. A retrieval "finds" a passage if it returns the chunk it came from.
+
+FILLER = ("In this part of the report I describe my process, what I tried first and how I "
+          "tested the program before moving on to the next requirement. ")
+
+def build_submissions(chunks, count, passages, filler_words, seed):
+    rng = random.Random(seed)
+    filler = (FILLER * (filler_words // len(FILLER.split()) + 1)).split()[:filler_words]
+    submissions = []
+    for _ in range(count):
+        sources = rng.sample(chunks, passages)
+        parts = []
+        for chunk in sources:
+            words = chunk.split()
+            start = rng.randint(0, max(len(words) - 60, 0))
+            parts.append(" ".join(filler))
+            parts.append(" ".join(words[start:start + 60]))
+        submissions.append((" ".join(parts), sources))
+    return submissions
+
+# Only used to key the assignment context when CONTEXT_CACHE_ENABLED is set
+RUBRIC = [RubricItem(criteria="Requirements", max_points=10, description="The program meets the assignment's requirements.")]
+
+def run_mode(submissions, multi_query, hybrid):
+    rag.RETRIEVAL_MULTI_QUERY = multi_query
+    rag.HYBRID_RETRIEVAL = hybrid
+    context_cache.invalidate()
+    latencies, recalls = [], []
+    for text, sources in submissions:
+        start = time.perf_counter()
+        # The retrieval the grading graph's retrieve node runs
+        retrieved = rag.retrieve_submission_context(text, RUBRIC)
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(sum(1 for chunk in sources if chunk in retrieved) / len(sources))
+    return latencies, recalls
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall and latency of single-query, multi-vector and hybrid retrieval on long submissions.")
+    parser.add_argument("--submissions", type=int, default=30)
+    parser.add_argument("--passages", type=int, default=3, help="Source chunks quoted per submission (retrieval returns 3)")
+    parser.add_argument("--filler-words", type=int, default=250, help="Filler words before each passage")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    chunks = rag.get_vector_store().get(include=["documents"])["documents"]
+    if len(chunks) < args.passages:
+        print("Error: not enough ingested chunks. Ingest course materials first.")
+        sys.exit(1)
+
+    print("Loading embedding model...")
+    rag.get_embedding_function().embed_query("warm-up")
+    submissions = build_submissions(chunks, args.submissions, args.passages, args.filler_words, args.seed)
+    words = statistics.mean(len(text.split()) for text, _ in submissions)
+    print(f"{len(submissions)} submissions, ~{words:.0f} words each, {args.passages} quoted passages")
+
+    rows = []
+    modes = (
+        ("Single query (before)", False, False),
+        (f"Multi-vector, <= {rag.MAX_QUERY_CHUNKS} windows", True, False),
+        ("Multi-vector + BM25 (hybrid)", True, True),
+    )
+    for name, multi_query, hybrid in modes:
+        run_mode(submissions[:1], multi_query, hybrid)
+        latencies, recalls = run_mode(submissions, multi_query, hybrid)
+        rows.append((name, statistics.mean(recalls), statistics.median(latencies), sorted(latencies)[int(len(latencies) * 0.95) - 1]))
+
+    path = "cached assignment context" + (" + refine" if rag.CONTEXT_REFINE else "") if context_cache.CONTEXT_CACHE_ENABLED else "per-submission search"
+    print(f"\n### Retrieval on Long Submissions ({path})")
+    print("| Mode | Recall@3 | p50 (ms) | p95 (ms) |")
+    print("|------|----------|----------|----------|")
+    for name, recall, p50, p95 in rows:
+        print(f"| {name} | {recall:.2f} | {p50:.1f} | {p95:.1f} |")
+
+if __name__ == "__main__":
+    main()
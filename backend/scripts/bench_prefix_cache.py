@@ -0,0 +1,59 @@
+import sys
+import os
+import random
+import asyncio
+import argparse
+
+# Grades a batch of synthetic submissions against one rubric and reports how much of
+# each prompt the provider served from its prefix cache (cached_input_tokens).
+# Run against backend/scripts/fake_openai_server.py, which emulates DeepSeek's context cache:
+#   python backend/scripts/fake_openai_server.py --error-rate 0 --latency 0.1
+#   LLM_BASE_URL=http://127.0.0.1:8001 DEEPSEEK_API_KEY=fake LLM_CACHE_ENABLED=false python backend/scripts/bench_prefix_cache.py
+
+# Setup Path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from backend.src import agent, llm_gateway
+from backend.src.models import RubricItem
+
+RUBRIC = [
+    RubricItem(criteria="Thesis", max_points=4, description="States a clear, arguable thesis in the introduction and keeps every paragraph tied to it."),
+    RubricItem(criteria="Evidence", max_points=6, description="Supports each claim with specific, relevant evidence from the reading, quoted or paraphrased accurately and cited."),
+    RubricItem(criteria="Analysis", max_points=6, description="Explains how the evidence supports the thesis rather than summarising it, and addresses at least one counter-argument."),
+    RubricItem(criteria="Organization", max_points=4, description="Paragraphs follow a logical order with topic sentences and transitions; the conclusion synthesises rather than repeats."),
+]
+
+WORDS = ("the argument evidence author claims shows because therefore however reading suggests community history "
+         "policy students support example quote clearly result effect cause change society").split()
+
+def essay(seed, words):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(words)) + "."
+
+async def main(total, words, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def grade(i):
+        async with semaphore:
+            inputs = {**agent.build_inputs(essay(i, words), RUBRIC, use_cache=False), "skip_rag": True}
+            return (await agent.app.ainvoke(inputs))["grade_result"].metrics
+
+    metrics = await asyncio.gather(*[grade(i) for i in range(total)])
+    prompt_tokens = sum(m["input_tokens"] for m in metrics)
+    cached = sum(m["cached_input_tokens"] for m in metrics)
+    gateway = llm_gateway.stats()["strong"]
+
+    print(f"\n### Provider Prefix Cache ({agent.GRADER_PROMPT_VERSION})")
+    print("| Grades | LLM Calls | Prompt Tokens | Cached Tokens | Hit Rate | Non-streamed Hit Rate (gateway) |")
+    print("|--------|-----------|---------------|---------------|----------|---------------------------------|")
+    print(f"| {total} | {sum(m['llm_calls'] for m in metrics)} | {prompt_tokens} | {cached} | "
+          f"{cached / prompt_tokens if prompt_tokens else 0:.1%} | {gateway['prefix_cache_hit_rate']:.1%} |")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Provider prefix-cache hit rate over a grading batch.")
+    parser.add_argument("--submissions", type=int, default=20)
+    parser.add_argument("--words", type=int, default=400, help="Words per synthetic submission")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.submissions, args.words, args.concurrency))
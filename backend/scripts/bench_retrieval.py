@@ -0,0 +1,68 @@
+import sys
+import os
+import time
+import argparse
+import statistics
+
+# Setup Path (run from the repository root so CHROMA_PATH resolves)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from langchain_chroma import Chroma
+from backend.src import rag
+
+QUERIES = [
+    "How do I compute the volume of a tire?",
+    "What is the formula using width, aspect ratio and wheel diameter?",
+    "Write a program that appends results to a text file.",
+    "How should the program round the volume?",
+    "What does the assignment say about the current date?"
+]
+
+def retrieve_with_fresh_client(query):
+    """
+    Previous behaviour: a new Chroma client is opened for every query.
+    """
+    vector_store = Chroma(
+        persist_directory=rag.CHROMA_PATH,
+        embedding_function=rag.get_embedding_function()
+    )
+    return vector_store.similarity_search(query, k=3)
+
+def time_queries(fn, iterations):
+    latencies = []
+    for i in range(iterations):
+        query = QUERIES[i % len(QUERIES)]
+        start = time.perf_counter()
+        fn(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+def summarize(name, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    return f"| {name} | {statistics.mean(latencies):.1f} | {statistics.median(latencies):.1f} | {p95:.1f} |"
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-query retrieval latency: fresh client vs shared handle.")
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    print("Loading embedding model...")
+    rag.get_embedding_function().embed_query("warm-up")
+
+    # Warm both paths once so model loading is not counted
+    retrieve_with_fresh_client(QUERIES[0])
+    rag.retrieve_context(QUERIES[0])
+
+    print(f"Timing {args.iterations} queries per mode...")
+    fresh = time_queries(retrieve_with_fresh_client, args.iterations)
+    shared = time_queries(rag.retrieve_context, args.iterations)
+
+    print("\n### Retrieval Latency (ms)")
+    print("| Mode | Mean | p50 | p95 |")
+    print("|------|------|-----|-----|")
+    print(summarize("Fresh client per query (before)", fresh))
+    print(summarize("Shared process-wide handle (after)", shared))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import sys
+import os
+
+# Offline compaction: stop the API first, since a running server keeps handles to the
+# replaced collection. To compact a running server use POST /admin/compact-chroma instead.
+# Setup Path (run from the repository root so CHROMA_PATH resolves)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from backend.src import rag
+
+def main():
+    print(f"Compacting Chroma collection at {rag.CHROMA_PATH}...")
+    report = rag.compact_collection()
+
+    shrink = report["bytes_before"] - report["bytes_after"]
+    pct = (shrink / report["bytes_before"] * 100) if report["bytes_before"] else 0.0
+
+    print("\n### Compaction Report")
+    print(f"- Chunks: {report['chunks_before']} -> {report['chunks_after']} ({report['duplicates_removed']} duplicates removed)")
+    print(f"- On-disk size: {report['bytes_before'] / 1e6:.2f} MB -> {report['bytes_after'] / 1e6:.2f} MB ({pct:.1f}% smaller)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import pandas as pd
+import httpx
+import asyncio
+import json
+import os
+import time
+import argparse
+import statistics
+
+# Grades the ASAP benchmark with each grading profile and compares latency,
+# token use and accuracy. The LLM response cache is bypassed so every grade is a real call.
+# A "+fanout" suffix (e.g. "standard+fanout") scores each rubric item in its own parallel call;
+# "+cascade" grades with the cheap model first (e.g. compare "standard" with "standard+cascade").
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_PATH = os.path.join(BASE_DIR, 'data', 'asap_benchmark.csv')
+API_URL = "http://127.0.0.1:8000/grade"
+
+async def grade(client, row, profile):
+    payload = {
+        "submission_text": row['essay'],
+        "rubric": json.loads(row['rubric']) if isinstance(row['rubric'], str) else row['rubric'],
+        "student_id": str(row['essay_id']),
+        "use_cache": False,
+        "profile": profile.split("+")[0],
+        "criterion_fanout": "+fanout" in profile,
+        "cascade": "+cascade" in profile
+    }
+    start = time.perf_counter()
+    try:
+        response = await client.post(API_URL, json=payload)
+        response.raise_for_status()
+    except Exception as e:
+        print(f"Error grading essay {row['essay_id']} ({profile}): {e!r}")
+        return None
+    return time.perf_counter() - start, response.json()
+
+async def run_profile(client, df, profile):
+    print(f"Grading {len(df)} essays with the '{profile}' profile...")
+    latencies, errors, llm_calls, input_tokens, output_tokens, cached_tokens, costs, escalated = [], [], [], [], [], [], [], []
+    failed = 0
+    for _, row in df.iterrows():
+        outcome = await grade(client, row, profile)
+        if outcome is None:
+            failed += 1
+            continue
+        latency, result = outcome
+        metrics = result.get('metrics', {})
+        latencies.append(latency)
+        errors.append(abs(result.get('score', 0) - row['human_score_normalized']))
+        llm_calls.append(metrics.get('llm_calls', 0))
+        input_tokens.append(metrics.get('input_tokens', 0))
+        output_tokens.append(metrics.get('output_tokens', 0))
+        cached_tokens.append(metrics.get('cached_input_tokens', 0))
+        costs.append(metrics.get('cost_usd', 0.0))
+        escalated.append(metrics.get('escalated', 0))
+
+    if not latencies:
+        return {"profile": profile, "graded": 0, "failed": failed}
+    return {
+        "profile": profile,
+        "graded": len(latencies),
+        "failed": failed,
+        "mean": statistics.mean(latencies),
+        "p95": sorted(latencies)[int(0.95 * (len(latencies) - 1))],
+        "llm_calls": statistics.mean(llm_calls),
+        "input_tokens": statistics.mean(input_tokens),
+        "output_tokens": statistics.mean(output_tokens),
+        "cached_share": sum(cached_tokens) / sum(input_tokens) if sum(input_tokens) else 0.0,
+        "cost": sum(costs),
+        "escalated": statistics.mean(escalated),
+        "mae": statistics.mean(errors)
+    }
+
+async def main(profiles, limit):
+    if not os.path.exists(DATA_PATH):
+        print(f"Error: {DATA_PATH} not found. Run prepare_asap.py first.")
+        return
+    df = pd.read_csv(DATA_PATH)
+    if limit:
+        df = df.head(limit)
+
+    async with httpx.AsyncClient(timeout=300.0) as client:
+        results = [await run_profile(client, df, profile) for profile in profiles]
+
+    print("\n### Grading Profiles")
+    print("| Profile | Graded | Failed | Mean Latency (s) | p95 Latency (s) | LLM Calls | Input Tokens | Cached Input | Output Tokens | Cost ($) | Escalated | MAE |")
+    print("|---------|--------|--------|------------------|-----------------|-----------|--------------|--------------|---------------|----------|-----------|-----|")
+    for r in results:
+        if not r["graded"]:
+            print(f"| {r['profile']} | 0 | {r['failed']} | - | - | - | - | - | - | - | - | - |")
+            continue
+        print(f"| {r['profile']} | {r['graded']} | {r['failed']} | {r['mean']:.2f} | {r['p95']:.2f} | {r['llm_calls']:.2f} | "
+              f"{r['input_tokens']:.0f} | {r['cached_share']:.0%} | {r['output_tokens']:.0f} | {r['cost']:.4f} | {r['escalated']:.0%} | {r['mae']:.2f} |")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the standard and fast grading profiles on the ASAP benchmark.")
+    parser.add_argument("--profiles", default="standard,fast", help="Comma-separated, e.g. standard,fast,standard+fanout,standard+cascade")
+    parser.add_argument("--limit", type=int, default=0, help="Only grade the first N essays")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.profiles.split(","), args.limit))
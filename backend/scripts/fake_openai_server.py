@@ -0,0 +1,131 @@
+import json
+import time
+import hashlib
+import random
+import asyncio
+import argparse
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Minimal OpenAI-compatible chat completions server for testing the LLM gateway.
+# Enforces its own requests-per-minute limit (429 with Retry-After) and injects
+# random 500s and stragglers (slow responses), like a busy provider. Prompt prefixes
+# seen before are reported as cached tokens, like DeepSeek's context cache (GET /stats
+# shows the totals). Point the backend at it with:
+#   LLM_BASE_URL=http://127.0.0.1:8001 DEEPSEEK_API_KEY=fake uvicorn backend.src.main:app
+
+app = FastAPI()
+settings = {"rpm": 300, "error_rate": 0.1, "latency": 0.5, "slow_rate": 0.0, "slow_latency": 10.0, "bad_json_rate": 0.0}
+_window = []
+# Hashes of every prompt prefix seen, in blocks of PREFIX_BLOCK_TOKENS (4 chars per token)
+PREFIX_BLOCK_TOKENS = 64
+_prefixes = set()
+_totals = {"requests": 0, "prompt_tokens": 0, "cached_prompt_tokens": 0}
+
+GRADE = {
+    "criteria_scores": [],
+    "critique_points": ["The argument needs more supporting evidence."],
+    "feedback": "✅ **Rubric Strengths**: clear structure.\n\n💡 **Guidance**: What evidence would convince a skeptical reader?"
+}
+
+def _over_limit() -> bool:
+    now = time.monotonic()
+    while _window and now - _window[0] > 60:
+        _window.pop(0)
+    if len(_window) >= settings["rpm"]:
+        return True
+    _window.append(now)
+    return False
+
+def _prefix_cache_hits(body: dict) -> int:
+    # Tokens of the longest run of whole leading blocks that an earlier prompt also started with
+    text = "".join(f"{m.get('role')}:{m.get('content')}\n" for m in body.get("messages", []))
+    block = PREFIX_BLOCK_TOKENS * 4
+    digest = hashlib.sha256()
+    hits = 0
+    hitting = True
+    for start in range(0, len(text) - block + 1, block):
+        digest.update(text[start:start + block].encode("utf-8"))
+        key = digest.copy().hexdigest()
+        if hitting and key in _prefixes:
+            hits += PREFIX_BLOCK_TOKENS
+        else:
+            hitting = False
+            _prefixes.add(key)
+    return hits
+
+def _reply(body: dict) -> str:
+    # JSON mode gets a grade that scores every rubric item named in the prompt
+    if (body.get("response_format") or {}).get("type") == "json_object":
+        if random.random() < settings["bad_json_rate"]:
+            return '{"criteria_scores": ['
+        prompt = body["messages"][-1]["content"]
+        names = [line.split("- ", 1)[1].split(" (Max Points")[0] for line in prompt.splitlines() if "(Max Points" in line and "- " in line]
+        return json.dumps({**GRADE, "criteria_scores": [{"criteria": n, "score": 1, "comment": "Partially met."} for n in names]})
+    return GRADE["feedback"]
+
+@app.post("/chat/completions")
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    if _over_limit():
+        return JSONResponse({"error": {"message": "Rate limit reached", "type": "rate_limit"}}, status_code=429, headers={"Retry-After": "1"})
+    if random.random() < settings["error_rate"]:
+        return JSONResponse({"error": {"message": "Internal error", "type": "server_error"}}, status_code=500)
+    slow = random.random() < settings["slow_rate"]
+    await asyncio.sleep(settings["slow_latency"] if slow else settings["latency"])
+
+    content = _reply(body)
+    prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+    hits = min(_prefix_cache_hits(body), prompt_tokens)
+    usage = {
+        "prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4, "total_tokens": prompt_tokens + len(content) // 4,
+        "prompt_cache_hit_tokens": hits, "prompt_cache_miss_tokens": prompt_tokens - hits,
+        "prompt_tokens_details": {"cached_tokens": hits}
+    }
+    _totals["requests"] += 1
+    _totals["prompt_tokens"] += prompt_tokens
+    _totals["cached_prompt_tokens"] += hits
+    created = int(time.time())
+
+    if body.get("stream"):
+        async def events():
+            for i in range(0, len(content), 16):
+                chunk = {"id": "fake", "object": "chat.completion.chunk", "created": created, "model": body.get("model"),
+                         "choices": [{"index": 0, "delta": {"role": "assistant", "content": content[i:i + 16]}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+            done = {"id": "fake", "object": "chat.completion.chunk", "created": created, "model": body.get("model"),
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            yield f"data: {json.dumps(done)}\n\n"
+            if (body.get("stream_options") or {}).get("include_usage"):
+                final = {"id": "fake", "object": "chat.completion.chunk", "created": created, "model": body.get("model"),
+                         "choices": [], "usage": usage}
+                yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return {
+        "id": "fake", "object": "chat.completion", "created": created, "model": body.get("model"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": usage
+    }
+
+@app.get("/stats")
+async def stats():
+    return {**_totals, "prefix_cache_hit_rate": _totals["cached_prompt_tokens"] / _totals["prompt_tokens"] if _totals["prompt_tokens"] else 0.0}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible server with rate limits and injected errors.")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--rpm", type=int, default=settings["rpm"], help="Requests per minute before answering 429")
+    parser.add_argument("--error-rate", type=float, default=settings["error_rate"], help="Fraction of requests answered with 500")
+    parser.add_argument("--latency", type=float, default=settings["latency"], help="Seconds per completion")
+    parser.add_argument("--slow-rate", type=float, default=settings["slow_rate"], help="Fraction of requests that straggle")
+    parser.add_argument("--slow-latency", type=float, default=settings["slow_latency"], help="Seconds per straggling completion")
+    parser.add_argument("--bad-json-rate", type=float, default=settings["bad_json_rate"], help="Fraction of JSON-mode replies that are cut off")
+    args = parser.parse_args()
+    settings.update(rpm=args.rpm, error_rate=args.error_rate, latency=args.latency,
+                    slow_rate=args.slow_rate, slow_latency=args.slow_latency, bad_json_rate=args.bad_json_rate)
+
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
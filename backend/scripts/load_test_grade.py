@@ -0,0 +1,99 @@
+import httpx
+import asyncio
+import argparse
+import statistics
+import time
+
+# Sends grading requests at increasing concurrency levels and reports
+# throughput. With the async graph, requests/sec should grow with concurrency
+# until the LLM provider (not the API worker) becomes the bottleneck.
+# Requests bypass the LLM response cache, otherwise every request after the
+# first would be a cache hit and measure nothing.
+
+API_URL = "http://127.0.0.1:8000/grade"
+
+SAMPLE_RUBRIC = [
+    {"criteria": "Thesis", "max_points": 4, "description": "Clear, arguable thesis statement."},
+    {"criteria": "Evidence", "max_points": 4, "description": "Claims are supported with relevant examples."},
+    {"criteria": "Organization", "max_points": 2, "description": "Logical structure with clear transitions."}
+]
+
+SAMPLE_SUBMISSION = """
+Computers have changed the way people live. I think computers are good for society because they let
+people talk to friends far away, learn new things online and do their jobs faster. For example my
+mom uses a computer to work from home. However some people spend too much time on them and do not
+exercise. In conclusion computers help more than they hurt if people use them wisely.
+"""
+
+async def send_request(client, semaphore, index, latencies):
+    payload = {
+        "submission_text": SAMPLE_SUBMISSION,
+        "rubric": SAMPLE_RUBRIC,
+        "student_id": f"load_test_{index}",
+        "use_cache": False
+    }
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            response = await client.post(API_URL, json=payload)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+            return True
+        except Exception as e:
+            print(f"Request {index} failed: {e!r}")
+            return False
+
+async def run_level(client, concurrency, total_requests):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(*[
+        send_request(client, semaphore, i, latencies) for i in range(total_requests)
+    ])
+    elapsed = time.perf_counter() - start
+
+    succeeded = sum(1 for ok in outcomes if ok)
+    return {
+        "concurrency": concurrency,
+        "succeeded": succeeded,
+        "failed": total_requests - succeeded,
+        "elapsed": elapsed,
+        "throughput": succeeded / elapsed if elapsed > 0 else 0.0,
+        "p50": statistics.median(latencies) if latencies else 0.0,
+        "max": max(latencies) if latencies else 0.0
+    }
+
+async def run_load_test(levels, requests_per_level):
+    results = []
+    async with httpx.AsyncClient(timeout=180.0) as client:
+        for concurrency in levels:
+            print(f"Running {requests_per_level} requests at concurrency {concurrency}...")
+            results.append(await run_level(client, concurrency, requests_per_level))
+
+    output_lines = []
+    output_lines.append("### /grade Load Test")
+    output_lines.append("| Concurrency | OK | Failed | Wall Time (s) | Throughput (req/s) | p50 Latency (s) | Max Latency (s) |")
+    output_lines.append("|-------------|----|--------|---------------|--------------------|-----------------|-----------------|")
+    for r in results:
+        output_lines.append(
+            f"| {r['concurrency']} | {r['succeeded']} | {r['failed']} | {r['elapsed']:.1f} | "
+            f"{r['throughput']:.2f} | {r['p50']:.1f} | {r['max']:.1f} |"
+        )
+
+    baseline = results[0]["throughput"] if results else 0.0
+    if baseline > 0:
+        output_lines.append("")
+        for r in results[1:]:
+            output_lines.append(f"- Concurrency {r['concurrency']}: {r['throughput'] / baseline:.1f}x the throughput of concurrency {results[0]['concurrency']}")
+
+    print("\n" + "\n".join(output_lines))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrency load test for the /grade endpoint.")
+    parser.add_argument("--levels", default="1,4,16,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=32, help="Requests sent per concurrency level")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.levels.split(",")]
+    asyncio.run(run_load_test(levels, args.requests))
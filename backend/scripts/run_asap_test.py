@@ -4,20 +4,27 @@ import asyncio
 import json
 import os
 import sys
+import argparse
 
 # Paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_PATH = os.path.join(BASE_DIR, 'data', 'asap_benchmark.csv')
 
 API_URL = "http://127.0.0.1:8000/grade"
+BATCH_URL = "http://127.0.0.1:8000/grade/batch"
+POLL_INTERVAL = 5.0
 
-async def grade_essay(client, essay_id, text, rubric):
+async def grade_essay(client, essay_id, text, rubric, profile="standard", cascade=None):
     try:
         payload = {
             "submission_text": text,
             "rubric": json.loads(rubric) if isinstance(rubric, str) else rubric,
-            "student_id": str(essay_id)
+            "student_id": str(essay_id),
+            "profile": profile
         }
+        if cascade is not None:
+            # Only when asked for: otherwise the server's CASCADE_ENABLED default applies
+            payload["cascade"] = cascade
         
         response = await client.post(API_URL, json=payload)
         response.raise_for_status()
@@ -28,7 +35,74 @@ async def grade_essay(client, essay_id, text, rubric):
         traceback.print_exc()
         return None
 
-async def run_benchmark():
+async def grade_batch(client, df, concurrency, profile="standard", cascade=None):
+    """
+    Submits the essays as /grade/batch jobs, one per distinct rubric (ASAP spans several
+    essay sets), and polls until they all finish.
+    Returns a dict of essay_id -> GradeResult (or None on failure).
+    """
+    groups = [group for _, group in df.groupby("rubric", sort=False)]
+    if len(groups) > 1:
+        print(f"{len(groups)} different rubrics: submitting one batch job per rubric")
+    results = {}
+    for job_results in await asyncio.gather(*[grade_batch_job(client, group, concurrency, profile, cascade) for group in groups]):
+        results.update(job_results)
+    return results
+
+async def grade_batch_job(client, df, concurrency, profile="standard", cascade=None):
+    """
+    Submits essays that share one rubric as a single /grade/batch job and polls until it finishes.
+    The job survives API restarts; re-running the script reuses essays already graded.
+    """
+    rubric = df.iloc[0]['rubric']
+    payload = {
+        "submissions": [{"text": row['essay'], "student_id": str(row['essay_id'])} for _, row in df.iterrows()],
+        "rubric": json.loads(rubric) if isinstance(rubric, str) else rubric,
+        "concurrency": concurrency,
+        "profile": profile
+    }
+    if cascade is not None:
+        payload["cascade"] = cascade
+    response = await client.post(BATCH_URL, json=payload)
+    response.raise_for_status()
+    job_id = response.json()["job_id"]
+    print(f"Started batch job {job_id} ({len(df)} essays, concurrency {concurrency})")
+
+    while True:
+        await asyncio.sleep(POLL_INTERVAL)
+        try:
+            response = await client.get(f"{BATCH_URL}/{job_id}")
+        except httpx.TransportError as e:
+            # The job is persisted: keep polling while the API restarts and resumes it
+            print(f"API unavailable ({e!r}), retrying...")
+            continue
+        response.raise_for_status()
+        job = response.json()
+        print(f"Job {job_id} progress: {job['completed'] + job['failed']}/{job['total']} ({job['failed']} failed)")
+        if job["status"] == "completed":
+            break
+
+    if job.get("cascade"):
+        print_cascade_summary(job["cascade"])
+
+    results = {}
+    for item in job["results"]:
+        if item["status"] != "completed":
+            print(f"Error grading essay {item['student_id']}: {item['error']}")
+        results[item["student_id"]] = item["result"]
+    return results
+
+def print_cascade_summary(summary):
+    config = summary["config"]
+    print(f"\n### Model Cascade ({config['cheap_model']} -> {config['strong_model']}, "
+          f"{config['samples']} samples, max spread {config['max_spread']:.0%})")
+    print("| Graded | Escalated | Escalation Rate | Cheap Calls | Strong Calls | Cost ($) | Strong-only Cost ($) | Cost Saved | Latency Cheap-only (s) | Latency Escalated (s) |")
+    print("|--------|-----------|-----------------|-------------|--------------|----------|----------------------|------------|------------------------|-----------------------|")
+    print(f"| {summary['graded']} | {summary['escalated']} | {summary['escalation_rate']:.0%} | {summary['cheap_calls']} | {summary['strong_calls']} | "
+          f"{summary['cost_usd']:.4f} | {summary['baseline_cost_usd']:.4f} | {summary['cost_savings']:.0%} | "
+          f"{summary['cheap_only_latency_seconds'] or '-'} | {summary['escalated_latency_seconds'] or '-'} |")
+
+async def run_benchmark(batch=False, concurrency=8, profile="standard", cascade=None):
     if not os.path.exists(DATA_PATH):
         print(f"Error: {DATA_PATH} not found. Run prepare_asap.py first.")
         return
@@ -39,53 +113,64 @@ async def run_benchmark():
     results = []
     total_error = 0
     valid_count = 0
+    total_llm_calls = 0
     
-    print(f"Starting benchmark on {len(df)} essays...")
+    print(f"Starting benchmark on {len(df)} essays (profile: {profile}{'' if cascade is None else ', cascade on' if cascade else ', cascade off'})...")
     
     async with httpx.AsyncClient(timeout=180.0) as client:
+        batch_results = await grade_batch(client, df, concurrency, profile, cascade) if batch else {}
+
         for index, row in df.iterrows():
             essay_id = row['essay_id']
             human_score = row['human_score_normalized']
             
-            print(f"Grading Essay ID: {essay_id}...")
-            
-            ai_result = await grade_essay(client, essay_id, row['essay'], row['rubric'])
+            if batch:
+                ai_result = batch_results.get(str(essay_id))
+            else:
+                print(f"Grading Essay ID: {essay_id}...")
+                ai_result = await grade_essay(client, essay_id, row['essay'], row['rubric'], profile, cascade)
             
             if ai_result:
                 ai_score = ai_result.get('score', 0)
                 error = abs(ai_score - human_score)
                 
+                llm_calls = ai_result.get('metrics', {}).get('llm_calls', 0)
+                
                 results.append({
                     "Essay ID": essay_id,
                     "Human Score": human_score,
                     "AI Score": ai_score,
-                    "Abs Error": error
+                    "Abs Error": error,
+                    "LLM Calls": llm_calls
                 })
 
                 if ai_score < 2:
                     print(f"DEBUG Essay {essay_id} Low Score: {ai_result}")
                 
                 total_error += error
+                total_llm_calls += llm_calls
                 valid_count += 1
             else:
                  results.append({
                     "Essay ID": essay_id,
                     "Human Score": human_score,
                     "AI Score": "ERROR",
-                    "Abs Error": "N/A"
+                    "Abs Error": "N/A",
+                    "LLM Calls": "N/A"
                 })
 
     # Prepare markdown table
     output_lines = []
     output_lines.append("### Benchmark Results")
-    output_lines.append("| Essay ID | Human Score | AI Score | Abs Error |")
-    output_lines.append("|----------|-------------|----------|-----------|")
+    output_lines.append("| Essay ID | Human Score | AI Score | Abs Error | LLM Calls |")
+    output_lines.append("|----------|-------------|----------|-----------|-----------|")
     for r in results:
-        output_lines.append(f"| {r['Essay ID']} | {r['Human Score']} | {r['AI Score']} | {r['Abs Error']} |")
+        output_lines.append(f"| {r['Essay ID']} | {r['Human Score']} | {r['AI Score']} | {r['Abs Error']} | {r['LLM Calls']} |")
     
     if valid_count > 0:
         mae = total_error / valid_count
         output_lines.append(f"\n**Mean Absolute Error (MAE): {mae:.2f}**")
+        output_lines.append(f"**Average LLM Calls per Grade: {total_llm_calls / valid_count:.2f}**")
     else:
         output_lines.append("\nNo valid results to calculate MAE.")
 
@@ -99,7 +184,8 @@ async def run_benchmark():
             "Essay ID": "Mean Absolute Error (MAE)",
             "Human Score": "",
             "AI Score": "",
-            "Abs Error": round(mae, 2)
+            "Abs Error": round(mae, 2),
+            "LLM Calls": round(total_llm_calls / valid_count, 2)
         })
 
     results_df = pd.DataFrame(results)
@@ -108,4 +194,12 @@ async def run_benchmark():
     print(f"\nResults saved to {results_path}")
 
 if __name__ == "__main__":
-    asyncio.run(run_benchmark())
+    parser = argparse.ArgumentParser(description="Run the ASAP benchmark against the grading API.")
+    parser.add_argument("--batch", action="store_true", help="Grade the essays through /grade/batch jobs (one per rubric)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Batch concurrency limit (with --batch)")
+    parser.add_argument("--profile", choices=["standard", "fast"], default="standard", help="Grading profile")
+    parser.add_argument("--cascade", action=argparse.BooleanOptionalAction, default=None,
+                        help="Grade with the cheap model first, escalating to the strong model (--no-cascade: strong model only; default: the server's CASCADE_ENABLED)")
+    args = parser.parse_args()
+
+    asyncio.run(run_benchmark(batch=args.batch, concurrency=args.concurrency, profile=args.profile, cascade=args.cascade))
@@ -1,8 +1,30 @@
 import sys
 import os
+import json
+import subprocess
 
 # Setup Path
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
+sys.path.append(ROOT_DIR)
+
+# Cold import of the API must stay under this budget (seconds)
+IMPORT_BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", "1.0"))
+
+# Modules that must only load lazily (on first request or during warm-up)
+HEAVY_MODULES = [
+    "langchain_openai", "langgraph", "langchain_chroma", "chromadb", "pandas",
+    "langchain_huggingface", "sentence_transformers", "torch", "pypdf", "docx2txt",
+    "langchain_text_splitters", "langchain_core",
+]
+
+# Runs in a fresh interpreter so nothing is already cached in sys.modules
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+from backend.src import main
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "modules": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
 
 print("Attempting to import backend.src.main...")
 try:
@@ -11,3 +33,27 @@ try:
 except Exception as e:
     print(f"❌ Failed to import backend.src.main: {e}")
     sys.exit(1)
+
+print(f"Measuring cold import time (budget {IMPORT_BUDGET_SECONDS:.2f}s)...")
+probe = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT_DIR, capture_output=True, text=True)
+if probe.returncode != 0:
+    print(f"❌ Import probe failed:\n{probe.stderr}")
+    sys.exit(1)
+
+result = json.loads(probe.stdout.strip().splitlines()[-1])
+failed = False
+
+if result["modules"]:
+    print(f"❌ Heavy modules imported eagerly: {', '.join(result['modules'])}")
+    failed = True
+else:
+    print("✅ No heavy modules imported at startup")
+
+if result["seconds"] > IMPORT_BUDGET_SECONDS:
+    print(f"❌ Import took {result['seconds']:.2f}s (budget {IMPORT_BUDGET_SECONDS:.2f}s)")
+    failed = True
+else:
+    print(f"✅ Import took {result['seconds']:.2f}s (budget {IMPORT_BUDGET_SECONDS:.2f}s)")
+
+if failed:
+    sys.exit(1)
@@ -1,29 +1,174 @@
 from dotenv import load_dotenv
 import os
 import json
-from typing import List, TypedDict, Dict, Annotated, Any
-from langgraph.graph import StateGraph, END
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
+import asyncio
+import operator
+from functools import lru_cache
+from typing import List, TypedDict, Dict, Annotated, Any, Optional
 from pydantic import BaseModel, Field
-from backend.src.models import RubricItem, GradeResult
+from backend.src.models import RubricItem, GradeResult, CriterionScore
 from backend.src import rag
+from backend.src import llm_cache
+from backend.src import llm_gateway
+from backend.src import token_budget
 
 # Load environment variables
 load_dotenv()
 
 # --- 1. SETUP DEEPSEEK-V3 LLM ---
-api_key = os.getenv("DEEPSEEK_API_KEY")
-if not api_key:
-    # Fallback or strict warning ensures we don't fail silently
-    print("WARNING: DEEPSEEK_API_KEY not found in environment.")
-
-llm = ChatOpenAI(
-    model="deepseek-chat",
-    openai_api_key=api_key,
-    openai_api_base="https://api.deepseek.com",
-    temperature=0
-)
+# Shared pooled, rate-limited client (see llm_gateway), created on first use so
+# importing the agent does not load the OpenAI SDK
+llm = None
+
+def get_llm(tier: str = "strong"):
+    global llm
+    if tier != "strong":
+        return llm_gateway.get_llm(tier)
+    if llm is None:
+        llm = llm_gateway.get_llm()
+    return llm
+
+# Bump when a prompt template changes so stale cached responses are not reused
+GRADER_PROMPT_VERSION = "grader-v4"
+MENTOR_PROMPT_VERSION = "mentor-v1"
+REPAIR_PROMPT_VERSION = "repair-v1"
+FAST_PROMPT_VERSION = "fast-v2"
+SECTION_PROMPT_VERSION = "section-v1"
+# Mentor replies shorter than this are treated as failed and never cached
+MIN_FEEDBACK_CHARS = int(os.getenv("MIN_FEEDBACK_CHARS", "20"))
+
+# Long-document mode: submissions over the prompt budget are read section by section
+# (concurrently) and graded from the merged section notes instead of a truncated prefix
+LONG_DOC_MODE = os.getenv("LONG_DOC_MODE", "true").lower() not in ("0", "false", "no")
+LONG_DOC_MAX_SECTIONS = int(os.getenv("LONG_DOC_MAX_SECTIONS", "12"))
+
+# Per-criterion mode: rubric items scored in parallel calls of this many items each
+CRITERION_GROUP_SIZE = max(1, int(os.getenv("CRITERION_GROUP_SIZE", "1")))
+
+# Model cascade: grade with the cheap model (llm_gateway.CASCADE_CHEAP_MODEL) first and
+# escalate to the strong model only when the Judge rejects the grade, including when the
+# cheap model's CASCADE_SAMPLES grades of the same prompt spread by more than
+# CASCADE_MAX_SPREAD of the total points. Default for requests that do not choose.
+CASCADE_ENABLED = os.getenv("CASCADE_ENABLED", "false").lower() in ("1", "true", "yes")
+CASCADE_SAMPLES = max(1, int(os.getenv("CASCADE_SAMPLES", "3")))
+CASCADE_SAMPLE_TEMPERATURE = float(os.getenv("CASCADE_SAMPLE_TEMPERATURE", "0.7"))
+CASCADE_MAX_SPREAD = float(os.getenv("CASCADE_MAX_SPREAD", "0.1"))
+
+# Grading profiles: "standard" grades and writes feedback in two calls,
+# "fast" asks the Grader for the feedback in the same call
+PROFILES = ("standard", "fast")
+
+# Shared by the Mentor prompt and the fast profile's single-call prompt
+SOCRATIC_FEEDBACK_RULES = """**CRITICAL RULE (NO EXPO):**
+    - You are forbidden from stating the correct answer.
+    - Do NOT say "The correct answer is X".
+    - Do NOT perform the calculation for them.
+    - Do NOT show the corrected code.
+    - If they calculated wrong, ask: "Check your division step. What is 10 / 2?" (Allowed)
+    - UNACCEPTABLE: "You got 4, but it should be 5."
+    - ACCEPTABLE: "You got 4. Let's verify that. Is 2 * 4 + 5 equal to 15?"
+    
+    **INSTRUCTIONS:**
+    1. **Concept Explanation**: Explain the underlying concept they missed.
+    2. **Socratic Guidance**: Provide a HINT or a LEADING QUESTION to help them find the answer themselves.
+    3. **Tone**: Encouraging, constructive, but firm on standards.
+
+    **OUTPUT FORMAT**:
+    You MUST output the final feedback in the following Markdown format:
+
+    ✅ **Rubric Strengths**:
+    [List specific criteria where they performed well based on grade_data]
+
+    ⚠️ **Areas for Improvement**:
+    [List specific criteria where they lost points]
+
+    💡 **Guidance**:
+    [Your Socratic hints, conceptual explanations, and leading questions. NO ANSWERS.]"""
+
+
+def _is_json(content: str) -> bool:
+    try:
+        json.loads(content)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def _is_feedback(content: str) -> bool:
+    # Mentor output is prose: reject empty replies and stray JSON (e.g. a grader-style answer)
+    text = (content or "").strip()
+    return len(text) >= MIN_FEEDBACK_CHARS and not _is_json(text)
+
+
+def _normalize_grade(parsed: dict, rubric: List[RubricItem]) -> dict:
+    """
+    Turns the grader's per-criterion JSON into grade_data, fixing what can be fixed
+    without another LLM call: criterion scores are matched to rubric items and clamped
+    to [0, max_points], the total is computed locally, and missing critique points are
+    filled in from the comments of criteria that lost points.
+    Anything that cannot be repaired locally (e.g. an unscored criterion) is left in
+    `missing_criteria` for the Judge.
+    """
+    raw_scores = parsed.get("criteria_scores") or []
+    if not isinstance(raw_scores, list):
+        raw_scores = []
+
+    by_name = {}
+    for entry in raw_scores:
+        if isinstance(entry, dict) and entry.get("criteria") is not None:
+            by_name[str(entry["criteria"]).strip().lower()] = entry
+    # Names not echoed exactly but one entry per criterion: match by position
+    positional = len(by_name) != len(rubric) or any(item.criteria.strip().lower() not in by_name for item in rubric)
+    positional = positional and len(raw_scores) == len(rubric)
+
+    criteria_scores = []
+    missing_criteria = []
+    corrections = []
+    for index, item in enumerate(rubric):
+        entry = raw_scores[index] if positional else by_name.get(item.criteria.strip().lower())
+        if not isinstance(entry, dict):
+            missing_criteria.append(item.criteria)
+            continue
+        try:
+            score = float(entry.get("score", 0.0))
+        except (TypeError, ValueError):
+            missing_criteria.append(item.criteria)
+            continue
+        clamped = min(max(score, 0.0), float(item.max_points))
+        if clamped != score:
+            corrections.append(f"{item.criteria} score {score} clamped to {clamped} (max {item.max_points})")
+        criteria_scores.append({
+            "criteria": item.criteria,
+            "score": clamped,
+            "max_points": item.max_points,
+            "comment": str(entry.get("comment", "")).strip()
+        })
+
+    total = sum(c["score"] for c in criteria_scores)
+    if "score" in parsed:
+        try:
+            if abs(float(parsed["score"]) - total) > 1e-6:
+                corrections.append(f"Reported total {parsed['score']} replaced by sum of criteria {total}")
+        except (TypeError, ValueError):
+            pass
+
+    critique_points = [str(p) for p in (parsed.get("critique_points") or []) if str(p).strip()]
+    lost_points = [c for c in criteria_scores if c["score"] < c["max_points"] and c["comment"]]
+    if not critique_points and lost_points:
+        critique_points = [f"{c['criteria']}: {c['comment']}" for c in lost_points]
+        corrections.append("Critique points filled in from criterion comments")
+
+    return {
+        "score": total,
+        "criteria_scores": criteria_scores,
+        "critique_points": critique_points,
+        "rubric_performance": {
+            c["criteria"]: f"{c['score']:g}/{c['max_points']}" + (f" - {c['comment']}" if c["comment"] else "")
+            for c in criteria_scores
+        },
+        "missing_criteria": missing_criteria,
+        "local_corrections": corrections
+    }
 
 # --- 2. DEFINE AGENT STATE ---
 class AgentState(TypedDict):
@@ -39,11 +184,50 @@ class AgentState(TypedDict):
     is_valid: bool             # Flag for conditional edge (default: False)
     skip_rag: bool             # Optional flag to skip RAG (default: False)
     thinking_process: List[str] # Log of agent's thoughts
+    use_cache: bool            # Serve repeated LLM calls from the response cache (default: True)
+    llm_calls: int             # LLM round-trips made for this grade (default: 0)
+    cache_hits: int            # LLM responses served from the response cache, not counted in llm_calls (default: 0)
+    repair_attempted: bool     # Whether the current grade has already been through repair_grade (default: False)
+    repair_count: int          # Number of targeted repairs made (default: 0)
+    profile: str               # "standard" or "fast" (default: "standard")
+    input_tokens: int          # Prompt tokens billed for this grade (default: 0)
+    output_tokens: int         # Completion tokens billed for this grade (default: 0)
+    cached_input_tokens: int   # Prompt tokens served from the provider's prefix cache (default: 0)
+    prompt_sections: dict      # Token-budgeted rubric/context/submission shared by every node (see token_budget.pack_prompt)
+    section_count: int         # Sections read by map_sections in long-document mode (default: 1)
+    sections_skipped: int      # Sections of a long submission that were not read (over the limit or failed)
+    criterion_fanout: bool     # Score rubric items in parallel grade_criterion calls (default: False)
+    criterion_results: Annotated[list, operator.add]  # One entry per grade_criterion call, tagged with its round
+    cascade: bool              # Grade with the cheap model first, escalating on rejection (default: CASCADE_ENABLED)
+    model_tier: str            # Tier the next LLM calls use: "cheap" or "strong" (default: "strong")
+    escalated_round: int       # Revision at which the cascade escalated to the strong model (default: unset)
+    tier_usage: dict           # Calls and tokens per tier; extra consistency samples are counted under "samples"
+    sample_spread: float       # Max - min of the cheap model's sample scores, as last judged (default: 0.0)
+
+
+def build_inputs(submission_text: str, rubric: List[RubricItem], use_cache: bool = True, profile: str = "standard",
+                 criterion_fanout: bool = False, cascade: Optional[bool] = None) -> dict:
+    """
+    Initial graph state for grading one submission.
+    """
+    if cascade is None:
+        cascade = CASCADE_ENABLED
+    return {
+        "submission_text": submission_text,
+        "rubric": rubric,
+        "context": [], # Initial empty context, will be populated by retrieve node
+        "grade_result": None, # Initial placeholder
+        "use_cache": use_cache,
+        "profile": profile,
+        "criterion_fanout": criterion_fanout,
+        "cascade": cascade,
+        "model_tier": "cheap" if cascade else "strong"
+    }
 
 
 # --- 3. NODE IMPLEMENTATIONS ---
 
-def retrieve(state: AgentState) -> dict:
+async def retrieve(state: AgentState) -> dict:
     """
     Node 0: Retrieve context using RAG.
     """
@@ -60,44 +244,192 @@ def retrieve(state: AgentState) -> dict:
         context = []
     else:
         try:
-            context = rag.retrieve_context(submission_text)
+            context = await rag.aretrieve_submission_context(submission_text, state["rubric"])
         except Exception as e:
             print(f"RAG Error: {e}")
             context = []
 
+    sections = _pack_sections({**state, "context": context})
+    usage = sections["usage"]
+    budget_log = (
+        f"Prompt budget: rubric {usage['rubric_tokens']}, context {usage['context_tokens']} "
+        f"({usage['context_chunks']} chunks), submission {usage['submission_tokens']} of {usage['budget']} tokens"
+        + (" (submission truncated)" if usage["submission_truncated"] else "") + "."
+    )
+
     return {
         "context": context,
+        "prompt_sections": sections,
         "revision_number": revision_number,
         "grader_feedback": grader_feedback,
         "is_valid": is_valid,
-        "thinking_process": ["Agent initializing...", "Retrieving context from knowledge base..."] + ([f"Found {len(context)} context chunks."] if context else ["No relevant context found."])
+        "thinking_process": ["Agent initializing...", "Retrieving context from knowledge base..."] + ([f"Found {len(context)} context chunks."] if context else ["No relevant context found."]) + [budget_log]
     }
 
-def grade_submission(state: AgentState) -> dict:
+
+def _pack_sections(state: AgentState) -> dict:
+    rubric_str = "\n".join([f"- {item.criteria} (Max Points: {item.max_points}): {item.description}" for item in state["rubric"]])
+    return token_budget.pack_prompt(rubric_str, state.get("context", []), state["submission_text"])
+
+
+def _prompt_sections(state: AgentState) -> dict:
     """
-    Node 1: The Grader (Universal Evaluator)
-    Analyzes subject, adopts persona, grades strictly.
-    Handles Retries if Judge rejected previous output.
+    The packed prompt sections computed by retrieve, so every node sends the same
+    token-budgeted rubric, context and submission.
     """
-    print(f"---GRADING SUBMISSION (Attempt {state.get('revision_number', 0) + 1})---")
-    submission_text = state["submission_text"]
+    return state.get("prompt_sections") or _pack_sections(state)
+
+async def _read_section(state: AgentState, rubric_str: str, section: str, index: int, total: int):
+    from langchain_core.prompts import ChatPromptTemplate
+
+    system_prompt = """You are reading ONE SECTION of a long student submission that is too long to grade in one pass.
+    Do NOT score anything. For every rubric item, record what THIS SECTION shows: the evidence that meets it
+    and anything missing, wrong or weak. Quote or cite concrete details (names, values, lines) briefly.
+    If the section has nothing relevant to an item, say "Not addressed in this section."
+    Keep each note under 80 words.
+
+    Output strictly in **JSON**:
+    {{
+        "criteria_notes": [
+            {{"criteria": "<Criteria Name>", "evidence": "<what meets the item>", "issues": "<what is missing or wrong>"}}
+        ]
+    }}
+    """
+
+    user_prompt = """
+    RUBRIC:
+    {rubric_str}
+
+    SECTION {index} OF {total}:
+    {section}
+    """
+
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", system_prompt),
+        ("user", user_prompt)
+    ])
+    messages = prompt.format_messages(rubric_str=rubric_str, index=index, total=total, section=section)
+
+    result = await llm_cache.ainvoke_cached(
+        get_llm(state.get("model_tier", "strong")), messages, SECTION_PROMPT_VERSION,
+        use_cache=state.get("use_cache", True),
+        validate=_is_json,
+        response_format={"type": "json_object"}
+    )
+    try:
+        notes = json.loads(result.content).get("criteria_notes") or []
+        lines = [
+            f"- {n.get('criteria', '?')}: {n.get('evidence', '')} | Issues: {n.get('issues', '')}"
+            for n in notes if isinstance(n, dict)
+        ]
+        text = "\n".join(lines)
+    except (AttributeError, TypeError, ValueError):
+        text = str(result.content)
+    return f"### Section {index}/{total}\n{text}", result
+
+
+async def map_sections(state: AgentState) -> dict:
+    """
+    Node 0b (long-document mode): The Reader
+    Splits a submission that does not fit the prompt budget into sections and reads
+    them concurrently against the rubric. The merged section notes then replace the
+    truncated submission for every later node, so the Grader scores the whole document.
+    """
+    print("---READING LONG SUBMISSION BY SECTION (NODE 0b)---")
+    sections = _prompt_sections(state)
+    usage = sections["usage"]
+    # Each section gets the same room the submission would have had in a single prompt
+    section_tokens = max(usage["submission_tokens"], 500)
+    parts = token_budget.split_to_tokens(state["submission_text"], section_tokens)
+    skipped = max(len(parts) - LONG_DOC_MAX_SECTIONS, 0)
+    parts = parts[:LONG_DOC_MAX_SECTIONS]
+
+    outcomes = await asyncio.gather(
+        *[_read_section(state, sections["rubric_str"], part, i + 1, len(parts)) for i, part in enumerate(parts)],
+        return_exceptions=True
+    )
+
+    notes = []
+    update = {}
+    failed = 0
+    for outcome in outcomes:
+        if isinstance(outcome, Exception):
+            print(f"Section read failed: {outcome}")
+            failed += 1
+            continue
+        note, result = outcome
+        notes.append(note)
+        update = _usage({**state, **update}, result)
+
+    if not notes:
+        # Nothing could be read: grade the truncated prefix as before
+        return {
+            "section_count": 1,
+            "sections_skipped": skipped + failed,
+            "thinking_process": state.get("thinking_process", []) + ["Long-document mode failed; grading the truncated submission."]
+        }
+
+    digest = "SECTION-BY-SECTION NOTES (the submission was too long to include in full; these notes cover all of it):\n\n" + "\n\n".join(notes)
+    packed_digest = token_budget.truncate_to_tokens(digest, section_tokens)
+    new_sections = {
+        **sections,
+        "submission_text": packed_digest,
+        "usage": {
+            **usage,
+            "submission_tokens": token_budget.count_tokens(packed_digest),
+            # Part of the submission was not read if sections were skipped or the notes were cut
+            "submission_truncated": bool(skipped or failed) or packed_digest is not digest
+        }
+    }
+
+    log = f"Long submission split into {len(parts)} sections and read in parallel."
+    if skipped:
+        log += f" {skipped} trailing sections exceeded LONG_DOC_MAX_SECTIONS and were not read."
+    if failed:
+        log += f" {failed} sections could not be read."
+
+    return {
+        **update,
+        "prompt_sections": new_sections,
+        "section_count": len(parts),
+        "sections_skipped": skipped + failed,
+        "thinking_process": state.get("thinking_process", []) + [log]
+    }
+
+
+def _grader_messages(state: AgentState, fast: bool = False) -> list:
+    """
+    Renders the Grader prompt. In the fast profile the same call is also asked for the
+    student-facing Socratic feedback, following the Mentor's rules.
+    Laid out for provider-side prefix caching: the system prompt is identical for every
+    request, the user message opens with what a batch shares (rubric and totals, then
+    the assignment context) and ends with what is unique to this attempt (submission,
+    then any rejection from the Judge).
+    """
+    from langchain_core.messages import HumanMessage
+    from langchain_core.prompts import ChatPromptTemplate
+
     rubric = state["rubric"]
-    context = state["context"]
     grader_feedback = state.get("grader_feedback", "")
-    
-    # Format rubric
-    rubric_str = "\n".join([f"- {item.criteria} (Max Points: {item.max_points}): {item.description}" for item in rubric])
-    
-    # Truncate context and submission to safe limits
-    context_str = "\n\n".join(context)[:3000]
-    if len(submission_text) > 15000:
-        submission_text_safe = submission_text[:15000] + "... [TRUNCATED]"
-    else:
-        submission_text_safe = submission_text
+
+    # Rubric, ranked context chunks and submission packed to the shared token budget
+    sections = _prompt_sections(state)
+    rubric_str = sections["rubric_str"]
+    context_str = sections["context_str"]
+    submission_text_safe = sections["submission_text"]
 
     total_points = sum(item.max_points for item in rubric)
 
-    # Base System Prompt
+    feedback_section = ""
+    feedback_field = ""
+    if fast:
+        feedback_section = f"""
+    5. **STUDENT FEEDBACK**: Also write the student-facing feedback as a supportive Socratic Tutor.
+    {SOCRATIC_FEEDBACK_RULES}
+    """
+        feedback_field = ',\n        "feedback": "<student-facing Markdown feedback>"'
+
+    # Base System Prompt: no per-request values, so every call shares it as a cached prefix
     # Note: We use double curly braces {{ }} for literal braces in LangChain templates
     system_prompt_text = f"""You are a Universal Academic Grader. Your task is to grade the STUDENT SUBMISSION based STRICTLY on the provided RUBRIC and CONTEXT.
 
@@ -114,23 +446,23 @@ def grade_submission(state: AgentState) -> dict:
          - If the student makes a good point but uses slang, they should still get a passing score.
 
     4. **SCORING CALCULATION**:
-       - **TOTAL POINTS AVAILABLE: {total_points}**
-       - Score each rubric item based on the evidence found.
+       - The TOTAL POINTS AVAILABLE are given with the RUBRIC.
+       - Score EVERY rubric item separately, between 0 and its Max Points, based on the evidence found. The total is computed from these scores.
+       - For every item that loses points, the comment MUST say what is missing or wrong.
        - **Bias towards the average**: Real students rarely get 0.0 or Perfect scores. Use the full range (3, 4, 6, 8).
-       
-    Output strictly in **JSON**:
+    {feedback_section}
+    Output strictly in **JSON**, with one entry per rubric item using its exact criteria name:
     {{{{
-        "score": <float>,
-        "critique_points": ["<specific point 1>", "<specific point 2>"],
-        "rubric_performance": {{{{
-            "<Criteria Name>": "<Specific comment>"
-        }}}}
+        "criteria_scores": [
+            {{{{"criteria": "<Criteria Name>", "score": <float>, "comment": "<Specific comment>"}}}}
+        ],
+        "critique_points": ["<specific point 1>", "<specific point 2>"]{feedback_field}
     }}}}
     """
 
-    # User Prompt Template
+    # User Prompt Template: assignment-wide sections first, per-submission last
     user_prompt_text = """
-    RUBRIC:
+    RUBRIC (TOTAL POINTS AVAILABLE: {total_points}):
     {rubric_str}
     
     CONTEXT:
@@ -140,56 +472,369 @@ def grade_submission(state: AgentState) -> dict:
     {submission_text}
     """
 
-    # Retry Logic: Prepend Feedback if it exists
-    if grader_feedback:
-        user_prompt_text = f"⚠️ PREVIOUS GRADE REJECTED. JUDGE SAID: {{grader_feedback}}. FIX THIS ERROR.\n\n" + user_prompt_text
-
     prompt = ChatPromptTemplate.from_messages([
         ("system", system_prompt_text),
         ("user", user_prompt_text)
     ])
 
-    # Bind to JSON object mode
-    json_llm = llm.bind(response_format={"type": "json_object"})
-    chain = prompt | json_llm
+    messages = prompt.format_messages(
+        total_points=total_points,
+        rubric_str=rubric_str,
+        context_str=context_str,
+        submission_text=submission_text_safe
+    )
+
+    # Retry Logic: Append Feedback if it exists, after everything a first attempt shares.
+    # It is added as its own message so the Judge's text never goes through template formatting.
+    if grader_feedback:
+        messages.append(HumanMessage(content=f"⚠️ PREVIOUS GRADE REJECTED. JUDGE SAID: {grader_feedback}. FIX THIS ERROR."))
+
+    return messages
+
+
+def _parse_failure() -> dict:
+    # Default failure state for the Judge to catch
+    return {
+        "score": 0.0,
+        "criteria_scores": [],
+        "critique_points": ["Error parsing specific grader output."],
+        "rubric_performance": {},
+        "missing_criteria": [],
+        "local_corrections": []
+    }
+
+
+def _cache_hit(response) -> bool:
+    return bool((getattr(response, "response_metadata", None) or {}).get("cache_hit"))
+
+
+def _usage(state: AgentState, response=None) -> dict:
+    """
+    State update counting one more LLM call and its token usage, or one more cache hit.
+    """
+    if _cache_hit(response):
+        return _count(state, 0, 0, 0, cache_hits=1)
+    usage = getattr(response, "usage_metadata", None) or {}
+    return _count(state, 1, usage.get("input_tokens", 0), usage.get("output_tokens", 0), llm_gateway.cached_tokens(response))
+
+
+def _count(state: AgentState, calls: int, input_tokens: int, output_tokens: int, cached_tokens: int = 0,
+           tier: Optional[str] = None, cache_hits: int = 0) -> dict:
+    """
+    State update adding LLM calls and tokens to the totals and to the tier that made
+    them (the current model_tier unless given). Responses served from the LLM response
+    cache are counted separately in cache_hits.
+    """
+    tier = tier or state.get("model_tier", "strong")
+    tier_usage = dict(state.get("tier_usage") or {})
+    spent = tier_usage.get(tier, {"calls": 0, "input_tokens": 0, "output_tokens": 0, "cached_tokens": 0})
+    tier_usage[tier] = {
+        "calls": spent["calls"] + calls,
+        "input_tokens": spent["input_tokens"] + input_tokens,
+        "output_tokens": spent["output_tokens"] + output_tokens,
+        "cached_tokens": spent["cached_tokens"] + cached_tokens
+    }
+    return {
+        "llm_calls": state.get("llm_calls", 0) + calls,
+        "cache_hits": state.get("cache_hits", 0) + cache_hits,
+        "input_tokens": state.get("input_tokens", 0) + input_tokens,
+        "output_tokens": state.get("output_tokens", 0) + output_tokens,
+        "cached_input_tokens": state.get("cached_input_tokens", 0) + cached_tokens,
+        "tier_usage": tier_usage
+    }
+
+
+def _model_note(state: AgentState) -> str:
+    # Names the model in the thinking log when the cascade has two to choose from
+    if not state.get("cascade"):
+        return ""
+    return f" ({llm_gateway.ENDPOINTS[state.get('model_tier', 'strong')].model})"
+
+
+async def _consistency_samples(state: AgentState, messages: list, prompt_version: str) -> list:
+    """
+    Cascade, cheap tier only: CASCADE_SAMPLES - 1 extra grades of the same prompt at
+    CASCADE_SAMPLE_TEMPERATURE, so the Judge can check the cheap model agrees with itself.
+    Returns (response, total score or None if unusable) pairs.
+    """
+    if state.get("model_tier") != "cheap":
+        return []
+
+    async def sample(index: int):
+        response = None
+        try:
+            response = await llm_cache.ainvoke_cached(
+                get_llm("cheap"), messages, f"{prompt_version}:sample-{index}",
+                use_cache=state.get("use_cache", True),
+                validate=_is_json,
+                response_format={"type": "json_object"},
+                temperature=CASCADE_SAMPLE_TEMPERATURE
+            )
+            grade = _normalize_grade(json.loads(response.content), state["rubric"])
+            return response, None if grade["missing_criteria"] else grade["score"]
+        except Exception as e:
+            print(f"Consistency sample {index} failed: {e}")
+            return response, None
+
+    return await asyncio.gather(*[sample(index) for index in range(1, CASCADE_SAMPLES)])
+
+
+def _with_samples(state: AgentState, grade_data: dict, samples: list) -> dict:
+    """
+    State update recording the consistency samples: their scores go into grade_data
+    for the Judge, their calls and tokens under the "samples" tier.
+    """
+    if not samples:
+        return {}
+    grade_data["sample_scores"] = [grade_data["score"]] + [score for _, score in samples if score is not None]
+    usages = [getattr(response, "usage_metadata", None) or {} for response, _ in samples]
+    hits = sum(_cache_hit(response) for response, _ in samples)
+    return _count(
+        state, len(samples) - hits,
+        sum(u.get("input_tokens", 0) for u in usages),
+        sum(u.get("output_tokens", 0) for u in usages),
+        sum(llm_gateway.cached_tokens(response) for response, _ in samples),
+        tier="samples",
+        cache_hits=hits
+    )
+
+
+async def grade_submission(state: AgentState) -> dict:
+    """
+    Node 1: The Grader (Universal Evaluator)
+    Analyzes subject, adopts persona, grades strictly.
+    Handles Retries if Judge rejected previous output.
+    """
+    print(f"---GRADING SUBMISSION (Attempt {state.get('revision_number', 0) + 1})---")
+    grader_feedback = state.get("grader_feedback", "")
+    result = None
+    messages = _grader_messages(state)
+    samples = asyncio.ensure_future(_consistency_samples(state, messages, GRADER_PROMPT_VERSION))
 
     try:
-        # Pass variables to invoke
-        result = chain.invoke({
-            "total_points": total_points,
-            "rubric_str": rubric_str,
-            "context_str": context_str,
-            "submission_text": submission_text_safe,
-            "grader_feedback": grader_feedback
-        })
+        # JSON object mode; only parseable responses are cached
+        result = await llm_cache.ainvoke_cached(
+            get_llm(state.get("model_tier", "strong")), messages, GRADER_PROMPT_VERSION,
+            use_cache=state.get("use_cache", True),
+            validate=_is_json,
+            hedge=True,
+            response_format={"type": "json_object"}
+        )
         parsed = json.loads(result.content)
         
-        # Robust Parsing
-        grade_data = {
-            "score": float(parsed.get("score", 0.0)),
-            "critique_points": parsed.get("critique_points", []),
-            "rubric_performance": parsed.get("rubric_performance", {})
-        }
+        # Robust Parsing: per-criterion scores, total computed locally
+        grade_data = _normalize_grade(parsed, state["rubric"])
 
     except Exception as e:
         print(f"JSON Parsing Error in Grader: {e}")
-        # Return default failure state for the Judge to catch
-        grade_data = {
-            "score": 0.0,
-            "critique_points": ["Error parsing specific grader output."],
-            "rubric_performance": {}
-        }
+        grade_data = _parse_failure()
+
+    log_msg = f"Grading Attempt {state.get('revision_number', 0) + 1}{_model_note(state)}..."
+    if grader_feedback:
+        log_msg += f" (Correcting previous error: {grader_feedback})"
+
+    update = _usage(state, result)
+    update.update(_with_samples({**state, **update}, grade_data, await samples))
+    return {
+        "grade_data": grade_data,
+        **update,
+        "repair_attempted": False,
+        "thinking_process": state.get("thinking_process", []) + [log_msg, "Analyzing submission against rubric..."]
+    }
+
+
+async def grade_fast(state: AgentState) -> dict:
+    """
+    Node 1 (fast profile): Grader and Mentor in one call.
+    Returns per-criterion scores and the Socratic feedback together; the Judge still
+    validates the scores locally.
+    """
+    print(f"---FAST GRADING (Attempt {state.get('revision_number', 0) + 1})---")
+    grader_feedback = state.get("grader_feedback", "")
+    result = None
+    messages = _grader_messages(state, fast=True)
+    samples = asyncio.ensure_future(_consistency_samples(state, messages, FAST_PROMPT_VERSION))
+
+    try:
+        result = await llm_cache.ainvoke_cached(
+            get_llm(state.get("model_tier", "strong")), messages, FAST_PROMPT_VERSION,
+            use_cache=state.get("use_cache", True),
+            validate=_is_json,
+            hedge=True,
+            response_format={"type": "json_object"}
+        )
+        parsed = json.loads(result.content)
+        grade_data = _normalize_grade(parsed, state["rubric"])
+        grade_data["feedback"] = str(parsed.get("feedback") or "").strip()
+
+    except Exception as e:
+        print(f"JSON Parsing Error in Fast Grader: {e}")
+        grade_data = _parse_failure()
 
-    log_msg = f"Grading Attempt {state.get('revision_number', 0) + 1}..."
+    log_msg = f"Grading Attempt {state.get('revision_number', 0) + 1}{_model_note(state)} (fast: score and feedback in one pass)..."
     if grader_feedback:
         log_msg += f" (Correcting previous error: {grader_feedback})"
 
+    update = _usage(state, result)
+    update.update(_with_samples({**state, **update}, grade_data, await samples))
     return {
         "grade_data": grade_data,
+        **update,
+        "repair_attempted": False,
         "thinking_process": state.get("thinking_process", []) + [log_msg, "Analyzing submission against rubric..."]
     }
 
 
+async def grade_criterion(task: dict) -> dict:
+    """
+    Node 1 (per-criterion mode): scores one group of rubric items with a focused Grader
+    prompt. Runs once per group, concurrently; merge_criteria combines the results.
+    """
+    group = task["rubric"]
+    result = None
+    try:
+        result = await llm_cache.ainvoke_cached(
+            get_llm(task.get("model_tier", "strong")), _grader_messages(task), GRADER_PROMPT_VERSION,
+            use_cache=task.get("use_cache", True),
+            validate=_is_json,
+            response_format={"type": "json_object"}
+        )
+        # Matched against this group only, so names are canonical when merged
+        group_grade = _normalize_grade(json.loads(result.content), group)
+        failed = False
+    except Exception as e:
+        print(f"JSON Parsing Error in Criterion Grader ({', '.join(item.criteria for item in group)}): {e}")
+        group_grade = {"criteria_scores": [], "critique_points": [], "local_corrections": []}
+        failed = True
+
+    usage = getattr(result, "usage_metadata", None) or {}
+    return {
+        "criterion_results": [{
+            "round": task["round"],
+            "criteria_scores": group_grade["criteria_scores"],
+            "critique_points": group_grade["critique_points"],
+            "local_corrections": group_grade["local_corrections"],
+            "input_tokens": usage.get("input_tokens", 0),
+            "output_tokens": usage.get("output_tokens", 0),
+            "cached_tokens": llm_gateway.cached_tokens(result),
+            "cache_hit": _cache_hit(result),
+            "failed": failed
+        }]
+    }
+
+
+def merge_criteria(state: AgentState) -> dict:
+    """
+    Node 1c (per-criterion mode): combines this round's grade_criterion results into
+    one grade. Items no call managed to score are left for the Judge as missing criteria.
+    """
+    print("---MERGING PER-CRITERION GRADES---")
+    current = state.get("revision_number", 0)
+    results = [r for r in state.get("criterion_results", []) if r["round"] == current]
+
+    if all(r["failed"] for r in results):
+        grade_data = _parse_failure()
+    else:
+        merged = {
+            "criteria_scores": [c for r in results for c in r["criteria_scores"]],
+            "critique_points": [p for r in results for p in r["critique_points"]]
+        }
+        grade_data = _normalize_grade(merged, state["rubric"])
+        grade_data["local_corrections"] = [c for r in results for c in r["local_corrections"]] + grade_data["local_corrections"]
+
+    failed = sum(1 for r in results if r["failed"])
+    log_msg = f"Grading Attempt {current + 1}{_model_note(state)}: scored {len(state['rubric'])} rubric items in {len(results)} parallel calls"
+    log_msg += f" ({failed} failed)." if failed else "."
+
+    return {
+        "grade_data": grade_data,
+        **_count(state, sum(not r["cache_hit"] for r in results), sum(r["input_tokens"] for r in results),
+                 sum(r["output_tokens"] for r in results), sum(r["cached_tokens"] for r in results),
+                 cache_hits=sum(r["cache_hit"] for r in results)),
+        "repair_attempted": False,
+        "thinking_process": state.get("thinking_process", []) + [log_msg]
+    }
+
+
+async def repair_grade(state: AgentState) -> dict:
+    """
+    Node 1b: The Repairer
+    Fixes a rejected grade with a small targeted prompt: only the previous JSON grade,
+    the Judge's reason and the rubric item names/maximums are sent (no submission,
+    context or rubric descriptions), so it only handles grades whose every rubric item
+    was scored. Falls back to a full re-grade if this fails.
+    """
+    from langchain_core.prompts import ChatPromptTemplate
+
+    print("---REPAIRING GRADE (NODE 1b)---")
+    grade_data = state["grade_data"]
+    rubric = state["rubric"]
+    grader_feedback = state.get("grader_feedback", "")
+
+    previous_grade = {
+        "criteria_scores": [
+            {"criteria": c["criteria"], "score": c["score"], "comment": c["comment"]}
+            for c in grade_data.get("criteria_scores", [])
+        ],
+        "critique_points": grade_data.get("critique_points", [])
+    }
+    rubric_items_str = "\n".join([f"- {item.criteria} (Max Points: {item.max_points})" for item in rubric])
+
+    system_prompt = """You are correcting a grade that failed a consistency check.
+    Fix ONLY the problem the reviewer describes and keep everything else unchanged.
+    Every rubric item must appear exactly once with its exact name, a score between 0 and its Max Points,
+    and a comment explaining any points deducted.
+    Output strictly the corrected grade as a JSON object in the same format as the previous grade."""
+
+    user_prompt = """
+    RUBRIC ITEMS:
+    {rubric_items_str}
+
+    PREVIOUS GRADE (JSON):
+    {previous_grade}
+
+    REVIEWER'S REASON FOR REJECTION:
+    {grader_feedback}
+    """
+
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", system_prompt),
+        ("user", user_prompt)
+    ])
+
+    messages = prompt.format_messages(
+        rubric_items_str=rubric_items_str,
+        previous_grade=json.dumps(previous_grade, indent=2),
+        grader_feedback=grader_feedback
+    )
+
+    result = None
+    try:
+        result = await llm_cache.ainvoke_cached(
+            get_llm(state.get("model_tier", "strong")), messages, REPAIR_PROMPT_VERSION,
+            use_cache=state.get("use_cache", True),
+            validate=_is_json,
+            response_format={"type": "json_object"}
+        )
+        # Fast profile: the feedback written with the rejected grade is dropped, as it may
+        # contradict the repaired scores; check_validation then routes to generate_feedback
+        repaired = _normalize_grade(json.loads(result.content), rubric)
+        log_msg = f"Repairing grade (Judge said: {grader_feedback})"
+    except Exception as e:
+        print(f"JSON Parsing Error in Repair: {e}")
+        # Keep the rejected grade; the Judge will reject it again and trigger a full re-grade
+        repaired = grade_data
+        log_msg = "Repair failed; falling back to a full re-grade if needed."
+
+    return {
+        "grade_data": repaired,
+        **_usage(state, result),
+        "repair_attempted": True,
+        "repair_count": state.get("repair_count", 0) + 1,
+        "thinking_process": state.get("thinking_process", []) + [log_msg]
+    }
+
+
 def validate_grade(state: AgentState) -> dict:
     """
     Node 2: The Judge (Quality Assurance Auditor)
@@ -202,71 +847,172 @@ def validate_grade(state: AgentState) -> dict:
     
     score = grade_data.get("score", 0.0)
     critique_points = grade_data.get("critique_points", [])
+    critique_text = " ".join(critique_points).lower()
     
     valid = True
     reason = ""
+    sample_scores = grade_data.get("sample_scores", [])
+    consistency = {"sample_spread": max(sample_scores) - min(sample_scores)} if sample_scores else {}
+
+    # Score-range and total inconsistencies were already fixed locally by _normalize_grade
+    local_logs = [f"Judge: Auto-corrected locally: {c}." for c in grade_data.get("local_corrections", [])]
 
     # Criteria 1: System/Parse Error
     if score == 0.0 and "Error parsing" in str(critique_points):
         valid = False
         reason = "JSON Parsing failed in previous attempt."
 
-    # Criteria 2: Score < Max but Critique says "Perfect" (Inconsistency)
-    # We define "Perfect" loosely as having no negative critique or explicitly saying 'perfect'
-    critique_text = " ".join(critique_points).lower()
-    if score < total_points and ("perfect" in critique_text or "no errors" in critique_text or not critique_points):
-        # Unless the score is very high (e.g. 95%), this is suspicious. 
-        # But sticking to the user prompt's logic:
-        # "Fail: Score is < 10 but Critique says 'Perfect' or 'No errors'." (Assuming 10 is max, here generalized to total_points)
-        if score < total_points:
-             # Double check if it's really claiming perfection
-             if "no errors" in critique_text or "perfect" in critique_text or len(critique_points) == 0:
-                 valid = False
-                 reason = f"Score is {score}/{total_points} (imperfect) but critique claims no errors."
-
-    # Criteria 3: Score is Max but Critique lists specific errors
-    if score == total_points and len(critique_points) > 0:
-        # Filter out empty strings or positive praise disguised as critique
-        # Heuristic: If critique has words like "missing", "incorrect", "fail", "wrong"
-        negative_keywords = ["missing", "incorrect", "fail", "wrong", "error", "should have", "needs"]
-        has_negative = any(keyword in critique_text for keyword in negative_keywords)
-        if has_negative:
-            valid = False
-            reason = f"Score is {score}/{total_points} (perfect) but critique lists specific errors."
-            
-    # Criteria 4: Score checks against Total Points
-    if score > total_points:
+    # Criteria 2: Rubric items without a usable score
+    elif grade_data.get("missing_criteria"):
         valid = False
-        reason = f"Score {score} exceeds total possible points {total_points}."
+        reason = f"No score given for rubric items: {', '.join(grade_data['missing_criteria'])}."
+
+    else:
+        # Criteria 3: Points deducted on a criterion without saying why
+        unexplained = [c["criteria"] for c in grade_data.get("criteria_scores", []) if c["score"] < c["max_points"] and not c["comment"]]
+        if unexplained:
+            valid = False
+            reason = f"Points deducted without explanation for: {', '.join(unexplained)}."
+
+        # Criteria 4: Score is Max but Critique lists specific errors
+        if score == total_points and len(critique_points) > 0:
+            # Heuristic: If critique has words like "missing", "incorrect", "fail", "wrong"
+            negative_keywords = ["missing", "incorrect", "fail", "wrong", "error", "should have", "needs"]
+            has_negative = any(keyword in critique_text for keyword in negative_keywords)
+            if has_negative:
+                valid = False
+                reason = f"Score is {score}/{total_points} (perfect) but critique lists specific errors."
+
+        # Criteria 5 (cascade): the cheap model's samples disagree with each other
+        if valid and len(sample_scores) > 1 and max(sample_scores) - min(sample_scores) > CASCADE_MAX_SPREAD * total_points:
+            valid = False
+            reason = (
+                f"Low self-consistency: {len(sample_scores)} samples scored between "
+                f"{min(sample_scores):g} and {max(sample_scores):g} out of {total_points}."
+            )
 
     # Update State
     current_revision = state.get("revision_number", 0)
     
     if not valid:
         print(f"❌ Grade Rejected: {reason}")
-        return {
+        update = {
+            **consistency,
             "is_valid": False,
             "grader_feedback": reason,
             "revision_number": current_revision + 1,
-            "thinking_process": state.get("thinking_process", []) + [f"Judge: Grade Rejected. {reason}", "Looping back to Grader..."]
+            "thinking_process": state.get("thinking_process", []) + local_logs + [f"Judge: Grade Rejected. {reason}", "Looping back to Grader..."]
         }
+        if state.get("model_tier") == "cheap":
+            # Cascade: any rejection of the cheap model's grade goes to the strong model
+            strong_model = llm_gateway.ENDPOINTS["strong"].model
+            print(f"---ESCALATING TO {strong_model}---")
+            update.update({
+                "model_tier": "strong",
+                "escalated_round": current_revision + 1,
+                "thinking_process": update["thinking_process"][:-1] + [f"Escalating to {strong_model} for a full re-grade..."]
+            })
+        return update
     else:
         print("✅ Grade Validated.")
         return {
+            **consistency,
             "is_valid": True,
             "grader_feedback": "",
             "revision_number": current_revision, # No increment validation passed
-            "thinking_process": state.get("thinking_process", []) + ["Judge: Grade Validated. QA Passed.", "Moving to final feedback generation..."]
+            "thinking_process": state.get("thinking_process", []) + local_logs + ["Judge: Grade Validated. QA Passed.", "Moving to final feedback generation..."]
         }
 
 
-def generate_feedback(state: AgentState) -> dict:
+def _build_grade_result(state: AgentState, final_feedback: str) -> tuple:
+    """
+    Final GradeResult and thinking log from the validated grade_data and the feedback.
+    """
+    grade_data = state["grade_data"]
+    usage = _prompt_sections(state)["usage"]
+
+    # Calculate confidence based on revision count
+    # 0 retries = 0.95 (High)
+    # 1 retry = 0.98 (Very High - Self-Correction worked)
+    # 2 retries = 0.90 (Good)
+    # 3+ retries = 0.75 (Uncertain)
+    revisions = state.get("revision_number", 0)
+    confidence = 0.95
+    if revisions == 1:
+        confidence = 0.99
+    elif revisions == 2:
+        confidence = 0.90
+    elif revisions >= 3:
+        confidence = 0.75
+
+    final_logs = state.get("thinking_process", []) + ["Finalizing feedback in Socratic style...", f"Confidence Score: {int(confidence * 100)}%"]
+
+    # Cost at each tier's prices (consistency samples run on the cheap model)
+    tier_usage = state.get("tier_usage") or {}
+    cost = sum(
+        llm_gateway.cost("cheap" if tier == "samples" else tier, spent["input_tokens"], spent["output_tokens"], spent["cached_tokens"])
+        for tier, spent in tier_usage.items()
+    )
+    cascade_metrics = {}
+    if state.get("cascade"):
+        escalated = state.get("escalated_round") is not None
+        cheap = tier_usage.get("cheap", {})
+        samples = tier_usage.get("samples", {})
+        # Estimated cost without the cascade: an escalated grade's strong-model path is
+        # what the strong model alone would have run; otherwise the cheap model's calls
+        # (without the samples) billed at strong prices
+        baseline = tier_usage.get("strong", {}) if escalated else cheap
+        baseline_cost = llm_gateway.cost("strong", baseline.get("input_tokens", 0), baseline.get("output_tokens", 0),
+                                         baseline.get("cached_tokens", 0))
+        cascade_metrics = {
+            "escalated": int(escalated),
+            "cheap_calls": cheap.get("calls", 0) + samples.get("calls", 0),
+            "cheap_input_tokens": cheap.get("input_tokens", 0) + samples.get("input_tokens", 0),
+            "cheap_output_tokens": cheap.get("output_tokens", 0) + samples.get("output_tokens", 0),
+            "sample_spread": state.get("sample_spread", 0.0),
+            "baseline_cost_usd": round(baseline_cost, 6)
+        }
+
+    # Construct final GradeResult
+    final_result = GradeResult(
+        score=grade_data["score"],
+        feedback=final_feedback,
+        citations=[],
+        thinking_process=final_logs,
+        confidence_score=confidence,
+        criteria_scores=[CriterionScore(**c) for c in grade_data.get("criteria_scores", [])],
+        metrics={
+            "profile": state.get("profile", "standard"),
+            "llm_calls": state.get("llm_calls", 0),
+            "cache_hits": state.get("cache_hits", 0),
+            "input_tokens": state.get("input_tokens", 0),
+            "output_tokens": state.get("output_tokens", 0),
+            "cached_input_tokens": state.get("cached_input_tokens", 0),
+            **{key: usage[key] for key in ("rubric_tokens", "context_tokens", "submission_tokens")},
+            "revisions": revisions,
+            "repairs": state.get("repair_count", 0),
+            "sections": state.get("section_count", 1),
+            "sections_skipped": state.get("sections_skipped", 0),
+            "submission_truncated": int(usage.get("submission_truncated", False)),
+            "local_corrections": len(grade_data.get("local_corrections", [])),
+            "model": llm_gateway.ENDPOINTS[state.get("model_tier", "strong")].model,
+            "cost_usd": round(cost, 6),
+            **cascade_metrics
+        }
+    )
+    return final_result, final_logs
+
+
+async def generate_feedback(state: AgentState) -> dict:
     """
     Node 3: The Mentor (Socratic Tutor)
     Provides feedback without giving the answer.
     """
+    from langchain_core.prompts import ChatPromptTemplate
+
     print("---GENERATING FEEDBACK (NODE 3)---")
-    submission_text = state["submission_text"]
+    # Same token-budgeted submission the Grader saw
+    submission_text = _prompt_sections(state)["submission_text"]
     grade_data = state["grade_data"]
     score = grade_data["score"]
     
@@ -276,35 +1022,11 @@ def generate_feedback(state: AgentState) -> dict:
     rubric = state["rubric"]
     total_points = sum(item.max_points for item in rubric)
     
-    system_prompt = """You are a supportive Academic Mentor and Socratic Tutor.
+    system_prompt = f"""You are a supportive Academic Mentor and Socratic Tutor.
     
     Your goal is to guide the student to improve their work based on the Grader's feedback, WITHOUT doing the work for them.
 
-    **CRITICAL RULE (NO EXPO):**
-    - You are forbidden from stating the correct answer.
-    - Do NOT say "The correct answer is X".
-    - Do NOT perform the calculation for them.
-    - Do NOT show the corrected code.
-    - If they calculated wrong, ask: "Check your division step. What is 10 / 2?" (Allowed)
-    - UNACCEPTABLE: "You got 4, but it should be 5."
-    - ACCEPTABLE: "You got 4. Let's verify that. Is 2 * 4 + 5 equal to 15?"
-    
-    **INSTRUCTIONS:**
-    1. **Concept Explanation**: Explain the underlying concept they missed.
-    2. **Socratic Guidance**: Provide a HINT or a LEADING QUESTION to help them find the answer themselves.
-    3. **Tone**: Encouraging, constructive, but firm on standards.
-
-    **OUTPUT FORMAT**:
-    You MUST output the final feedback in the following Markdown format:
-
-    ✅ **Rubric Strengths**:
-    [List specific criteria where they performed well based on grade_data]
-
-    ⚠️ **Areas for Improvement**:
-    [List specific criteria where they lost points]
-
-    💡 **Guidance**:
-    [Your Socratic hints, conceptual explanations, and leading questions. NO ANSWERS.]
+    {SOCRATIC_FEEDBACK_RULES}
     
     """
     
@@ -328,43 +1050,32 @@ def generate_feedback(state: AgentState) -> dict:
         ("user", user_prompt)
     ])
     
-    chain = prompt | llm
-    
-    feedback_response = chain.invoke({
-        "submission_text": submission_text,
-        "score": score,
-        "total_points": total_points,
-        "critique_points_str": critique_points_str,
-        "rubric_performance_str": rubric_performance_str
-    })
+    messages = prompt.format_messages(
+        submission_text=submission_text,
+        score=score,
+        total_points=total_points,
+        critique_points_str=critique_points_str,
+        rubric_performance_str=rubric_performance_str
+    )
+    feedback_response = await llm_cache.ainvoke_cached(
+        get_llm(state.get("model_tier", "strong")), messages, MENTOR_PROMPT_VERSION,
+        use_cache=state.get("use_cache", True),
+        validate=_is_feedback,
+        hedge=True
+    )
     final_feedback = feedback_response.content
-    
+    final_result, final_logs = _build_grade_result({**state, **_usage(state, feedback_response)}, final_feedback)
 
-    # Calculate confidence based on revision count
-    # 0 retries = 0.95 (High)
-    # 1 retry = 0.98 (Very High - Self-Correction worked)
-    # 2 retries = 0.90 (Good)
-    # 3+ retries = 0.75 (Uncertain)
-    revisions = state.get("revision_number", 0)
-    confidence = 0.95
-    if revisions == 1:
-        confidence = 0.99
-    elif revisions == 2:
-        confidence = 0.90
-    elif revisions >= 3:
-        confidence = 0.75
+    return {"final_feedback": final_feedback, "grade_result": final_result, "thinking_process": final_logs}
 
-    final_logs = state.get("thinking_process", []) + ["Finalizing feedback in Socratic style...", f"Confidence Score: {int(confidence * 100)}%"]
 
-    # Construct final GradeResult
-    final_result = GradeResult(
-        score=score,
-        feedback=final_feedback,
-        citations=[],
-        thinking_process=final_logs,
-        confidence_score=confidence
-    )
-    
+async def finalize_grade(state: AgentState) -> dict:
+    """
+    Node 3 (fast profile): No LLM call; uses the feedback written by grade_fast.
+    """
+    print("---FINALIZING FAST GRADE (NODE 3)---")
+    final_feedback = state["grade_data"]["feedback"]
+    final_result, final_logs = _build_grade_result(state, final_feedback)
     return {"final_feedback": final_feedback, "grade_result": final_result, "thinking_process": final_logs}
 
 
@@ -378,38 +1089,183 @@ def check_validation(state: AgentState):
     revision_number = state.get("revision_number", 0)
     MAX_RETRIES = 3
 
+    fast = state.get("profile") == "fast"
+
     if is_valid:
+        # Fast profile already has its feedback unless the model left it out
+        if fast and state["grade_data"].get("feedback"):
+            return "finalize_grade"
         return "generate_feedback"
     elif revision_number < MAX_RETRIES:
-        return "grade_submission"
+        # Cheap targeted repair first; full re-grade if there is nothing to repair
+        # (unparseable output), the repair itself was rejected, or rubric items were never
+        # scored (the repair prompt has no submission or descriptions to score them from)
+        grade_data = state.get("grade_data", {})
+        parse_failed = "Error parsing" in str(grade_data.get("critique_points", []))
+        missing = bool(grade_data.get("missing_criteria"))
+        # A cascade escalation re-grades from scratch with the strong model
+        escalated = state.get("escalated_round") == revision_number
+        if not parse_failed and not missing and not escalated and not state.get("repair_attempted", False):
+            return "repair_grade"
+        return route_profile(state)
     else:
         # Stop loop, accept best effort (or last effort)
         print("⚠️ Max retries reached. Proceeding with current grade.")
+        if fast and state["grade_data"].get("feedback"):
+            return "finalize_grade"
         return "generate_feedback"
 
 
+def route_profile(state: AgentState):
+    """
+    Picks the grading node for the requested profile, or fans out one grade_criterion
+    call per group of rubric items in per-criterion mode.
+    """
+    if state.get("criterion_fanout"):
+        return _criterion_sends(state)
+    return "grade_fast" if state.get("profile") == "fast" else "grade_submission"
+
+
+def _criterion_sends(state: AgentState) -> list:
+    from langgraph.types import Send
+
+    rubric = state["rubric"]
+    sections = _prompt_sections(state)
+    sends = []
+    for start in range(0, len(rubric), CRITERION_GROUP_SIZE):
+        group = rubric[start:start + CRITERION_GROUP_SIZE]
+        rubric_str = "\n".join([f"- {item.criteria} (Max Points: {item.max_points}): {item.description}" for item in group])
+        sends.append(Send("grade_criterion", {
+            "round": state.get("revision_number", 0),
+            "rubric": group,
+            "prompt_sections": {**sections, "rubric_str": rubric_str},
+            "grader_feedback": state.get("grader_feedback", ""),
+            "use_cache": state.get("use_cache", True),
+            "model_tier": state.get("model_tier", "strong")
+        }))
+    return sends
+
+
+def route_length(state: AgentState):
+    """
+    Sends submissions that overflow the prompt budget through map_sections first.
+    """
+    if LONG_DOC_MODE and _prompt_sections(state)["usage"]["submission_truncated"]:
+        return "map_sections"
+    return route_profile(state)
+
+
 # --- 5. BUILD GRAPH ---
-workflow = StateGraph(AgentState)
+def build_graph():
+    from langgraph.graph import StateGraph, END
 
-workflow.add_node("retrieve", retrieve)
-workflow.add_node("grade_submission", grade_submission)
-workflow.add_node("validate_grade", validate_grade)
-workflow.add_node("generate_feedback", generate_feedback)
+    workflow = StateGraph(AgentState)
 
-workflow.set_entry_point("retrieve")
+    workflow.add_node("retrieve", retrieve)
+    workflow.add_node("map_sections", map_sections)
+    workflow.add_node("grade_submission", grade_submission)
+    workflow.add_node("grade_fast", grade_fast)
+    workflow.add_node("grade_criterion", grade_criterion)
+    workflow.add_node("merge_criteria", merge_criteria)
+    workflow.add_node("repair_grade", repair_grade)
+    workflow.add_node("validate_grade", validate_grade)
+    workflow.add_node("generate_feedback", generate_feedback)
+    workflow.add_node("finalize_grade", finalize_grade)
 
-workflow.add_edge("retrieve", "grade_submission")
-workflow.add_edge("grade_submission", "validate_grade")
+    workflow.set_entry_point("retrieve")
 
-workflow.add_conditional_edges(
-    "validate_grade",
-    check_validation,
-    {
-        "grade_submission": "grade_submission",
-        "generate_feedback": "generate_feedback"
-    }
-)
+    workflow.add_conditional_edges(
+        "retrieve",
+        route_length,
+        {
+            "map_sections": "map_sections",
+            "grade_submission": "grade_submission",
+            "grade_fast": "grade_fast",
+            "grade_criterion": "grade_criterion"
+        }
+    )
+    workflow.add_conditional_edges(
+        "map_sections",
+        route_profile,
+        {
+            "grade_submission": "grade_submission",
+            "grade_fast": "grade_fast",
+            "grade_criterion": "grade_criterion"
+        }
+    )
+    workflow.add_edge("grade_submission", "validate_grade")
+    workflow.add_edge("grade_fast", "validate_grade")
+    workflow.add_edge("grade_criterion", "merge_criteria")
+    workflow.add_edge("merge_criteria", "validate_grade")
+    workflow.add_edge("repair_grade", "validate_grade")
+
+    workflow.add_conditional_edges(
+        "validate_grade",
+        check_validation,
+        {
+            "grade_submission": "grade_submission",
+            "grade_fast": "grade_fast",
+            "grade_criterion": "grade_criterion",
+            "repair_grade": "repair_grade",
+            "generate_feedback": "generate_feedback",
+            "finalize_grade": "finalize_grade"
+        }
+    )
+
+    workflow.add_edge("generate_feedback", END)
+    workflow.add_edge("finalize_grade", END)
+
+    return workflow.compile()
+
+
+@lru_cache(maxsize=1)
+def get_app():
+    """
+    Compiled grading graph, built on first use.
+    """
+    return build_graph()
+
+
+async def astream_grading(inputs: dict):
+    """
+    Runs the grading graph and yields (event, data) pairs as it progresses:
+    - ("thinking", {"node", "message"}) for each new thinking_process entry, as its node finishes
+    - ("token", {"text"}) for each token of the Socratic feedback as the Mentor generates it
+    - ("result", GradeResult dict) once the graph completes
+    """
+    seen_thoughts = 0
+    grade_result = None
+    streamed_feedback = False
+
+    async for mode, chunk in get_app().astream(inputs, stream_mode=["updates", "messages"]):
+        if mode == "messages":
+            message, metadata = chunk
+            if metadata.get("langgraph_node") == "generate_feedback" and message.content:
+                streamed_feedback = True
+                yield "token", {"text": message.content}
+            continue
+
+        for node, update in chunk.items():
+            if not update:
+                continue
+            thoughts = update.get("thinking_process", [])
+            for thought in thoughts[seen_thoughts:]:
+                yield "thinking", {"node": node, "message": thought}
+            seen_thoughts = max(seen_thoughts, len(thoughts))
+            # Fast profile, cache hits and hedged answers: the feedback arrives whole
+            # rather than token by token
+            if node in ("finalize_grade", "generate_feedback") and update.get("final_feedback") and not streamed_feedback:
+                yield "token", {"text": update["final_feedback"]}
+            if update.get("grade_result") is not None:
+                grade_result = update["grade_result"]
+
+    if grade_result is None:
+        raise RuntimeError("Grading finished without a result.")
+    yield "result", grade_result.model_dump()
 
-workflow.add_edge("generate_feedback", END)
 
-app = workflow.compile()
+def __getattr__(name):
+    # Keeps `agent.app` working while deferring the LangGraph import until first access
+    if name == "app":
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,116 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from functools import lru_cache
+from typing import List, Dict, Callable, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from backend.src.models import RubricItem
+
+# Constants
+# Opt-in: grading then retrieves from a per-assignment candidate set instead of searching
+# the whole corpus for each submission (see rag.retrieve_submission_context)
+CONTEXT_CACHE_ENABLED = os.getenv("CONTEXT_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+CONTEXT_CACHE_TTL_SECONDS = float(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "3600"))
+CONTEXT_CACHE_MAX_ENTRIES = int(os.getenv("CONTEXT_CACHE_MAX_ENTRIES", "256"))
+
+
+def assignment_key(rubric: List["RubricItem"]) -> str:
+    """
+    Identifies an assignment by its rubric, so every submission graded against the
+    same rubric shares one entry.
+    """
+    payload = [[item.criteria, item.description, item.max_points] for item in rubric]
+    return hashlib.sha256(json.dumps(payload).encode("utf-8")).hexdigest()
+
+
+class AssignmentContextCache:
+    """
+    In-memory cache of the course-material chunks relevant to an assignment.
+    Entries expire after ttl seconds and are dropped as soon as the corpus changes
+    (invalidate() is called on every ingest or delete). Concurrent misses on the same
+    key wait for a single computation instead of each querying the vector store.
+    """
+
+    def __init__(self, ttl: float = CONTEXT_CACHE_TTL_SECONDS, max_entries: int = CONTEXT_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self._entries: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+
+    def _fresh(self, entry: Optional[dict]) -> bool:
+        return (
+            entry is not None
+            and entry["generation"] == self.generation
+            and time.monotonic() - entry["created_at"] < self.ttl
+        )
+
+    def get_or_compute(self, key: str, compute: Callable[[], dict]) -> dict:
+        with self._lock:
+            entry = self._entries.get(key)
+            if self._fresh(entry):
+                self.hits += 1
+                return entry["value"]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if self._fresh(entry):
+                    self.hits += 1
+                    return entry["value"]
+                self.misses += 1
+                generation = self.generation
+
+            value = compute()
+
+            with self._lock:
+                # A corpus change during the computation makes the result stale already
+                if generation == self.generation:
+                    self._entries[key] = {"value": value, "generation": generation, "created_at": time.monotonic()}
+                    self._evict()
+            return value
+
+    def _evict(self):
+        # Caller must hold _lock; drops the oldest entries beyond max_entries
+        excess = len(self._entries) - self.max_entries
+        if excess > 0:
+            for key in sorted(self._entries, key=lambda k: self._entries[k]["created_at"])[:excess]:
+                del self._entries[key]
+
+    def invalidate(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = sum(1 for entry in self._entries.values() if self._fresh(entry))
+        lookups = self.hits + self.misses
+        return {
+            "enabled": CONTEXT_CACHE_ENABLED,
+            "entries": entries,
+            "ttl_seconds": self.ttl,
+            "generation": self.generation,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+@lru_cache(maxsize=1)
+def get_cache() -> AssignmentContextCache:
+    return AssignmentContextCache()
+
+
+def invalidate():
+    """
+    Drops every cached assignment context; called whenever course materials change.
+    """
+    get_cache().invalidate()
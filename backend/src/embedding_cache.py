@@ -0,0 +1,145 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from functools import lru_cache
+from typing import List, Optional, TYPE_CHECKING
+
+# langchain_core is only needed once embeddings are built (see CachedEmbeddings), not at API startup
+if TYPE_CHECKING:
+    from langchain_core.embeddings import Embeddings
+
+# Constants
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./backend/data/embedding_cache.sqlite3")
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    SQLite store for chunk embeddings (keyed by a hash of model + chunk text) and the
+    file-level manifest (source -> content hash) used to skip unchanged uploads.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS file_manifest ("
+            "source TEXT PRIMARY KEY, sha256 TEXT NOT NULL, chunk_count INTEGER NOT NULL, ingested_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    # --- Embeddings ---
+
+    def get_vectors(self, keys: List[str]) -> dict:
+        found = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch)
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+        return found
+
+    def put_vectors(self, items: dict):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, array("f", vector).tobytes()) for key, vector in items.items()]
+            )
+            self._conn.commit()
+
+    # --- File manifest ---
+
+    def get_file_hash(self, source: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT sha256 FROM file_manifest WHERE source = ?", (source,)).fetchone()
+        return row[0] if row else None
+
+    def record_file(self, source: str, sha256: str, chunk_count: int):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO file_manifest (source, sha256, chunk_count, ingested_at) VALUES (?, ?, ?, ?)",
+                (source, sha256, chunk_count, time.time())
+            )
+            self._conn.commit()
+
+    def forget_file(self, source: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM file_manifest WHERE source = ?", (source,))
+            self._conn.commit()
+
+
+@lru_cache(maxsize=1)
+def get_store() -> EmbeddingStore:
+    return EmbeddingStore()
+
+
+class _CachedEmbeddings:
+    """
+    Wraps an Embeddings backend so each distinct chunk text is embedded only once.
+    Vectors are stored as float32 under sha256(namespace + text); only cache misses
+    reach the underlying model, in a single batch.
+    """
+
+    def __init__(self, underlying: "Embeddings", namespace: str, store: Optional[EmbeddingStore] = None):
+        self.underlying = underlying
+        self.namespace = namespace
+        self.store = store or get_store()
+
+    def _key(self, text: str) -> str:
+        return content_hash(f"{self.namespace}\x00{text}".encode("utf-8"))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        cached = self.store.get_vectors(list(set(keys)))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.store.put_vectors(computed)
+            cached.update(computed)
+
+        print(f"Embedding cache: {len(texts) - len(missing)}/{len(texts)} chunks reused, {len(missing)} embedded")
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        # Queries are rarely repeated verbatim, so they go straight to the model
+        return self.underlying.embed_query(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Several query embeddings in one uncached model batch.
+        """
+        return self.underlying.embed_documents(texts)
+
+
+@lru_cache(maxsize=1)
+def _cached_embeddings_class() -> type:
+    # The langchain Embeddings base class is only imported when the first model is built
+    from langchain_core.embeddings import Embeddings
+    return type("CachedEmbeddings", (_CachedEmbeddings, Embeddings), {"__module__": __name__, "__doc__": _CachedEmbeddings.__doc__})
+
+
+def __getattr__(name):
+    # Keeps `embedding_cache.CachedEmbeddings` working while deferring the langchain_core import
+    if name == "CachedEmbeddings":
+        return _cached_embeddings_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
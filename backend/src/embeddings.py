@@ -0,0 +1,136 @@
+import os
+import math
+import platform
+from typing import List, TYPE_CHECKING
+
+# langchain_huggingface pulls in sentence-transformers/torch; import it only when a model is built
+if TYPE_CHECKING:
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+# Constants
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+# torch | onnx | onnx-int8
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+# 0 keeps the runtime's default thread count
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+# Pre-quantized (dynamic int8) export shipped in the model repo; by default the file
+# matching the CPU's instruction set is picked (see onnx_int8_file)
+EMBEDDING_ONNX_INT8_FILE = os.getenv("EMBEDDING_ONNX_INT8_FILE", "")
+# Opt-in: check non-torch backends against torch on load (loads the torch model too) and
+# reject them below this cosine similarity. For a one-off check run scripts/bench_embeddings.py.
+EMBEDDING_VERIFY_PARITY = os.getenv("EMBEDDING_VERIFY_PARITY", "false").lower() in ("1", "true", "yes")
+PARITY_MIN_COSINE = float(os.getenv("EMBEDDING_PARITY_MIN_COSINE", "0.99"))
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+PARITY_PROBES = [
+    "Write a Python program that computes the volume of a tire.",
+    "The thesis statement is clear and the argument is well organized.",
+    "Photosynthesis converts light energy into chemical energy stored in glucose.",
+    "def compute_volume(width, ratio, diameter): return math.pi * width ** 2 * ratio",
+    "The student cites relevant evidence but the conclusion is missing.",
+]
+
+
+def _cpu_flags() -> set:
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    return set(line.split(":", 1)[1].split())
+    except OSError:
+        pass
+    return set()
+
+
+def onnx_int8_file() -> str:
+    """
+    EMBEDDING_ONNX_INT8_FILE if set, else the int8 export for this CPU: ARM64,
+    AVX-512 VNNI or AVX-512 where detected, otherwise the portable AVX2 build.
+    """
+    if EMBEDDING_ONNX_INT8_FILE:
+        return EMBEDDING_ONNX_INT8_FILE
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "onnx/model_qint8_arm64.onnx"
+    flags = _cpu_flags()
+    if "avx512_vnni" in flags:
+        return "onnx/model_qint8_avx512_vnni.onnx"
+    if "avx512f" in flags:
+        return "onnx/model_qint8_avx512.onnx"
+    return "onnx/model_quint8_avx2.onnx"
+
+
+def _model_kwargs(backend: str) -> dict:
+    if backend == "torch":
+        if EMBEDDING_THREADS:
+            import torch
+            torch.set_num_threads(EMBEDDING_THREADS)
+        return {}
+
+    # ONNX Runtime via sentence-transformers (requires optimum[onnxruntime])
+    onnx_kwargs = {"provider": "CPUExecutionProvider"}
+    if EMBEDDING_THREADS:
+        import onnxruntime
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = EMBEDDING_THREADS
+        onnx_kwargs["session_options"] = session_options
+    if backend == "onnx-int8":
+        onnx_kwargs["file_name"] = onnx_int8_file()
+    return {"backend": "onnx", "model_kwargs": onnx_kwargs}
+
+
+def build_embeddings(backend: str = EMBEDDING_BACKEND, batch_size: int = EMBEDDING_BATCH_SIZE) -> "HuggingFaceEmbeddings":
+    """
+    Loads all-MiniLM-L6-v2 on the requested backend with the configured batch size.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}'. Expected one of {BACKENDS}.")
+    from langchain_huggingface import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL_NAME,
+        model_kwargs=_model_kwargs(backend),
+        encode_kwargs={"batch_size": batch_size}
+    )
+
+
+def cosine_similarity(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def parity(candidate: "HuggingFaceEmbeddings", reference: "HuggingFaceEmbeddings", texts: List[str] = PARITY_PROBES) -> float:
+    """
+    Lowest cosine similarity between candidate and reference vectors for the same texts.
+    """
+    candidate_vectors = candidate.embed_documents(texts)
+    reference_vectors = reference.embed_documents(texts)
+    return min(cosine_similarity(c, r) for c, r in zip(candidate_vectors, reference_vectors))
+
+
+def load_embeddings() -> tuple:
+    """
+    Loads the configured backend, falling back to torch if the ONNX runtime is missing
+    or (with EMBEDDING_VERIFY_PARITY) its output drifts below PARITY_MIN_COSINE.
+    Returns (embeddings, backend_name).
+    """
+    backend = EMBEDDING_BACKEND
+    if backend == "torch":
+        return build_embeddings("torch"), "torch"
+
+    try:
+        embeddings = build_embeddings(backend)
+    except Exception as e:
+        print(f"WARNING: Could not load '{backend}' embedding backend ({e}). Falling back to torch.")
+        return build_embeddings("torch"), "torch"
+
+    if EMBEDDING_VERIFY_PARITY:
+        reference = build_embeddings("torch")
+        score = parity(embeddings, reference)
+        if score < PARITY_MIN_COSINE:
+            print(f"WARNING: '{backend}' embeddings diverge from torch (min cosine {score:.4f} < {PARITY_MIN_COSINE}). Falling back to torch.")
+            return reference, "torch"
+        print(f"Embedding backend '{backend}' verified against torch (min cosine {score:.4f}).")
+
+    return embeddings, backend
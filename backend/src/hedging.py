@@ -0,0 +1,215 @@
+import os
+import asyncio
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Dict, Callable, Optional, TYPE_CHECKING
+from backend.src import llm_gateway
+
+if TYPE_CHECKING:
+    from langchain_core.messages import BaseMessage, AIMessage
+
+# Constants
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+# A call still unanswered at this percentile of recent latencies (per prompt) gets a duplicate
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+# Delay used until HEDGE_MIN_SAMPLES latencies have been seen for a prompt
+HEDGE_INITIAL_DELAY_SECONDS = float(os.getenv("HEDGE_INITIAL_DELAY_SECONDS", "30"))
+HEDGE_MIN_DELAY_SECONDS = float(os.getenv("HEDGE_MIN_DELAY_SECONDS", "2"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", "200"))
+# Hedges may add at most this many percent to the calls made
+HEDGE_MAX_EXTRA_PERCENT = float(os.getenv("HEDGE_MAX_EXTRA_PERCENT", "5"))
+
+
+class LatencyTracker:
+    """
+    Rolling window of call latencies for one model and prompt; the hedge delay is the
+    HEDGE_PERCENTILE of the window.
+    """
+
+    def __init__(self, window: int = HEDGE_WINDOW):
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def delay(self) -> float:
+        with self._lock:
+            if len(self._latencies) < HEDGE_MIN_SAMPLES:
+                return HEDGE_INITIAL_DELAY_SECONDS
+            ordered = sorted(self._latencies)
+        return max(ordered[int(HEDGE_PERCENTILE / 100 * (len(ordered) - 1))], HEDGE_MIN_DELAY_SECONDS)
+
+
+class HedgeBudget:
+    """
+    Caps hedges at HEDGE_MAX_EXTRA_PERCENT of calls: every call earns a fraction of a
+    credit and every hedge spends a whole one, so bursts of stragglers (e.g. a provider
+    slowdown) cannot multiply the load.
+    """
+
+    def __init__(self, extra_percent: float = HEDGE_MAX_EXTRA_PERCENT, max_credits: float = 10.0):
+        self.rate = extra_percent / 100
+        self.max_credits = max_credits
+        self.credits = 0.0
+        self._lock = threading.Lock()
+
+    def earn(self):
+        with self._lock:
+            self.credits = min(self.credits + self.rate, self.max_credits)
+
+    def spend(self) -> bool:
+        with self._lock:
+            if self.credits < 1.0:
+                return False
+            self.credits -= 1.0
+            return True
+
+
+_trackers: Dict[str, LatencyTracker] = {}
+# Prompt version of the hedgeable call in progress; the gateway reports its latencies (see latency_scope)
+_prompt_version: ContextVar[Optional[str]] = ContextVar("hedging_prompt_version", default=None)
+_budget = HedgeBudget()
+_counts = {"calls": 0, "hedged": 0, "hedge_wins": 0, "over_budget": 0}
+_counts_lock = threading.Lock()
+
+
+def _count(name: str):
+    with _counts_lock:
+        _counts[name] += 1
+
+
+def _tracker(model: str, prompt_version: str) -> LatencyTracker:
+    with _counts_lock:
+        return _trackers.setdefault(f"{model}:{prompt_version}", LatencyTracker())
+
+
+@contextmanager
+def latency_scope(prompt_version: str):
+    """
+    Attributes the LLM requests made inside the block to prompt_version, so the
+    gateway's measured latencies warm that prompt's hedge delay (hedging on or off).
+    """
+    token = _prompt_version.set(prompt_version)
+    try:
+        yield
+    finally:
+        _prompt_version.reset(token)
+
+
+def _record_latency(model: str, seconds: float):
+    # Called by the gateway for each successful request (streams: until the response starts)
+    prompt_version = _prompt_version.get()
+    if prompt_version is not None:
+        _tracker(model, prompt_version).record(seconds)
+
+
+llm_gateway.on_latency(_record_latency)
+
+
+def _first_token_handler(started: asyncio.Event):
+    from langchain_core.callbacks import AsyncCallbackHandler
+
+    class FirstTokenHandler(AsyncCallbackHandler):
+        async def on_llm_new_token(self, token: str, **kwargs):
+            if token:
+                started.set()
+
+    return FirstTokenHandler()
+
+
+def _with_handler(callbacks, handler):
+    # The run's inherited callbacks (e.g. LangGraph's token stream) plus handler, on a copy
+    # so the handler does not stay attached to the run's later calls
+    if callbacks is None:
+        return [handler]
+    if isinstance(callbacks, list):
+        return callbacks + [handler]
+    callbacks = callbacks.copy()
+    callbacks.add_handler(handler, inherit=False)
+    return callbacks
+
+
+def _hedge_target(llm):
+    # Stragglers of the grading model go to the fallback provider when one is configured
+    if "fallback" in llm_gateway.ENDPOINTS and getattr(llm, "model_name", None) == llm_gateway.ENDPOINTS["strong"].model:
+        return llm_gateway.get_llm("fallback")
+    return llm
+
+
+def _valid(task: asyncio.Task, validate: Optional[Callable[[str], bool]]) -> bool:
+    if task.cancelled() or task.exception() is not None:
+        return False
+    return validate is None or validate(task.result().content)
+
+
+async def ainvoke_hedged(llm, messages: List["BaseMessage"], prompt_version: str,
+                         validate: Optional[Callable[[str], bool]] = None, **bind_kwargs) -> "AIMessage":
+    """
+    Calls llm (bound with bind_kwargs) and, if no answer has arrived after the hedge
+    delay for this model and prompt, sends a duplicate (to the fallback provider if
+    configured) and returns the first valid answer, cancelling the other call. A streamed
+    call that has already produced tokens is never hedged or replaced, so streamed output
+    is never mixed.
+    """
+    from langchain_core.runnables.config import ensure_config
+
+    tracker = _tracker(getattr(llm, "model_name", type(llm).__name__), prompt_version)
+    started = asyncio.Event()
+    callbacks = _with_handler(ensure_config().get("callbacks"), _first_token_handler(started))
+    runnable = llm.bind(**bind_kwargs) if bind_kwargs else llm
+
+    primary = asyncio.ensure_future(runnable.ainvoke(messages, config={"callbacks": callbacks}))
+    _count("calls")
+    _budget.earn()
+
+    done, _ = await asyncio.wait([primary], timeout=tracker.delay())
+    if done or started.is_set():
+        return await primary
+    if not _budget.spend():
+        _count("over_budget")
+        return await primary
+
+    _count("hedged")
+    target = _hedge_target(llm)
+    hedge_runnable = target.bind(**bind_kwargs) if bind_kwargs else target
+    # The duplicate runs without the run's callbacks so its tokens never reach the stream
+    hedge = asyncio.ensure_future(hedge_runnable.ainvoke(messages, config={"callbacks": []}))
+    committed = asyncio.ensure_future(started.wait())
+    pending = {primary, hedge, committed}
+    try:
+        while True:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if primary in done and _valid(primary, validate):
+                return primary.result()
+            if hedge in done and _valid(hedge, validate):
+                _count("hedge_wins")
+                return hedge.result()
+            if committed in done and not primary.done():
+                # The primary began streaming to the client first: it is the answer
+                hedge.cancel()
+                return await primary
+            if primary.done() and hedge.done():
+                # Neither answer is valid; the caller handles the primary's as usual
+                return primary.result()
+    finally:
+        for task in (primary, hedge, committed):
+            if not task.done():
+                task.cancel()
+
+
+def stats() -> dict:
+    with _counts_lock:
+        counts = dict(_counts)
+        trackers = dict(_trackers)
+    return {
+        "enabled": HEDGE_ENABLED,
+        **counts,
+        "extra_load": counts["hedged"] / counts["calls"] if counts["calls"] else 0.0,
+        "max_extra_percent": HEDGE_MAX_EXTRA_PERCENT,
+        "delay_seconds": {key: round(tracker.delay(), 3) for key, tracker in trackers.items()}
+    }
@@ -0,0 +1,481 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import hashlib
+import asyncio
+import threading
+import statistics
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple
+from backend.src.models import RubricItem, StudentSubmission, GradeResult, BatchItemResult, BatchJobStatus
+from backend.src import agent
+from backend.src import rag
+from backend.src import context_cache
+from backend.src import llm_gateway
+
+# Upper bound on per-job concurrency, regardless of what the client asks for
+MAX_BATCH_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+
+# Persistent job queue: jobs survive restarts and unfinished items are resumed
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "./backend/data/job_queue.sqlite3")
+# Grading workers per process, shared by all jobs
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", str(MAX_BATCH_CONCURRENCY)))
+# A claimed item becomes visible to other workers again if its lease is not renewed for this long
+# (i.e. its worker crashed or the server was killed)
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# A failed attempt is retried after this many seconds times the attempt number
+JOB_RETRY_DELAY_SECONDS = float(os.getenv("JOB_RETRY_DELAY_SECONDS", "5"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+# Finished jobs older than this are deleted at startup
+JOB_RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", "30"))
+
+
+def idempotency_key(student_id: str, text: str, rubric: List[RubricItem], options: dict) -> str:
+    """
+    Identifies one grading of a submission: the student, a hash of the submission text,
+    the assignment (rubric) and everything that changes the grade (profile, fan-out,
+    cascade, prompt version). A job item whose key was already graded reuses that result.
+    """
+    content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    payload = [student_id, content_hash, context_cache.assignment_key(rubric), options, agent.GRADER_PROMPT_VERSION]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class JobQueue:
+    """
+    SQLite-backed queue of batch grading items. Workers claim one item at a time under a
+    lease that they renew while grading; an item whose lease expires (its worker died) is
+    claimed again, up to JOB_MAX_ATTEMPTS attempts. Results are only written by the
+    worker still holding the lease.
+    A submission repeated within a job is graded once: the repeats are stored as
+    'duplicate' items that take the first one's outcome when it is settled.
+    Calls block on SQLite; call them from a worker thread, not the event loop.
+    """
+
+    def __init__(self, path: str = JOB_QUEUE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Autocommit; claims open their own write transaction
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS batch_jobs ("
+            "job_id TEXT PRIMARY KEY, rubric TEXT NOT NULL, options TEXT NOT NULL, "
+            "concurrency INTEGER NOT NULL, total INTEGER NOT NULL, created_at REAL NOT NULL, finished_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS batch_items ("
+            "job_id TEXT NOT NULL, position INTEGER NOT NULL, student_id TEXT NOT NULL, submission TEXT NOT NULL, "
+            "idempotency_key TEXT NOT NULL, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+            "available_at REAL NOT NULL, lease_owner TEXT, lease_expires_at REAL, "
+            "result TEXT, error TEXT, latency_seconds REAL, "
+            "PRIMARY KEY (job_id, position))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_batch_items_status ON batch_items(status, available_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_batch_items_key ON batch_items(idempotency_key, status)")
+
+    @contextmanager
+    def _transaction(self):
+        # Write transaction under the lock, rolled back if any statement fails
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def create(self, submissions: List[StudentSubmission], rubric: List[RubricItem], concurrency: int, options: dict) -> Tuple[str, int]:
+        """
+        Stores a job and its items; returns the job id, how many items were already graded
+        by an earlier job (same idempotency key, only when the job uses the cache) and how
+        many repeat an earlier item of this job.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        rubric_json = json.dumps([item.model_dump() for item in rubric])
+        items = []
+        reused = 0
+        seen = set()
+        with self._transaction():
+            for position, submission in enumerate(submissions):
+                key = idempotency_key(submission.student_id, submission.text, rubric, options)
+                row = self._conn.execute(
+                    "SELECT result FROM batch_items WHERE idempotency_key = ? AND status = 'completed' LIMIT 1", (key,)
+                ).fetchone() if options["use_cache"] else None
+                if row:
+                    status, result = "completed", row[0]
+                    reused += 1
+                else:
+                    status, result = ("duplicate" if key in seen else "pending"), None
+                    seen.add(key)
+                items.append((job_id, position, submission.student_id, submission.text, key, status, now, result))
+
+            self._conn.execute(
+                "INSERT INTO batch_jobs (job_id, rubric, options, concurrency, total, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, rubric_json, json.dumps(options), concurrency, len(submissions), now)
+            )
+            self._conn.executemany(
+                "INSERT INTO batch_items (job_id, position, student_id, submission, idempotency_key, status, available_at, result) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                items
+            )
+        duplicates = sum(item[5] == "duplicate" for item in items)
+        return job_id, reused, duplicates
+
+    def claim(self, worker_id: str) -> Optional[dict]:
+        """
+        Leases the oldest runnable item (pending and due, or running with an expired lease)
+        of a job that is below its concurrency limit. Items whose lease expired on their
+        last attempt are marked failed instead.
+        """
+        with self._transaction():
+            while True:
+                now = time.time()
+                row = self._conn.execute(
+                    "SELECT i.job_id, i.position, i.student_id, i.submission, i.idempotency_key, i.attempts, j.rubric, j.options "
+                    "FROM batch_items i JOIN batch_jobs j ON j.job_id = i.job_id "
+                    "WHERE ((i.status = 'pending' AND i.available_at <= ?) OR (i.status = 'running' AND i.lease_expires_at <= ?)) "
+                    "AND (SELECT COUNT(*) FROM batch_items r WHERE r.job_id = i.job_id AND r.status = 'running' "
+                    "     AND r.lease_expires_at > ?) < j.concurrency "
+                    "ORDER BY j.created_at, i.position LIMIT 1",
+                    (now, now, now)
+                ).fetchone()
+                if row is None:
+                    return None
+                job_id, position, student_id, submission, key, attempts, rubric, options = row
+                if attempts >= JOB_MAX_ATTEMPTS:
+                    self._conn.execute(
+                        "UPDATE batch_items SET status = 'failed', lease_owner = NULL, "
+                        "error = COALESCE(error, 'Lease expired on the last attempt') WHERE job_id = ? AND position = ?",
+                        (job_id, position)
+                    )
+                    self._settle_duplicates(job_id, position, key)
+                    self._finish_if_done(job_id)
+                    continue
+                self._conn.execute(
+                    "UPDATE batch_items SET status = 'running', attempts = attempts + 1, lease_owner = ?, lease_expires_at = ? "
+                    "WHERE job_id = ? AND position = ?",
+                    (worker_id, now + JOB_LEASE_SECONDS, job_id, position)
+                )
+                return {
+                    "job_id": job_id,
+                    "position": position,
+                    "student_id": student_id,
+                    "text": submission,
+                    "key": key,
+                    "attempt": attempts + 1,
+                    "rubric": [RubricItem(**item) for item in json.loads(rubric)],
+                    "options": json.loads(options)
+                }
+
+    def _update_leased(self, item: dict, worker_id: str, assignments: str, params: tuple) -> bool:
+        with self._lock:
+            return self._update_leased_locked(item, worker_id, assignments, params)
+
+    def _update_leased_locked(self, item: dict, worker_id: str, assignments: str, params: tuple) -> bool:
+        cursor = self._conn.execute(
+            f"UPDATE batch_items SET {assignments} WHERE job_id = ? AND position = ? AND status = 'running' AND lease_owner = ?",
+            params + (item["job_id"], item["position"], worker_id)
+        )
+        return cursor.rowcount == 1
+
+    def _settle_duplicates(self, job_id: str, position: int, key: str):
+        # Repeats of a settled item within its job take its outcome; they were never graded themselves
+        self._conn.execute(
+            "UPDATE batch_items SET (status, result, error) = "
+            "(SELECT status, result, error FROM batch_items WHERE job_id = ? AND position = ?) "
+            "WHERE job_id = ? AND idempotency_key = ? AND status = 'duplicate'",
+            (job_id, position, job_id, key)
+        )
+
+    def renew(self, item: dict, worker_id: str) -> bool:
+        return self._update_leased(item, worker_id, "lease_expires_at = ?", (time.time() + JOB_LEASE_SECONDS,))
+
+    def complete(self, item: dict, worker_id: str, result: GradeResult, latency: float) -> bool:
+        with self._transaction():
+            if not self._update_leased_locked(
+                item, worker_id, "status = 'completed', result = ?, error = NULL, latency_seconds = ?, lease_owner = NULL",
+                (result.model_dump_json(), latency)
+            ):
+                return False
+            self._settle_duplicates(item["job_id"], item["position"], item["key"])
+        return True
+
+    def fail(self, item: dict, worker_id: str, error: str, latency: float) -> bool:
+        """
+        Records a failed attempt: the item is retried after a delay, or failed for good
+        after JOB_MAX_ATTEMPTS attempts.
+        """
+        if item["attempt"] >= JOB_MAX_ATTEMPTS:
+            with self._transaction():
+                if not self._update_leased_locked(
+                    item, worker_id, "status = 'failed', error = ?, latency_seconds = ?, lease_owner = NULL", (error, latency)
+                ):
+                    return False
+                self._settle_duplicates(item["job_id"], item["position"], item["key"])
+            return True
+        return self._update_leased(
+            item, worker_id, "status = 'pending', error = ?, available_at = ?, lease_owner = NULL",
+            (error, time.time() + JOB_RETRY_DELAY_SECONDS * item["attempt"])
+        )
+
+    def release(self, item: dict, worker_id: str) -> bool:
+        # Interrupted by a shutdown: hand the item back without using up an attempt
+        return self._update_leased(
+            item, worker_id, "status = 'pending', attempts = attempts - 1, available_at = ?, lease_owner = NULL", (time.time(),)
+        )
+
+    def finish_if_done(self, job_id: str) -> bool:
+        """
+        Marks the job finished once no item is pending or running. Returns True only for the
+        call that finished it.
+        """
+        with self._lock:
+            return self._finish_if_done(job_id)
+
+    def _finish_if_done(self, job_id: str) -> bool:
+        cursor = self._conn.execute(
+            "UPDATE batch_jobs SET finished_at = ? WHERE job_id = ? AND finished_at IS NULL AND NOT EXISTS "
+            "(SELECT 1 FROM batch_items WHERE job_id = ? AND status IN ('pending', 'running', 'duplicate'))",
+            (time.time(), job_id, job_id)
+        )
+        return cursor.rowcount == 1
+
+    def get(self, job_id: str) -> Optional[Tuple[dict, List[tuple]]]:
+        with self._lock:
+            job = self._conn.execute(
+                "SELECT concurrency, total, options, finished_at FROM batch_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            if job is None:
+                return None
+            items = self._conn.execute(
+                "SELECT student_id, status, attempts, result, error, latency_seconds FROM batch_items "
+                "WHERE job_id = ? ORDER BY position", (job_id,)
+            ).fetchall()
+        concurrency, total, options, finished_at = job
+        return {"concurrency": concurrency, "total": total, "options": json.loads(options), "finished": finished_at is not None}, items
+
+    def unfinished(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM batch_items WHERE status IN ('pending', 'running')").fetchone()[0]
+
+    def purge(self, older_than_days: float = JOB_RETENTION_DAYS) -> int:
+        cutoff = time.time() - older_than_days * 86400
+        with self._transaction():
+            self._conn.execute(
+                "DELETE FROM batch_items WHERE job_id IN (SELECT job_id FROM batch_jobs WHERE finished_at < ?)", (cutoff,)
+            )
+            deleted = self._conn.execute("DELETE FROM batch_jobs WHERE finished_at < ?", (cutoff,)).rowcount
+        return deleted
+
+
+@lru_cache(maxsize=1)
+def get_queue() -> JobQueue:
+    return JobQueue()
+
+
+# Worker tasks of this process, and the event that wakes them when a job is added
+_workers: List[asyncio.Task] = []
+_wakeup: Optional[asyncio.Event] = None
+# Strong references so background context precomputation is not garbage collected
+_tasks: Dict[str, asyncio.Task] = {}
+
+
+async def create_job(submissions: List[StudentSubmission], rubric: List[RubricItem], concurrency: int, use_cache: bool = True, profile: str = "standard",
+               criterion_fanout: bool = False, cascade: Optional[bool] = None) -> BatchJobStatus:
+    """
+    Stores a batch grading job in the persistent queue and wakes the workers.
+    """
+    if cascade is None:
+        cascade = agent.CASCADE_ENABLED
+    options = {"use_cache": use_cache, "profile": profile, "criterion_fanout": criterion_fanout, "cascade": cascade}
+    concurrency = max(1, min(concurrency, MAX_BATCH_CONCURRENCY))
+    start_workers()
+    queue = get_queue()
+    job_id, reused, duplicates = await asyncio.to_thread(queue.create, submissions, rubric, concurrency, options)
+    print(f"---BATCH JOB {job_id}: {len(submissions)} submissions, concurrency {concurrency}, "
+          f"{reused} already graded, {duplicates} repeated---")
+
+    # Every submission shares the rubric: fetch its course context once, up front
+    if context_cache.CONTEXT_CACHE_ENABLED:
+        task = asyncio.create_task(_precompute_context(rubric))
+        _tasks[job_id] = task
+        task.add_done_callback(lambda _: _tasks.pop(job_id, None))
+    _wakeup.set()
+    if reused == len(submissions):
+        await asyncio.to_thread(queue.finish_if_done, job_id)
+    return await get_job(job_id)
+
+
+async def _precompute_context(rubric: List[RubricItem]):
+    try:
+        await asyncio.to_thread(rag.get_assignment_context, rubric)
+    except Exception as e:
+        print(f"Could not precompute assignment context: {e}")
+
+
+async def get_job(job_id: str) -> Optional[BatchJobStatus]:
+    return await asyncio.to_thread(_job_status, job_id)
+
+
+def _job_status(job_id: str) -> Optional[BatchJobStatus]:
+    stored = get_queue().get(job_id)
+    if stored is None:
+        return None
+    job, items = stored
+    results = [
+        BatchItemResult(
+            student_id=student_id,
+            # A repeated submission waits for the item it repeats
+            status="pending" if status == "duplicate" else status,
+            attempts=attempts,
+            result=GradeResult.model_validate_json(result) if result else None,
+            error=error,
+            latency_seconds=latency
+        )
+        for student_id, status, attempts, result, error, latency in items
+    ]
+    status = BatchJobStatus(
+        job_id=job_id,
+        total=job["total"],
+        completed=sum(item.status == "completed" for item in results),
+        failed=sum(item.status == "failed" for item in results),
+        concurrency=job["concurrency"],
+        results=results
+    )
+    if job["finished"]:
+        status.status = "completed"
+        if job["options"]["cascade"]:
+            status.cascade = _cascade_summary(status)
+    elif any(item.status != "pending" or item.attempts for item in results):
+        status.status = "running"
+    return status
+
+
+def start_workers():
+    """
+    Starts this process's grading workers (once). Items left unfinished by a previous
+    run are picked up as soon as their leases expire.
+    """
+    global _wakeup
+    if any(not task.done() for task in _workers):
+        return
+    _workers.clear()
+    queue = get_queue()
+    purged = queue.purge()
+    unfinished = queue.unfinished()
+    if purged or unfinished:
+        print(f"Job queue: {unfinished} unfinished items to resume, {purged} old jobs purged")
+    _wakeup = asyncio.Event()
+    prefix = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+    _workers.extend(asyncio.create_task(_worker(f"{prefix}:{n}")) for n in range(JOB_WORKERS))
+
+
+async def stop_workers():
+    """
+    Cancels the workers; items they were grading go back to the queue without losing an attempt.
+    """
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+
+async def _worker(worker_id: str):
+    queue = get_queue()
+    while True:
+        item = await asyncio.to_thread(queue.claim, worker_id)
+        if item is None:
+            _wakeup.clear()
+            # asyncio.wait rather than wait_for: wait_for can swallow a cancellation that races the wake-up
+            waiter = asyncio.ensure_future(_wakeup.wait())
+            try:
+                await asyncio.wait([waiter], timeout=JOB_POLL_SECONDS)
+            finally:
+                waiter.cancel()
+            continue
+        await _grade_item(queue, worker_id, item)
+        if await asyncio.to_thread(queue.finish_if_done, item["job_id"]):
+            await _log_finished(item["job_id"])
+
+
+async def _renew_lease(queue: JobQueue, worker_id: str, item: dict):
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+        if not await asyncio.to_thread(queue.renew, item, worker_id):
+            print(f"Lost the lease on batch item {item['student_id']} (job {item['job_id']})")
+            return
+
+
+async def _grade_item(queue: JobQueue, worker_id: str, item: dict):
+    options = item["options"]
+    heartbeat = asyncio.create_task(_renew_lease(queue, worker_id, item))
+    start = time.perf_counter()
+    try:
+        result = await agent.app.ainvoke(agent.build_inputs(item["text"], item["rubric"], **options))
+        await asyncio.to_thread(queue.complete, item, worker_id, result["grade_result"], round(time.perf_counter() - start, 3))
+    except asyncio.CancelledError:
+        await asyncio.to_thread(queue.release, item, worker_id)
+        raise
+    except Exception as e:
+        print(f"Error grading batch item {item['student_id']} (attempt {item['attempt']}/{JOB_MAX_ATTEMPTS}): {e}")
+        await asyncio.to_thread(queue.fail, item, worker_id, str(e), round(time.perf_counter() - start, 3))
+    finally:
+        heartbeat.cancel()
+
+
+async def _log_finished(job_id: str):
+    job = await get_job(job_id)
+    if job.cascade:
+        print(f"---BATCH JOB {job_id} CASCADE: {job.cascade['escalated']}/{job.cascade['graded']} escalated, "
+              f"cost ${job.cascade['cost_usd']:.4f} vs ${job.cascade['baseline_cost_usd']:.4f} strong-only---")
+    print(f"---BATCH JOB {job_id} DONE: {job.completed} completed, {job.failed} failed---")
+
+
+def _mean(values: List[float]) -> Optional[float]:
+    return round(statistics.mean(values), 3) if values else None
+
+
+def _cascade_summary(job: BatchJobStatus) -> dict:
+    """
+    Cascade configuration, escalation rate and savings for a finished job, from the
+    per-grade metrics. The strong-only cost is estimated per grade (see baseline_cost_usd);
+    for a measured strong-only latency, run scripts/compare_profiles.py with and
+    without the "+cascade" suffix.
+    """
+    graded = [item for item in job.results if item.result is not None]
+    escalated = [item for item in graded if item.result.metrics.get("escalated")]
+    cheap_only = [item for item in graded if not item.result.metrics.get("escalated")]
+    cost = sum(item.result.metrics.get("cost_usd", 0.0) for item in graded)
+    baseline_cost = sum(item.result.metrics.get("baseline_cost_usd", 0.0) for item in graded)
+    cheap_calls = sum(item.result.metrics.get("cheap_calls", 0) for item in graded)
+    return {
+        "config": {
+            "cheap_model": llm_gateway.ENDPOINTS["cheap"].model,
+            "strong_model": llm_gateway.ENDPOINTS["strong"].model,
+            "samples": agent.CASCADE_SAMPLES,
+            "sample_temperature": agent.CASCADE_SAMPLE_TEMPERATURE,
+            "max_spread": agent.CASCADE_MAX_SPREAD
+        },
+        "graded": len(graded),
+        "escalated": len(escalated),
+        "escalation_rate": round(len(escalated) / len(graded), 3) if graded else 0.0,
+        "cheap_calls": cheap_calls,
+        "strong_calls": sum(item.result.metrics.get("llm_calls", 0) for item in graded) - cheap_calls,
+        "cost_usd": round(cost, 6),
+        "baseline_cost_usd": round(baseline_cost, 6),
+        "cost_savings": round(1 - cost / baseline_cost, 3) if baseline_cost else 0.0,
+        "mean_latency_seconds": _mean([item.latency_seconds for item in graded if item.latency_seconds is not None]),
+        "cheap_only_latency_seconds": _mean([item.latency_seconds for item in cheap_only if item.latency_seconds is not None]),
+        "escalated_latency_seconds": _mean([item.latency_seconds for item in escalated if item.latency_seconds is not None])
+    }
@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from functools import lru_cache
+from typing import List, Optional, Callable, TYPE_CHECKING
+from backend.src import hedging
+
+if TYPE_CHECKING:
+    from langchain_core.messages import BaseMessage, AIMessage
+
+# Constants
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./backend/data/llm_cache.sqlite3")
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+# After eviction the cache is trimmed to this fraction of the limit
+EVICTION_LOW_WATER = 0.9
+
+
+class LLMCache:
+    """
+    Content-addressed cache of LLM responses stored in SQLite.
+    Entries are keyed on the model, sampling parameters, prompt-template version and
+    the fully rendered messages, and are evicted least-recently-used once the stored
+    content exceeds max_bytes.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_bytes: int = LLM_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, content TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache(last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, temperature: float, prompt_version: str, messages: List["BaseMessage"], **params) -> str:
+        payload = {
+            "model": model,
+            "temperature": temperature,
+            "prompt_version": prompt_version,
+            "messages": [[m.type, m.content] for m in messages],
+            "params": params
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT content FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key: str, content: str):
+        size = len(content.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, content, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, content, size, now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * EVICTION_LOW_WATER
+        evicted = []
+        for key, size in self._conn.execute("SELECT key, size FROM llm_cache ORDER BY last_access ASC").fetchall():
+            if total <= target:
+                break
+            evicted.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM llm_cache WHERE key = ?", evicted)
+        print(f"LLM cache: evicted {len(evicted)} entries")
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "enabled": LLM_CACHE_ENABLED,
+            "entries": entries,
+            "size_bytes": total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+@lru_cache(maxsize=1)
+def get_cache() -> LLMCache:
+    return LLMCache()
+
+
+def _cache_key(llm, messages: List["BaseMessage"], prompt_version: str, bind_kwargs: dict) -> str:
+    return LLMCache.make_key(
+        getattr(llm, "model_name", type(llm).__name__),
+        getattr(llm, "temperature", None),
+        prompt_version,
+        messages,
+        **bind_kwargs
+    )
+
+
+def invoke_cached(llm, messages: List["BaseMessage"], prompt_version: str, use_cache: bool = True,
+                  validate: Optional[Callable[[str], bool]] = None, **bind_kwargs) -> "AIMessage":
+    """
+    Calls llm (bound with bind_kwargs) on the rendered messages, serving repeats from the cache.
+    Responses are only stored when validate(content) passes (if given).
+    """
+    runnable = llm.bind(**bind_kwargs) if bind_kwargs else llm
+    if not (use_cache and LLM_CACHE_ENABLED):
+        return runnable.invoke(messages)
+
+    cache = get_cache()
+    key = _cache_key(llm, messages, prompt_version, bind_kwargs)
+    content = cache.get(key)
+    if content is not None:
+        from langchain_core.messages import AIMessage
+        return AIMessage(content=content, response_metadata={"cache_hit": True})
+
+    response = runnable.invoke(messages)
+    if validate is None or validate(response.content):
+        cache.put(key, response.content)
+    return response
+
+
+async def _acall(llm, messages: List["BaseMessage"], prompt_version: str, validate: Optional[Callable[[str], bool]],
+                 hedge: bool, bind_kwargs: dict):
+    runnable = llm.bind(**bind_kwargs) if bind_kwargs else llm
+    if not hedge:
+        return await runnable.ainvoke(messages)
+    # Hedgeable calls feed the latency tracker even while hedging is off, so it is warm when enabled
+    with hedging.latency_scope(prompt_version):
+        if hedging.HEDGE_ENABLED:
+            return await hedging.ainvoke_hedged(llm, messages, prompt_version, validate, **bind_kwargs)
+        return await runnable.ainvoke(messages)
+
+
+async def ainvoke_cached(llm, messages: List["BaseMessage"], prompt_version: str, use_cache: bool = True,
+                         validate: Optional[Callable[[str], bool]] = None, hedge: bool = False,
+                         **bind_kwargs) -> "AIMessage":
+    """
+    Async variant of invoke_cached. With hedge=True (and HEDGE_ENABLED), a slow call is
+    duplicated and the first valid answer wins (see hedging.ainvoke_hedged).
+    Cache reads and writes run in a worker thread, off the event loop.
+    """
+    if not (use_cache and LLM_CACHE_ENABLED):
+        return await _acall(llm, messages, prompt_version, validate, hedge, bind_kwargs)
+
+    cache = get_cache()
+    key = _cache_key(llm, messages, prompt_version, bind_kwargs)
+    content = await asyncio.to_thread(cache.get, key)
+    if content is not None:
+        from langchain_core.messages import AIMessage
+        return AIMessage(content=content, response_metadata={"cache_hit": True})
+
+    response = await _acall(llm, messages, prompt_version, validate, hedge, bind_kwargs)
+    if validate is None or validate(response.content):
+        await asyncio.to_thread(cache.put, key, response.content)
+    return response
@@ -0,0 +1,431 @@
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+from typing import List, Callable, Optional, TYPE_CHECKING
+from dotenv import load_dotenv
+import httpx
+from backend.src import token_budget
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+
+# Load environment variables
+load_dotenv()
+
+# One OpenAI-compatible endpoint shared by the grader, mentor and rubric parser.
+# Point LLM_BASE_URL at backend/scripts/fake_openai_server.py to test without the provider.
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://api.deepseek.com")
+LLM_MODEL = os.getenv("LLM_MODEL", "deepseek-chat")
+LLM_API_KEY = os.getenv("DEEPSEEK_API_KEY")
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+# Connection pool shared by every request
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "64"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "32"))
+# Client-side budgets, set just under the provider's limits (0 disables a budget)
+LLM_RPM = int(os.getenv("LLM_RPM", "600"))
+LLM_TPM = int(os.getenv("LLM_TPM", "1000000"))
+# Seconds of budget that may be spent at once after an idle period
+LLM_BURST_SECONDS = float(os.getenv("LLM_BURST_SECONDS", "5"))
+# Completion tokens charged up front when a request sets no max_tokens
+LLM_COMPLETION_ESTIMATE = int(os.getenv("LLM_COMPLETION_ESTIMATE", "800"))
+# Largest single request (prompt budget, instructions, completion): every TPM bucket holds
+# at least this much (or its whole per-minute budget) so one request never waits on the bucket alone
+LLM_MAX_REQUEST_TOKENS = int(os.getenv(
+    "LLM_MAX_REQUEST_TOKENS", str(token_budget.PROMPT_TOKEN_BUDGET + 1000 + LLM_COMPLETION_ESTIMATE)
+))
+# Retries for 429/5xx responses and connection errors
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "6"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1.0"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "60"))
+# USD per million tokens, used to report what each grade cost (deepseek-chat list prices)
+LLM_INPUT_COST_PER_MTOK = float(os.getenv("LLM_INPUT_COST_PER_MTOK", "0.27"))
+LLM_OUTPUT_COST_PER_MTOK = float(os.getenv("LLM_OUTPUT_COST_PER_MTOK", "1.10"))
+# Prompt tokens served from the provider's prefix cache are billed at this rate instead
+LLM_CACHED_INPUT_COST_PER_MTOK = float(os.getenv("LLM_CACHED_INPUT_COST_PER_MTOK", "0.07"))
+
+# Optional second provider for the grading model, used by hedged requests (see hedging)
+LLM_FALLBACK_BASE_URL = os.getenv("LLM_FALLBACK_BASE_URL")
+LLM_FALLBACK_MODEL = os.getenv("LLM_FALLBACK_MODEL", LLM_MODEL)
+LLM_FALLBACK_API_KEY = os.getenv("LLM_FALLBACK_API_KEY")
+LLM_FALLBACK_RPM = int(os.getenv("LLM_FALLBACK_RPM", str(LLM_RPM)))
+LLM_FALLBACK_TPM = int(os.getenv("LLM_FALLBACK_TPM", str(LLM_TPM)))
+
+# Cheap first tier of the grading cascade (see agent.CASCADE_ENABLED). Defaults are the
+# Groq endpoint the 8B model was benchmarked on and its free-tier request limit; set both
+# limits to your plan.
+CASCADE_CHEAP_MODEL = os.getenv("CASCADE_CHEAP_MODEL", "llama-3.1-8b-instant")
+CASCADE_CHEAP_BASE_URL = os.getenv("CASCADE_CHEAP_BASE_URL", "https://api.groq.com/openai/v1")
+CASCADE_CHEAP_API_KEY = os.getenv("CASCADE_CHEAP_API_KEY") or os.getenv("GROQ_API_KEY")
+CASCADE_CHEAP_RPM = int(os.getenv("CASCADE_CHEAP_RPM", "30"))
+# Default token budget: one cascade grade at full size per minute, i.e. the Grader and its
+# consistency samples (agent.CASCADE_SAMPLES prompts) plus the Mentor. Less than that and
+# the cheap tier mostly waits on its own budget.
+_CASCADE_CALLS_PER_GRADE = max(1, int(os.getenv("CASCADE_SAMPLES", "3"))) + 1
+CASCADE_CHEAP_TPM = int(os.getenv("CASCADE_CHEAP_TPM", str(_CASCADE_CALLS_PER_GRADE * LLM_MAX_REQUEST_TOKENS)))
+CASCADE_CHEAP_INPUT_COST_PER_MTOK = float(os.getenv("CASCADE_CHEAP_INPUT_COST_PER_MTOK", "0.05"))
+CASCADE_CHEAP_OUTPUT_COST_PER_MTOK = float(os.getenv("CASCADE_CHEAP_OUTPUT_COST_PER_MTOK", "0.08"))
+CASCADE_CHEAP_CACHED_INPUT_COST_PER_MTOK = float(os.getenv("CASCADE_CHEAP_CACHED_INPUT_COST_PER_MTOK", str(CASCADE_CHEAP_INPUT_COST_PER_MTOK)))
+
+# Completions are not idempotent: only retry when the provider refused or failed the request
+# (429, 5xx) or it never arrived; a 408/409 or read timeout may have been billed already
+RETRY_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError, httpx.PoolTimeout)
+
+
+def _retryable(status: int) -> bool:
+    return status == 429 or status >= 500
+
+
+class TokenBucket:
+    """
+    Allows at most `per_minute` units in any 60-second window: it holds `burst_seconds`
+    worth of units and refills at per_minute / (60 + burst_seconds) units per second.
+    reserve() takes units immediately (the balance may go negative) and returns how
+    long the caller must wait before sending, so callers are served in arrival order.
+    The bucket holds at least min_capacity units (capped at per_minute) so the largest
+    single reservation fits; that may let up to min_capacity extra through in the first
+    minute after an idle period, which the provider's 429s (see drain) absorb.
+    """
+
+    def __init__(self, per_minute: int, burst_seconds: float = 0.0, min_capacity: float = 1.0):
+        self.per_minute = per_minute
+        self.rate = per_minute / (60.0 + burst_seconds)
+        self.capacity = max(self.rate * burst_seconds, min(min_capacity, per_minute), 1.0) if per_minute > 0 else 0.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        if self.capacity <= 0:
+            return 0.0
+        if amount > self.capacity:
+            # Would never fit: charge the whole bucket instead of waiting forever
+            print(f"Rate limit: request of {amount:.0f} exceeds the bucket ({self.capacity:.0f} of {self.per_minute}/min); "
+                  f"charging {self.capacity:.0f}")
+            amount = self.capacity
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.rate)
+
+    def adjust(self, amount: float):
+        """
+        Corrects an earlier reservation once the real usage is known (negative refunds).
+        """
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+    def drain(self):
+        """
+        Empties the bucket after the provider rejects a request for rate limiting, so
+        every caller slows down rather than only the one that was rejected.
+        """
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self.tokens = min(self.tokens, 0.0)
+
+
+class GatewayStats:
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.throttled_seconds = 0.0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+        self.status_counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, **deltas):
+        with self._lock:
+            for name, value in deltas.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def record_status(self, status: int):
+        with self._lock:
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "failures": self.failures,
+                "throttled_seconds": round(self.throttled_seconds, 3),
+                "status_counts": dict(self.status_counts),
+                # Provider-side prefix cache, from non-streamed responses
+                "prompt_tokens": self.prompt_tokens,
+                "cached_prompt_tokens": self.cached_prompt_tokens,
+                "prefix_cache_hit_rate": self.cached_prompt_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+                "rpm_limit": self.rpm,
+                "tpm_limit": self.tpm
+            }
+
+
+class Endpoint:
+    """
+    One model behind an OpenAI-compatible API, with its own RPM/TPM buckets, counters
+    and prices. Tiers are "strong" (the default grading model), "cheap" and, when
+    configured, "fallback" (the grading model at a second provider).
+    """
+
+    def __init__(self, model: str, base_url: str, api_key: Optional[str], key_name: str, rpm: int, tpm: int,
+                 input_cost: float, output_cost: float, cached_input_cost: float):
+        self.model = model
+        self.base_url = base_url
+        self.api_key = api_key
+        self.key_name = key_name
+        self.input_cost = input_cost
+        self.output_cost = output_cost
+        self.cached_input_cost = cached_input_cost
+        self.request_bucket = TokenBucket(rpm, LLM_BURST_SECONDS)
+        self.token_bucket = TokenBucket(tpm, LLM_BURST_SECONDS, min_capacity=LLM_MAX_REQUEST_TOKENS)
+        self.stats = GatewayStats(rpm, tpm)
+
+    def cost(self, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> float:
+        return (
+            (input_tokens - cached_tokens) * self.input_cost
+            + cached_tokens * self.cached_input_cost
+            + output_tokens * self.output_cost
+        ) / 1_000_000
+
+
+ENDPOINTS = {
+    "strong": Endpoint(LLM_MODEL, LLM_BASE_URL, LLM_API_KEY, "DEEPSEEK_API_KEY", LLM_RPM, LLM_TPM,
+                       LLM_INPUT_COST_PER_MTOK, LLM_OUTPUT_COST_PER_MTOK, LLM_CACHED_INPUT_COST_PER_MTOK),
+    "cheap": Endpoint(CASCADE_CHEAP_MODEL, CASCADE_CHEAP_BASE_URL, CASCADE_CHEAP_API_KEY, "GROQ_API_KEY",
+                      CASCADE_CHEAP_RPM, CASCADE_CHEAP_TPM,
+                      CASCADE_CHEAP_INPUT_COST_PER_MTOK, CASCADE_CHEAP_OUTPUT_COST_PER_MTOK,
+                      CASCADE_CHEAP_CACHED_INPUT_COST_PER_MTOK)
+}
+if LLM_FALLBACK_BASE_URL:
+    ENDPOINTS["fallback"] = Endpoint(LLM_FALLBACK_MODEL, LLM_FALLBACK_BASE_URL, LLM_FALLBACK_API_KEY, "LLM_FALLBACK_API_KEY",
+                                     LLM_FALLBACK_RPM, LLM_FALLBACK_TPM,
+                                     LLM_INPUT_COST_PER_MTOK, LLM_OUTPUT_COST_PER_MTOK, LLM_CACHED_INPUT_COST_PER_MTOK)
+
+
+# Called with (model, seconds) for every successful request; see on_latency
+_latency_observers: List[Callable[[str, float], None]] = []
+
+
+def on_latency(observer: Callable[[str, float], None]):
+    """
+    Registers observer to receive the latency of each successful request: until the
+    body is read, or for streamed responses until the stream starts.
+    """
+    _latency_observers.append(observer)
+
+
+def _observe_latency(endpoint: Endpoint, seconds: float):
+    for observer in _latency_observers:
+        observer(endpoint.model, seconds)
+
+
+def _estimate_tokens(request: httpx.Request) -> int:
+    try:
+        body = json.loads(request.content or b"{}")
+    except ValueError:
+        return LLM_COMPLETION_ESTIMATE
+    prompt = "".join(str(message.get("content", "")) for message in body.get("messages", []))
+    completion = body.get("max_tokens") or body.get("max_completion_tokens") or LLM_COMPLETION_ESTIMATE
+    return token_budget.count_tokens(prompt) + completion
+
+
+def _backoff(attempt: int, response: Optional[httpx.Response]) -> float:
+    # Honour Retry-After when the provider sends it, else exponential backoff with full jitter
+    if response is not None:
+        try:
+            return min(float(response.headers["retry-after"]), LLM_BACKOFF_MAX_SECONDS)
+        except (KeyError, ValueError):
+            pass
+    return random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+def _reserve(endpoint: Endpoint, request: httpx.Request) -> tuple:
+    estimate = _estimate_tokens(request)
+    wait = max(endpoint.request_bucket.reserve(1), endpoint.token_bucket.reserve(estimate))
+    endpoint.stats.record(requests=1, throttled_seconds=wait)
+    return estimate, wait
+
+
+def _cache_hits(usage: dict) -> int:
+    # DeepSeek reports prompt_cache_hit_tokens; OpenAI-style providers prompt_tokens_details.cached_tokens
+    details = usage.get("prompt_tokens_details") or {}
+    return usage.get("prompt_cache_hit_tokens") or details.get("cached_tokens") or 0
+
+
+def cached_tokens(response) -> int:
+    """
+    Prompt tokens the provider served from its prefix cache for a LangChain response
+    (0 for cache hits of our own response cache, which make no call).
+    """
+    details = (getattr(response, "usage_metadata", None) or {}).get("input_token_details") or {}
+    if details.get("cache_read"):
+        return details["cache_read"]
+    return _cache_hits((getattr(response, "response_metadata", None) or {}).get("token_usage") or {})
+
+
+def _settle(endpoint: Endpoint, estimate: int, response: httpx.Response):
+    # Non-streaming responses report real usage; charge the difference to the bucket
+    try:
+        usage = response.json().get("usage") or {}
+        endpoint.stats.record(prompt_tokens=usage.get("prompt_tokens") or 0, cached_prompt_tokens=_cache_hits(usage))
+        endpoint.token_bucket.adjust(usage["total_tokens"] - estimate)
+    except (ValueError, KeyError, TypeError, AttributeError, UnicodeDecodeError):
+        pass
+
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """
+    Synchronous transport: waits for the RPM/TPM buckets, then retries transient
+    failures with backoff. Used by the rubric parser's blocking calls.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport, endpoint: Endpoint):
+        self.transport = transport
+        self.endpoint = endpoint
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            estimate, wait = _reserve(self.endpoint, request)
+            if wait:
+                time.sleep(wait)
+            response = None
+            start = time.monotonic()
+            try:
+                response = self.transport.handle_request(request)
+            except RETRY_EXCEPTIONS as e:
+                if attempt == LLM_MAX_RETRIES:
+                    self.endpoint.stats.record(failures=1)
+                    raise
+                print(f"LLM gateway ({self.endpoint.model}): {type(e).__name__}, retrying (attempt {attempt + 1})")
+            else:
+                self.endpoint.stats.record_status(response.status_code)
+                if not _retryable(response.status_code) or attempt == LLM_MAX_RETRIES:
+                    if response.status_code >= 400:
+                        self.endpoint.stats.record(failures=1)
+                    else:
+                        if "text/event-stream" not in response.headers.get("content-type", ""):
+                            response.read()
+                            _settle(self.endpoint, estimate, response)
+                        _observe_latency(self.endpoint, time.monotonic() - start)
+                    return response
+                response.read()
+                response.close()
+                if response.status_code == 429:
+                    self.endpoint.request_bucket.drain()
+                # A rejected attempt consumed no tokens at the provider
+                self.endpoint.token_bucket.adjust(-estimate)
+                print(f"LLM gateway ({self.endpoint.model}): HTTP {response.status_code}, retrying (attempt {attempt + 1})")
+            self.endpoint.stats.record(retries=1)
+            time.sleep(_backoff(attempt, response))
+
+
+class AsyncRateLimitedTransport(httpx.AsyncBaseTransport):
+    """
+    Async counterpart of RateLimitedTransport for the grading graph.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, endpoint: Endpoint):
+        self.transport = transport
+        self.endpoint = endpoint
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            estimate, wait = _reserve(self.endpoint, request)
+            if wait:
+                await asyncio.sleep(wait)
+            response = None
+            start = time.monotonic()
+            try:
+                response = await self.transport.handle_async_request(request)
+            except RETRY_EXCEPTIONS as e:
+                if attempt == LLM_MAX_RETRIES:
+                    self.endpoint.stats.record(failures=1)
+                    raise
+                print(f"LLM gateway ({self.endpoint.model}): {type(e).__name__}, retrying (attempt {attempt + 1})")
+            else:
+                self.endpoint.stats.record_status(response.status_code)
+                if not _retryable(response.status_code) or attempt == LLM_MAX_RETRIES:
+                    if response.status_code >= 400:
+                        self.endpoint.stats.record(failures=1)
+                    else:
+                        if "text/event-stream" not in response.headers.get("content-type", ""):
+                            await response.aread()
+                            _settle(self.endpoint, estimate, response)
+                        _observe_latency(self.endpoint, time.monotonic() - start)
+                    return response
+                await response.aread()
+                await response.aclose()
+                if response.status_code == 429:
+                    self.endpoint.request_bucket.drain()
+                # A rejected attempt consumed no tokens at the provider
+                self.endpoint.token_bucket.adjust(-estimate)
+                print(f"LLM gateway ({self.endpoint.model}): HTTP {response.status_code}, retrying (attempt {attempt + 1})")
+            self.endpoint.stats.record(retries=1)
+            await asyncio.sleep(_backoff(attempt, response))
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_KEEPALIVE)
+
+
+_llms = {}
+_llm_lock = threading.Lock()
+
+
+def get_llm(tier: str = "strong") -> "ChatOpenAI":
+    """
+    The process-wide chat model for a tier ("strong", "cheap" or "fallback"). All callers of a tier
+    share one pooled HTTP client (sync and async) whose transport enforces that
+    endpoint's RPM / TPM budget and retries transient errors; the SDK's own retries are
+    disabled so every attempt goes through the buckets.
+    """
+    if tier not in _llms:
+        with _llm_lock:
+            if tier not in _llms:
+                from langchain_openai import ChatOpenAI
+                endpoint = ENDPOINTS[tier]
+                if not endpoint.api_key:
+                    print(f"WARNING: {endpoint.key_name} not found in environment.")
+                _llms[tier] = ChatOpenAI(
+                    model=endpoint.model,
+                    openai_api_key=endpoint.api_key or "not-set",
+                    openai_api_base=endpoint.base_url,
+                    temperature=0,
+                    max_retries=0,
+                    # Usage (including cached prompt tokens) on streamed responses too
+                    stream_usage=True,
+                    http_client=httpx.Client(
+                        transport=RateLimitedTransport(httpx.HTTPTransport(limits=_limits()), endpoint),
+                        timeout=LLM_TIMEOUT_SECONDS
+                    ),
+                    http_async_client=httpx.AsyncClient(
+                        transport=AsyncRateLimitedTransport(httpx.AsyncHTTPTransport(limits=_limits()), endpoint),
+                        timeout=LLM_TIMEOUT_SECONDS
+                    )
+                )
+    return _llms[tier]
+
+
+def cost(tier: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> float:
+    """
+    USD billed for the given tokens at the tier's prices.
+    """
+    return ENDPOINTS[tier].cost(input_tokens, output_tokens, cached_tokens)
+
+
+def stats() -> dict:
+    return {tier: {"model": endpoint.model, **endpoint.stats.snapshot()} for tier, endpoint in ENDPOINTS.items()}
@@ -1,20 +1,41 @@
 import os
+import json
+import asyncio
 
 # Disable ChromaDB/PostHog Telemetry
 os.environ["ANONYMIZED_TELEMETRY"] = "False"
 os.environ["CHROMA_SERVER_NO_INTERACTIVE_MODE"] = "True"
 os.environ["OTEL_PYTHON_DISABLED"] = "True"
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List
-from backend.src.models import RubricItem, GradeResult, IngestResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+from backend.src.models import RubricItem, GradeResult, IngestResponse, StudentSubmission, BatchJobStatus
 from backend.src import rag
 from backend.src import agent
 from backend.src import rubric_parser
+from backend.src import jobs
+from backend.src import llm_cache
+from backend.src import llm_gateway
+from backend.src import hedging
+from backend.src import context_cache
+from backend.src import warmup
 
-app = FastAPI(title="GradeWise API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background; /ready reports progress
+    warmup_task = asyncio.create_task(warmup.warm_up()) if warmup.WARMUP_ON_STARTUP else None
+    # Resume batch jobs left unfinished by the previous run
+    jobs.start_workers()
+    yield
+    if warmup_task is not None:
+        warmup_task.cancel()
+    await jobs.stop_workers()
+
+app = FastAPI(title="GradeWise API", lifespan=lifespan)
 
 # CORS Configuration
 app.add_middleware(
@@ -29,6 +50,22 @@ class GradeRequest(BaseModel):
     submission_text: str
     rubric: List[RubricItem]
     student_id: str
+    use_cache: bool = True
+    # "fast" scores and writes the feedback in a single LLM call
+    profile: Literal["standard", "fast"] = "standard"
+    # Score each rubric item (or group, see CRITERION_GROUP_SIZE) in its own parallel call
+    criterion_fanout: bool = False
+    # Grade with the cheap model first and escalate when needed (None: server's CASCADE_ENABLED)
+    cascade: Optional[bool] = None
+
+class BatchGradeRequest(BaseModel):
+    submissions: List[StudentSubmission]
+    rubric: List[RubricItem]
+    concurrency: int = Field(default=8, ge=1, description="Maximum submissions graded at the same time")
+    use_cache: bool = True
+    profile: Literal["standard", "fast"] = "standard"
+    criterion_fanout: bool = False
+    cascade: Optional[bool] = None
 
 @app.post("/ingest", response_model=IngestResponse)
 async def ingest(files: List[UploadFile] = File(...)):
@@ -36,18 +73,41 @@ async def ingest(files: List[UploadFile] = File(...)):
     Ingests PDF course materials.
     """
     try:
-        count = rag.ingest_documents(files)
-        return IngestResponse(status="success", files_processed=count)
+        # Extraction waits on the process pool; keep it off the event loop
+        return await asyncio.to_thread(rag.ingest_documents, files)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/ingest/{source}")
+async def delete_ingested_source(source: str):
+    """
+    Removes all chunks ingested from the named source file.
+    """
+    try:
+        deleted = rag.delete_source(source)
+        return {"source": source, "chunks_deleted": deleted}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/admin/compact-chroma")
+async def compact_chroma():
+    """
+    Rebuilds the vector store without duplicate chunks and reports how much it shrank.
+    Runs in the API process so its vector store, lexical index and context cache are reset.
+    """
+    try:
+        return await asyncio.to_thread(rag.compact_collection)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/parse-rubric", response_model=List[RubricItem])
-async def parse_rubric_endpoint(files: List[UploadFile] = File(...)):
+async def parse_rubric_endpoint(files: List[UploadFile] = File(...), use_cache: bool = True):
     """
     Parses uploaded rubric files (PDF, DOCX, TXT, CSV, XLSX) into structured RubricItems.
+    Pass use_cache=false to bypass the LLM response cache.
     """
     try:
-        rubric_items = rubric_parser.parse_rubric(files)
+        rubric_items = await asyncio.to_thread(rubric_parser.parse_rubric, files, use_cache)
         return rubric_items
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -58,7 +118,8 @@ async def extract_text_endpoint(file: UploadFile = File(...)):
     Extracts text from a single file (PDF, DOCX, TXT, CSV, XLSX) for student submission.
     """
     try:
-        text = rag.extract_text_from_file(file)
+        # Parsing is CPU-bound; keep it off the event loop
+        text = await asyncio.to_thread(rag.extract_text_from_file, file)
         return {"text": text}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -69,14 +130,10 @@ async def grade_submission(request: GradeRequest):
     Grades a student submission using the agentic workflow.
     """
     try:
-        inputs = {
-            "submission_text": request.submission_text,
-            "rubric": request.rubric,
-            "context": [], # Initial empty context, will be populated by retrieve node
-            "grade_result": None # Initial placeholder
-        }
-        
-        result = agent.app.invoke(inputs)
+        inputs = agent.build_inputs(request.submission_text, request.rubric, use_cache=request.use_cache, profile=request.profile, criterion_fanout=request.criterion_fanout, cascade=request.cascade)
+
+        # Async graph: LLM and retrieval calls yield to the event loop while in flight
+        result = await agent.app.ainvoke(inputs)
         
         return result["grade_result"]
     except Exception as e:
@@ -84,6 +141,83 @@ async def grade_submission(request: GradeRequest):
         print(f"Error grading submission: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/grade/stream")
+async def grade_submission_stream(request: GradeRequest):
+    """
+    Grades a submission and streams progress as Server-Sent Events:
+    `thinking` for each agent step, `token` for each feedback token, then `result`
+    with the final GradeResult (or `error`).
+    """
+    inputs = agent.build_inputs(request.submission_text, request.rubric, use_cache=request.use_cache, profile=request.profile, criterion_fanout=request.criterion_fanout, cascade=request.cascade)
+
+    async def event_stream():
+        # Sent immediately so the client sees the first byte before any node runs
+        yield _sse("start", {"student_id": request.student_id})
+        try:
+            async for event, data in agent.astream_grading(inputs):
+                yield _sse(event, data)
+        except Exception as e:
+            print(f"Error streaming grade: {e}")
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/grade/batch", response_model=BatchJobStatus)
+async def grade_batch(request: BatchGradeRequest):
+    """
+    Starts grading a set of submissions against one shared rubric.
+    Returns immediately with a job id; poll /grade/batch/{job_id} for progress.
+    Jobs are stored in a persistent queue and resume after a restart; a submission already
+    graded for the same student, text, rubric and options is not graded again.
+    """
+    if not request.submissions:
+        raise HTTPException(status_code=400, detail="No submissions provided.")
+    job = await jobs.create_job(request.submissions, request.rubric, request.concurrency, use_cache=request.use_cache, profile=request.profile, criterion_fanout=request.criterion_fanout, cascade=request.cascade)
+    return job
+
+@app.get("/grade/batch/{job_id}", response_model=BatchJobStatus)
+async def grade_batch_status(job_id: str):
+    """
+    Reports progress and per-submission results of a batch grading job.
+    """
+    job = await jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job id: {job_id}")
+    return job
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Reports LLM response cache size and hit/miss counters for this process,
+    plus the assignment context cache under "context_cache".
+    """
+    stats = await asyncio.to_thread(llm_cache.get_cache().stats)
+    return {**stats, "context_cache": context_cache.get_cache().stats()}
+
+@app.get("/llm/stats")
+async def llm_stats():
+    """
+    Reports LLM gateway counters per model tier ("strong", and the cascade's "cheap"):
+    requests, retries, failures, time spent waiting on the RPM/TPM budgets, HTTP status counts
+    and the provider's prefix cache hit rate, plus request hedging under "hedging".
+    """
+    return {**llm_gateway.stats(), "hedging": hedging.stats()}
+
+@app.get("/ready")
+async def ready():
+    """
+    Readiness probe: 200 once the graph, LLM clients, embedding model and vector store are loaded, 503 before.
+    """
+    status = warmup.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to GradeWise API"}
@@ -1,17 +1,25 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Optional, Literal, Dict, Any
 
 class RubricItem(BaseModel):
     criteria: str = Field(..., description="The criteria for evaluating the submission")
     max_points: int = Field(..., description="Maximum points available for this criteria")
     description: str = Field(..., description="Detailed description of the criteria")
 
+class CriterionScore(BaseModel):
+    criteria: str = Field(..., description="Rubric criteria name")
+    score: float = Field(..., description="Points awarded for this criteria")
+    max_points: int = Field(..., description="Maximum points available for this criteria")
+    comment: str = Field(default="", description="Grader's justification for the points awarded")
+
 class GradeResult(BaseModel):
     score: float = Field(..., description="The score awarded")
     feedback: str = Field(..., description="Feedback explaining the score")
     citations: List[str] = Field(default_factory=list, description="Relevant citations from the submission or course material")
     thinking_process: List[str] = Field(default_factory=list, description="Step-by-step logs of the agent's reasoning")
     confidence_score: float = Field(default=1.0, description="Confidence score of the final grade (0.0 to 1.0)")
+    criteria_scores: List[CriterionScore] = Field(default_factory=list, description="Per-criteria scores that sum to the total score")
+    metrics: Dict[str, Any] = Field(default_factory=dict, description="Cost and performance counters for this grade (e.g. llm_calls)")
 
 class StudentSubmission(BaseModel):
     text: str = Field(..., description="The student's submission text")
@@ -20,3 +28,23 @@ class StudentSubmission(BaseModel):
 class IngestResponse(BaseModel):
     status: str = Field(..., description="Status of the ingestion process")
     files_processed: int = Field(..., description="Number of files successfully processed")
+    files_unchanged: int = Field(default=0, description="Number of processed files skipped because their content was already ingested")
+    errors: Dict[str, str] = Field(default_factory=dict, description="Files that could not be ingested, mapped to the error")
+
+class BatchItemResult(BaseModel):
+    student_id: str = Field(..., description="Identifier of the student this item belongs to")
+    status: Literal["pending", "running", "completed", "failed"] = Field(default="pending", description="Grading status of this item")
+    result: Optional[GradeResult] = Field(default=None, description="Grade result once the item has completed")
+    error: Optional[str] = Field(default=None, description="Error message if grading failed (or of the last failed attempt)")
+    attempts: int = Field(default=0, description="Grading attempts made; 0 if the result was reused from an earlier job")
+    latency_seconds: Optional[float] = Field(default=None, description="Wall-clock time spent grading this item")
+
+class BatchJobStatus(BaseModel):
+    job_id: str = Field(..., description="Unique identifier of the batch grading job")
+    status: Literal["pending", "running", "completed"] = Field(default="pending", description="Overall status of the job")
+    total: int = Field(..., description="Number of submissions in the job")
+    completed: int = Field(default=0, description="Number of submissions graded successfully")
+    failed: int = Field(default=0, description="Number of submissions that failed to grade")
+    concurrency: int = Field(..., description="Maximum number of submissions graded at the same time")
+    results: List[BatchItemResult] = Field(default_factory=list, description="Per-submission results, in request order")
+    cascade: Optional[Dict[str, Any]] = Field(default=None, description="Model cascade configuration, escalation rate and savings, when the job used the cascade")
@@ -1,134 +1,677 @@
 import os
+import io
+import time
 import shutil
-from typing import List
+import asyncio
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, CancelledError, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+import threading
+import hashlib
+from typing import List, Optional, Tuple, TYPE_CHECKING
 from fastapi import UploadFile
-from langchain_community.document_loaders import PyPDFLoader, TextLoader, Docx2txtLoader
-import pandas as pd
-from langchain_core.documents import Document
-
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
 from functools import lru_cache
+from backend.src.models import IngestResponse, RubricItem
+from backend.src import embedding_cache
+from backend.src import context_cache
+from backend.src import lexical_index
+from backend.src import embeddings
+
+# Heavy dependencies (LangChain, Chroma, pandas, parsers) are imported inside the
+# functions that use them so importing this module stays cheap at API startup.
+if TYPE_CHECKING:
+    from langchain_chroma import Chroma
 
 # Constants
 CHROMA_PATH = "./backend/data/chroma"
-TEMP_UPLOAD_DIR = "./backend/data/temp_uploads"
-
-# Ensure temp directory exists
-os.makedirs(TEMP_UPLOAD_DIR, exist_ok=True)
+CHROMA_COLLECTION = "langchain"
+# Compaction writes the deduplicated chunks here, then swaps it in for CHROMA_COLLECTION
+CHROMA_STAGING_COLLECTION = f"{CHROMA_COLLECTION}_compact"
+CHROMA_RETIRED_COLLECTION = f"{CHROMA_COLLECTION}_retired"
+# Uploads larger than this are spooled to a private temp file instead of parsed from memory
+MAX_IN_MEMORY_BYTES = int(os.getenv("MAX_IN_MEMORY_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+# Worker processes used to parse a multi-file upload in parallel (a pool per upload)
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(os.cpu_count() or 1)))
+# Per file, counted from when its parsing starts
+EXTRACTION_TIMEOUT_SECONDS = float(os.getenv("EXTRACTION_TIMEOUT_SECONDS", "120"))
+# Candidate chunks fetched once per assignment (rubric) and reused for every submission
+ASSIGNMENT_CONTEXT_K = int(os.getenv("ASSIGNMENT_CONTEXT_K", "8"))
+# Re-rank the cached candidates against each submission (query embeddings, no vector search);
+# without it every submission of an assignment gets the same rubric-only context
+CONTEXT_REFINE = os.getenv("CONTEXT_REFINE", "true").lower() not in ("0", "false", "no")
+# Multi-vector queries: the submission is embedded as several word windows (all-MiniLM-L6-v2
+# only reads the first 256 word pieces of each input) and the result lists are fused
+RETRIEVAL_MULTI_QUERY = os.getenv("RETRIEVAL_MULTI_QUERY", "true").lower() not in ("0", "false", "no")
+QUERY_CHUNK_WORDS = int(os.getenv("QUERY_CHUNK_WORDS", "180"))
+# Upper bound on query embeddings per retrieval; longer submissions are sampled evenly
+MAX_QUERY_CHUNKS = int(os.getenv("MAX_QUERY_CHUNKS", "8"))
+# Also query with each rubric criterion
+RETRIEVAL_RUBRIC_QUERIES = os.getenv("RETRIEVAL_RUBRIC_QUERIES", "false").lower() in ("1", "true", "yes")
+RETRIEVAL_FETCH_K = int(os.getenv("RETRIEVAL_FETCH_K", "10"))
+MMR_LAMBDA = float(os.getenv("RETRIEVAL_MMR_LAMBDA", "0.7"))
+RRF_K = 60
+# Hybrid retrieval: BM25 over the same chunks, fused with the dense results
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "true").lower() not in ("0", "false", "no")
+# Weight of the lexical ranking in the fusion (all dense windows together weigh 1.0)
+HYBRID_LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", "1.0"))
+# Queries of at most this many terms that match the lexical index skip embedding entirely
+KEYWORD_QUERY_MAX_TERMS = int(os.getenv("KEYWORD_QUERY_MAX_TERMS", "3"))
 
 @lru_cache(maxsize=1)
 def get_embedding_function():
     try:
-        return HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+        # Backend (torch / onnx / onnx-int8) is chosen by EMBEDDING_BACKEND
+        model, backend = embeddings.load_embeddings()
+        # Chunk embeddings are cached by content hash, so unchanged chunks skip the model
+        return embedding_cache.CachedEmbeddings(
+            model,
+            namespace=f"{embeddings.EMBEDDING_MODEL_NAME}:{backend}"
+        )
     except Exception as e:
         print(f"Error initializing embeddings: {e}")
         raise e
 
-def extract_text_from_file(file: UploadFile) -> str:
+# Process-wide vector store handle, shared by ingestion and retrieval
+_vector_store = None
+_vector_store_lock = threading.Lock()
+# Serializes writers; readers query concurrently without taking it
+_write_lock = threading.Lock()
+
+def get_vector_store() -> "Chroma":
     """
-    Extracts text from an uploaded file (PDF, DOCX, TXT, CSV, XLSX).
-    For tabular data (CSV, XLSX), converts to Markdown table.
+    Returns the long-lived Chroma handle for CHROMA_PATH, opening it on first use.
+    Reusing one client avoids reopening the SQLite file and reloading the HNSW
+    segment per query, and lets retrieval see ingested chunks immediately.
     """
-    file_path = os.path.join(TEMP_UPLOAD_DIR, file.filename)
-    filename_lower = file.filename.lower()
-    
-    # Save uploaded file temporarily
-    file.file.seek(0)
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-        
-    text = ""
-    # Supported Code Extensions
-    CODE_EXTENSIONS = {
-        ".py", ".js", ".ts", ".jsx", ".tsx", ".java", ".cpp", ".c", ".h", ".cs", 
-        ".go", ".rs", ".php", ".rb", ".swift", ".kt", ".scala", ".html", ".css", 
-        ".sql", ".sh", ".bat", ".json", ".xml", ".yaml", ".yml", ".md"
+    global _vector_store
+    if _vector_store is None:
+        with _vector_store_lock:
+            if _vector_store is None:
+                import chromadb
+                from langchain_chroma import Chroma
+                client = chromadb.PersistentClient(path=CHROMA_PATH)
+                _recover_compaction(client)
+                _vector_store = Chroma(
+                    client=client,
+                    collection_name=CHROMA_COLLECTION,
+                    embedding_function=get_embedding_function()
+                )
+    return _vector_store
+
+def _collection_names(client) -> set:
+    # chromadb returns Collection objects from list_collections in some releases and names in others
+    return {getattr(collection, "name", collection) for collection in client.list_collections()}
+
+def _recover_compaction(client):
+    """
+    Finishes or rolls back a compaction that was interrupted mid-swap: the retired
+    collection is restored if the swap never completed, and a partial staging
+    collection is discarded. The live collection is never lost.
+    """
+    names = _collection_names(client)
+    if CHROMA_RETIRED_COLLECTION in names:
+        if CHROMA_COLLECTION in names:
+            client.delete_collection(CHROMA_RETIRED_COLLECTION)
+        else:
+            print("Chroma: restoring the collection retired by an interrupted compaction")
+            client.get_collection(CHROMA_RETIRED_COLLECTION).modify(name=CHROMA_COLLECTION)
+    if CHROMA_STAGING_COLLECTION in names:
+        client.delete_collection(CHROMA_STAGING_COLLECTION)
+
+# Built from the Chroma collection on first use, then updated alongside it
+_lexical_index = None
+_lexical_index_lock = threading.Lock()
+
+def get_lexical_index() -> lexical_index.BM25Index:
+    """
+    Returns the BM25 index over the stored chunks, building it from Chroma on first use.
+    """
+    global _lexical_index
+    if _lexical_index is None:
+        with _lexical_index_lock:
+            if _lexical_index is None:
+                index = lexical_index.BM25Index()
+                stored = get_vector_store().get(include=["documents"])
+                index.add(stored["ids"], stored["documents"])
+                print(f"Lexical index: {len(index)} chunks indexed")
+                _lexical_index = index
+    return _lexical_index
+
+def _sync_lexical_index(added_ids: List[str] = (), added_texts: List[str] = (), removed_ids: List[str] = ()):
+    # Caller must hold _write_lock; an index not built yet will read the new state from Chroma
+    if _lexical_index is not None:
+        _lexical_index.remove(list(removed_ids))
+        _lexical_index.add(list(added_ids), list(added_texts))
+
+def chunk_id(source: str, text: str) -> str:
+    """
+    Deterministic chunk ID: the same text from the same source always maps to the same
+    ID, so re-ingesting upserts instead of appending duplicates.
+    """
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{source}\x00{text_hash}".encode("utf-8")).hexdigest()
+
+def _delete_source_chunks(source: str) -> int:
+    # Caller must hold _write_lock
+    vector_store = get_vector_store()
+    ids = vector_store.get(where={"source": source}, include=[])["ids"]
+    if ids:
+        vector_store.delete(ids=ids)
+        _sync_lexical_index(removed_ids=ids)
+    return len(ids)
+
+def delete_source(source: str) -> int:
+    """
+    Removes every chunk ingested from the given source file and forgets its manifest
+    entry, so a later upload of the same file is ingested again.
+    Returns the number of chunks deleted.
+    """
+    with _write_lock:
+        deleted = _delete_source_chunks(source)
+    embedding_cache.get_store().forget_file(source)
+    if deleted:
+        context_cache.invalidate()
+    return deleted
+
+def _directory_size(path: str) -> int:
+    total = 0
+    for root, _, filenames in os.walk(path):
+        for filename in filenames:
+            total += os.path.getsize(os.path.join(root, filename))
+    return total
+
+def compact_collection(page_size: int = 1000) -> dict:
+    """
+    Rebuilds the Chroma collection with one copy of each chunk (by deterministic ID),
+    reusing the stored embeddings so no chunk is re-embedded. The chunks are written to
+    a staging collection that replaces the live one only once it is complete, so a failure
+    part-way leaves the corpus untouched. Must run in the API process (POST /admin/compact)
+    or while the API is stopped: other processes keep handles to the replaced collection.
+    Returns chunk counts and on-disk size before and after.
+    """
+    global _vector_store, _lexical_index
+    with _write_lock:
+        vector_store = get_vector_store()
+        client = vector_store._client
+        live = vector_store._collection
+        size_before = _directory_size(CHROMA_PATH)
+
+        unique = {}
+        chunks_before = 0
+        offset = 0
+        while True:
+            page = live.get(include=["documents", "metadatas", "embeddings"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            for text, metadata, embedding in zip(page["documents"], page["metadatas"], page["embeddings"]):
+                metadata = metadata or {}
+                unique.setdefault(chunk_id(metadata.get("source", ""), text), (text, metadata, list(embedding)))
+            chunks_before += len(page["ids"])
+            offset += page_size
+
+        # A fresh collection gets an HNSW index without the duplicates
+        _recover_compaction(client)
+        staging = client.create_collection(CHROMA_STAGING_COLLECTION, metadata=live.metadata or None)
+        try:
+            ids = list(unique.keys())
+            for start in range(0, len(ids), page_size):
+                batch_ids = ids[start:start + page_size]
+                staging.upsert(
+                    ids=batch_ids,
+                    documents=[unique[i][0] for i in batch_ids],
+                    metadatas=[unique[i][1] for i in batch_ids],
+                    embeddings=[unique[i][2] for i in batch_ids]
+                )
+            if staging.count() != len(ids):
+                raise RuntimeError(f"Staging collection has {staging.count()} chunks, expected {len(ids)}")
+        except Exception:
+            client.delete_collection(CHROMA_STAGING_COLLECTION)
+            raise
+
+        # Swap; _recover_compaction completes this if the process dies in between
+        live.modify(name=CHROMA_RETIRED_COLLECTION)
+        staging.modify(name=CHROMA_COLLECTION)
+        client.delete_collection(CHROMA_RETIRED_COLLECTION)
+
+        with _vector_store_lock:
+            _vector_store = None
+        # Chunk IDs may change; rebuild the lexical index from the new collection on next use
+        with _lexical_index_lock:
+            _lexical_index = None
+        context_cache.invalidate()
+
+        size_after = _directory_size(CHROMA_PATH)
+
+    return {
+        "chunks_before": chunks_before,
+        "chunks_after": len(ids),
+        "duplicates_removed": chunks_before - len(ids),
+        "bytes_before": size_before,
+        "bytes_after": size_after
     }
-    
-    try:
-        loader = None
+
+# Supported Code Extensions
+CODE_EXTENSIONS = {
+    ".py", ".js", ".ts", ".jsx", ".tsx", ".java", ".cpp", ".c", ".h", ".cs", 
+    ".go", ".rs", ".php", ".rb", ".swift", ".kt", ".scala", ".html", ".css", 
+    ".sql", ".sh", ".bat", ".json", ".xml", ".yaml", ".yml", ".md"
+}
+
+def _open_source(source):
+    """
+    Returns a binary file object for in-memory bytes or a temp-file path.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    return open(source, "rb")
+
+def _extract_text(filename: str, source) -> str:
+    """
+    Extracts text from raw file content. `source` is either the file's bytes or the
+    path of a private temp file (used for oversized uploads).
+    For tabular data (CSV, XLSX), converts to Markdown table.
+    """
+    filename_lower = filename.lower()
+
+    with _open_source(source) as stream:
         if filename_lower.endswith(".pdf"):
-            loader = PyPDFLoader(file_path)
-            if loader:
-                loaded_docs = loader.load()
-                text = "\n".join([doc.page_content for doc in loaded_docs])
+            from pypdf import PdfReader
+            reader = PdfReader(stream)
+            return "\n".join([page.extract_text() for page in reader.pages])
         elif filename_lower.endswith(".docx"):
-            loader = Docx2txtLoader(file_path)
-            if loader:
-                loaded_docs = loader.load()
-                text = "\n".join([doc.page_content for doc in loaded_docs])
+            import docx2txt
+            return docx2txt.process(stream)
         elif filename_lower.endswith(".txt") or any(filename_lower.endswith(ext) for ext in CODE_EXTENSIONS):
             # Treat code files as text
-            loader = TextLoader(file_path)
-            if loader:
-                loaded_docs = loader.load()
-                text = "\n".join([doc.page_content for doc in loaded_docs])
+            return stream.read().decode("utf-8", errors="replace")
         elif filename_lower.endswith(".csv"):
-            df = pd.read_csv(file_path)
-            text = df.to_csv(index=False)
+            import pandas as pd
+            df = pd.read_csv(stream)
+            return df.to_csv(index=False)
         elif filename_lower.endswith(".xlsx") or filename_lower.endswith(".xls"):
-            df = pd.read_excel(file_path)
-            text = df.to_csv(index=False)
+            import pandas as pd
+            df = pd.read_excel(stream)
+            return df.to_csv(index=False)
         else:
-            raise ValueError(f"Unsupported file type: {file.filename}")
-            
+            raise ValueError(f"Unsupported file type: {filename}")
+
+def _read_upload(file: UploadFile):
+    """
+    Returns the upload's content as bytes, or, above MAX_IN_MEMORY_BYTES, the path of a
+    uniquely named temp file holding it. The caller must delete a returned path.
+    """
+    file.file.seek(0, os.SEEK_END)
+    size = file.file.tell()
+    file.file.seek(0)
+
+    if size <= MAX_IN_MEMORY_BYTES:
+        data = file.file.read()
+        file.file.seek(0)
+        return data
+
+    suffix = os.path.splitext(file.filename)[1]
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix="gradewise_upload_")
+    with os.fdopen(fd, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer)
+    file.file.seek(0)
+    return path
+
+def extract_text_from_file(file: UploadFile) -> str:
+    """
+    Extracts text from an uploaded file (PDF, DOCX, TXT, CSV, XLSX).
+    Parses from memory; only oversized uploads go through a private temp file.
+    """
+    source = _read_upload(file)
+    try:
+        return _extract_text(file.filename, source)
     except Exception as e:
         print(f"Error loading {file.filename}: {e}")
         raise e
     finally:
         # Clean up temp file
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            
-    return text
+        if isinstance(source, str) and os.path.exists(source):
+            os.remove(source)
 
-def ingest_documents(files: List[UploadFile]) -> int:
+# Set in each extraction worker: where it reports the files it starts parsing
+_started_files = None
+
+def _init_extraction_worker(started):
+    global _started_files
+    _started_files = started
+
+def _extract_in_worker(index: int, filename: str, source) -> str:
+    _started_files.put(index)
+    return _extract_text(filename, source)
+
+def _new_extraction_pool(workers: int):
+    """
+    Process pool for CPU-bound file parsing, owned by one extract_texts call so a timeout
+    can kill its workers without touching other requests' files. Returns the pool and the
+    queue on which its workers report each file as they start parsing it.
+    Uses 'spawn' so workers never inherit the server's threads or open Chroma handles.
+    """
+    context = multiprocessing.get_context("spawn")
+    started = context.SimpleQueue()
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_extraction_worker, initargs=(started,))
+    return pool, started
+
+def _kill_extraction_pool(pool: ProcessPoolExecutor):
+    # Running parsers cannot be cancelled: terminate the workers so they stop holding slots
+    processes = list((pool._processes or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.kill()
+
+def _extraction_result(filename: str, future) -> Tuple[str, Optional[str], Optional[str]]:
+    try:
+        return filename, future.result(), None
+    except CancelledError:
+        return filename, None, "Extraction was cancelled"
+    except BrokenProcessPool as e:
+        # A worker died (e.g. out of memory)
+        return filename, None, f"Extraction worker crashed: {e}"
+    except Exception as e:
+        print(f"Error loading {filename}: {e!r}")
+        return filename, None, str(e) or repr(e)
+
+def extract_texts(files: List[UploadFile], timeout: float = EXTRACTION_TIMEOUT_SECONDS) -> List[Tuple[str, Optional[str], Optional[str]]]:
+    """
+    Extracts text from several uploads in parallel across a process pool of this call's own.
+    Returns (filename, text, error) tuples in the original order; exactly one of
+    text/error is set. A file not parsed within `timeout` seconds of its worker starting
+    on it is reported as an error; time spent queued or starting workers does not count.
+    """
+    if len(files) <= 1 or EXTRACTION_WORKERS <= 1:
+        results = []
+        for file in files:
+            try:
+                results.append((file.filename, extract_text_from_file(file), None))
+            except Exception as e:
+                results.append((file.filename, None, str(e) or repr(e)))
+        return results
+
+    sources = [_read_upload(file) for file in files]
+    results = [None] * len(files)
+    workers = min(EXTRACTION_WORKERS, len(files))
+    pool, started = _new_extraction_pool(workers)
+    try:
+        pending = {pool.submit(_extract_in_worker, index, file.filename, source): index
+                   for index, (file, source) in enumerate(zip(files, sources))}
+        start_times = {}
+        while pending:
+            while not started.empty():
+                start_times[started.get()] = time.monotonic()
+            now = time.monotonic()
+            deadlines = [start_times[index] + timeout for index in pending.values() if index in start_times]
+            # Wake up for the next deadline, and regularly to notice files that start
+            done, _ = wait(pending, timeout=max(0.0, min([now + 0.2] + deadlines) - now), return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                results[index] = _extraction_result(files[index].filename, future)
+
+            now = time.monotonic()
+            expired = [future for future, index in pending.items() if index in start_times and now - start_times[index] >= timeout]
+            broken = any(not future.cancelled() and isinstance(future.exception(), BrokenProcessPool) for future in done)
+            if expired or broken:
+                for future in expired:
+                    index = pending.pop(future)
+                    results[index] = (files[index].filename, None, f"Timed out after {timeout:.0f}s")
+                if expired:
+                    print(f"Extraction: {len(expired)} files timed out after {timeout:.0f}s, restarting this upload's workers")
+                # Files the old workers had not finished start over in a fresh pool
+                _kill_extraction_pool(pool)
+                pool, started = _new_extraction_pool(workers)
+                indices = sorted(pending.values())
+                pending = {pool.submit(_extract_in_worker, index, files[index].filename, sources[index]): index for index in indices}
+                for index in indices:
+                    start_times.pop(index, None)
+        return results
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        # Clean up temp files of oversized uploads
+        for source in sources:
+            if isinstance(source, str) and os.path.exists(source):
+                os.remove(source)
+
+def _hash_upload(file: UploadFile) -> str:
+    """
+    SHA-256 of the uploaded file's raw bytes (stream is rewound afterwards).
+    """
+    digest = hashlib.sha256()
+    file.file.seek(0)
+    for block in iter(lambda: file.file.read(1024 * 1024), b""):
+        digest.update(block)
+    file.file.seek(0)
+    return digest.hexdigest()
+
+def ingest_documents(files: List[UploadFile]) -> IngestResponse:
     """
     Ingests uploaded files (PDF, DOCX, TXT, CSV, XLSX) into the vector store.
+    Files whose content hash matches the manifest are skipped without re-extracting;
+    changed files replace their previous chunks.
     """
+    from langchain_core.documents import Document
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    store = embedding_cache.get_store()
     documents = []
+    file_hashes = {}
+    errors = {}
     files_processed = 0
+    files_unchanged = 0
 
+    changed_files = []
     for file in files:
-        try:
-            extracted_text = extract_text_from_file(file)
-            if extracted_text:
-                # Create a Document object. Metadata can be added here if needed.
-                documents.append(Document(page_content=extracted_text, metadata={"source": file.filename}))
-                files_processed += 1
-            else:
-                print(f"Warning: Extracted text was empty for {file.filename}")
-        except Exception as e:
-            print(f"Skipping {file.filename} due to error: {e}")
-
-    if not documents:
-        return 0
-
-    # Split text
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    splits = text_splitter.split_documents(documents)
-
-    # Embed and store in ChromaDB
-    Chroma.from_documents(
-        documents=splits,
-        embedding=get_embedding_function(),
-        persist_directory=CHROMA_PATH
+        file_hash = _hash_upload(file)
+        if store.get_file_hash(file.filename) == file_hash:
+            print(f"Skipping {file.filename}: unchanged since last ingest")
+            files_unchanged += 1
+        else:
+            changed_files.append((file, file_hash))
+
+    # Parse all changed files in parallel
+    extracted = extract_texts([file for file, _ in changed_files])
+
+    for (file, file_hash), (filename, extracted_text, error) in zip(changed_files, extracted):
+        if error:
+            print(f"Skipping {filename} due to error: {error}")
+            errors[filename] = error
+        elif extracted_text:
+            # Create a Document object. Metadata can be added here if needed.
+            documents.append(Document(page_content=extracted_text, metadata={"source": filename}))
+            file_hashes[filename] = file_hash
+            files_processed += 1
+        else:
+            print(f"Warning: Extracted text was empty for {filename}")
+            errors[filename] = "No text could be extracted."
+
+    if documents:
+        # Split text
+        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+        splits = text_splitter.split_documents(documents)
+
+        # Deterministic IDs; identical chunks within one file collapse to a single entry
+        unique_splits = {}
+        for doc in splits:
+            unique_splits.setdefault(chunk_id(doc.metadata["source"], doc.page_content), doc)
+        splits = list(unique_splits.values())
+
+        # Embed and upsert into ChromaDB, replacing any chunks from an older version of each file
+        with _write_lock:
+            for source in file_hashes:
+                _delete_source_chunks(source)
+            get_vector_store().add_documents(splits, ids=list(unique_splits.keys()))
+            _sync_lexical_index(list(unique_splits.keys()), [doc.page_content for doc in splits])
+        # New material can change what is relevant to every assignment
+        context_cache.invalidate()
+
+        # Record in the manifest only once the chunks are stored
+        for source, file_hash in file_hashes.items():
+            chunk_count = sum(1 for doc in splits if doc.metadata["source"] == source)
+            store.record_file(source, file_hash, chunk_count)
+
+    return IngestResponse(
+        status="success",
+        files_processed=files_processed + files_unchanged,
+        files_unchanged=files_unchanged,
+        errors=errors
     )
 
-    return files_processed
+def query_chunks(text: str, rubric: Optional[List[RubricItem]] = None) -> List[str]:
+    """
+    Splits a submission into word windows the embedding model reads in full, keeping at
+    most MAX_QUERY_CHUNKS (evenly spaced) so query cost stays bounded. With
+    RETRIEVAL_RUBRIC_QUERIES each rubric criterion is added as a query too.
+    """
+    words = text.split()
+    windows = [" ".join(words[i:i + QUERY_CHUNK_WORDS]) for i in range(0, len(words), QUERY_CHUNK_WORDS)] or [text]
+    if len(windows) > MAX_QUERY_CHUNKS:
+        step = len(windows) / MAX_QUERY_CHUNKS
+        windows = [windows[int(i * step)] for i in range(MAX_QUERY_CHUNKS)]
+    if rubric and RETRIEVAL_RUBRIC_QUERIES:
+        windows += [f"{item.criteria}: {item.description}" for item in rubric]
+    return windows
 
-def retrieve_context(query: str) -> List[str]:
+def _fuse(rankings: List[List[str]], vectors: dict, k: int, weights: Optional[List[float]] = None) -> List[str]:
     """
-    Retrieves the top 3 relevant document chunks for the given query.
+    Weighted reciprocal-rank fusion of several ranked id lists, then maximal marginal
+    relevance so near-duplicate chunks (overlapping splits, repeated material) are not all kept.
     """
-    vector_store = Chroma(
-        persist_directory=CHROMA_PATH,
-        embedding_function=get_embedding_function()
+    weights = weights or [1.0] * len(rankings)
+    fused = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, chunk in enumerate(ranking):
+            fused[chunk] = fused.get(chunk, 0.0) + weight / (RRF_K + rank + 1)
+    if not fused:
+        return []
+    top = max(fused.values())
+
+    selected = []
+    candidates = sorted(fused, key=fused.get, reverse=True)
+    while candidates and len(selected) < k:
+        def mmr_score(chunk):
+            redundancy = max((embeddings.cosine_similarity(vectors[chunk], vectors[s]) for s in selected), default=0.0)
+            return MMR_LAMBDA * fused[chunk] / top - (1 - MMR_LAMBDA) * redundancy
+        best = max(candidates, key=mmr_score)
+        selected.append(best)
+        candidates.remove(best)
+    return selected
+
+def search(query: str, k: int = 3, rubric: Optional[List[RubricItem]] = None) -> List[str]:
+    """
+    Hybrid search: dense results for each query window (see query_chunks), from one
+    embedding batch and one batched Chroma query, fused with the BM25 ranking of the
+    whole query. Short keyword queries that match the lexical index skip embedding.
+    """
+    lexical = []
+    if HYBRID_RETRIEVAL:
+        lexical = [chunk for chunk, _ in get_lexical_index().search(query, RETRIEVAL_FETCH_K)]
+        # Keyword queries are answered by the chunks that contain the terms, even if fewer than k
+        if lexical and len(lexical_index.tokenize(query)) <= KEYWORD_QUERY_MAX_TERMS:
+            stored = get_vector_store().get(ids=lexical[:k], include=["documents"])
+            documents = dict(zip(stored["ids"], stored["documents"]))
+            return [documents[chunk] for chunk in lexical[:k] if chunk in documents]
+
+    queries = query_chunks(query, rubric) if RETRIEVAL_MULTI_QUERY else [query]
+    query_vectors = get_embedding_function().embed_queries(queries)
+    collection = get_vector_store()._collection
+    result = collection.query(
+        query_embeddings=query_vectors,
+        n_results=RETRIEVAL_FETCH_K,
+        include=["documents", "embeddings"]
     )
-    
-    # Retrieve top 3
-    results = vector_store.similarity_search(query, k=3)
-    
-    return [doc.page_content for doc in results]
+    documents, vectors = {}, {}
+    for ids, docs, embs in zip(result["ids"], result["documents"], result["embeddings"]):
+        for chunk, doc, emb in zip(ids, docs, embs):
+            documents[chunk] = doc
+            vectors[chunk] = list(emb)
+
+    rankings = list(result["ids"])
+    weights = [1.0 / len(queries)] * len(queries)
+    if lexical:
+        # Lexical-only hits still need their stored text and vector for MMR
+        missing = [chunk for chunk in lexical if chunk not in documents]
+        if missing:
+            stored = collection.get(ids=missing, include=["documents", "embeddings"])
+            for chunk, doc, emb in zip(stored["ids"], stored["documents"], stored["embeddings"]):
+                documents[chunk] = doc
+                vectors[chunk] = list(emb)
+        rankings.append([chunk for chunk in lexical if chunk in documents])
+        weights.append(HYBRID_LEXICAL_WEIGHT)
+
+    return [documents[chunk] for chunk in _fuse(rankings, vectors, k, weights)]
+
+def retrieve_context(query: str, rubric: Optional[List[RubricItem]] = None) -> List[str]:
+    """
+    Retrieves the top 3 relevant document chunks for the given query.
+    """
+    return search(query, k=3, rubric=rubric)
+
+async def aretrieve_context(query: str, rubric: Optional[List[RubricItem]] = None) -> List[str]:
+    """
+    Async wrapper around retrieve_context.
+    Chroma and the embedding model are synchronous, so the search runs in a worker
+    thread to keep the event loop free for other requests.
+    """
+    return await asyncio.to_thread(retrieve_context, query, rubric)
+
+def _assignment_query(rubric: List[RubricItem]) -> str:
+    return "\n".join(f"{item.criteria}: {item.description}" for item in rubric)
+
+def get_assignment_context(rubric: List[RubricItem]) -> dict:
+    """
+    The course chunks most relevant to an assignment, searched once per rubric and
+    cached (see context_cache). With CONTEXT_REFINE the chunk embeddings are kept too.
+    """
+    def compute():
+        chunks = search(_assignment_query(rubric), k=ASSIGNMENT_CONTEXT_K)
+        vectors = get_embedding_function().embed_documents(chunks) if CONTEXT_REFINE and chunks else None
+        return {"chunks": chunks, "vectors": vectors}
+
+    if not context_cache.CONTEXT_CACHE_ENABLED:
+        return compute()
+    return context_cache.get_cache().get_or_compute(context_cache.assignment_key(rubric), compute)
+
+def retrieve_assignment_context(submission_text: str, rubric: List[RubricItem], k: int = 3) -> List[str]:
+    """
+    Top k chunks for a submission from its assignment's cached candidates.
+    Without CONTEXT_REFINE this is a cache lookup; with it, the candidates are
+    re-ranked by similarity to the submission.
+    """
+    entry = get_assignment_context(rubric)
+    chunks, vectors = entry["chunks"], entry["vectors"]
+    if not CONTEXT_REFINE or not vectors or len(chunks) <= k:
+        return chunks[:k]
+
+    # Rank the candidates for each query window, then fuse as in search
+    queries = query_chunks(submission_text) if RETRIEVAL_MULTI_QUERY else [submission_text]
+    query_vectors = get_embedding_function().embed_queries(queries)
+    by_index = dict(enumerate(vectors))
+    rankings = [
+        sorted(by_index, key=lambda i: embeddings.cosine_similarity(query_vector, by_index[i]), reverse=True)
+        for query_vector in query_vectors
+    ]
+    return [chunks[i] for i in _fuse(rankings, by_index, k)]
+
+async def aretrieve_assignment_context(submission_text: str, rubric: List[RubricItem], k: int = 3) -> List[str]:
+    """
+    Async wrapper around retrieve_assignment_context (a miss searches Chroma in a worker thread).
+    """
+    return await asyncio.to_thread(retrieve_assignment_context, submission_text, rubric, k)
+
+def retrieve_submission_context(submission_text: str, rubric: List[RubricItem]) -> List[str]:
+    """
+    The context the grading graph retrieves for a submission: a hybrid multi-vector
+    search of the corpus (see search), or with CONTEXT_CACHE_ENABLED the assignment's
+    cached candidates re-ranked against the submission.
+    """
+    if context_cache.CONTEXT_CACHE_ENABLED:
+        return retrieve_assignment_context(submission_text, rubric)
+    return retrieve_context(submission_text, rubric)
+
+async def aretrieve_submission_context(submission_text: str, rubric: List[RubricItem]) -> List[str]:
+    """
+    Async wrapper around retrieve_submission_context (Chroma and the embedding model run in a worker thread).
+    """
+    return await asyncio.to_thread(retrieve_submission_context, submission_text, rubric)
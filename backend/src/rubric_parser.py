@@ -2,10 +2,10 @@ from typing import List
 from fastapi import UploadFile
 from dotenv import load_dotenv
 import os
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
 from backend.src.models import RubricItem
 from backend.src import rag
+from backend.src import llm_cache
+from backend.src import llm_gateway
 import json
 
 # WORKAROUND: Remove NO_PROXY if it causes DNS issues
@@ -14,32 +14,47 @@ if "NO_PROXY" in os.environ:
         # print(f"DEBUG: Removing NO_PROXY to fix DNS...")
         del os.environ["NO_PROXY"]
 
-# Initialize LLM (DeepSeek-V3)
-api_key = os.getenv("DEEPSEEK_API_KEY")
+# Initialize LLM (DeepSeek-V3): the same pooled, rate-limited client as the agent,
+# created on first use so importing the parser does not load the OpenAI SDK
+llm = None
 
-llm = ChatOpenAI(
-    model="deepseek-chat",
-    openai_api_key=api_key,
-    openai_api_base="https://api.deepseek.com",
-    temperature=0
-)
+def get_llm():
+    global llm
+    if llm is None:
+        llm = llm_gateway.get_llm()
+    return llm
 
-def parse_rubric(files: List[UploadFile]) -> List[RubricItem]:
+# Bump when the prompt template changes so stale cached responses are not reused
+RUBRIC_PROMPT_VERSION = "rubric-v1"
+
+def _is_rubric_json(content: str) -> bool:
+    try:
+        return isinstance(json.loads(content).get("items"), list)
+    except (TypeError, ValueError, AttributeError):
+        return False
+
+def parse_rubric(files: List[UploadFile], use_cache: bool = True) -> List[RubricItem]:
     """
     Parses uploaded files (Rubric) into structured RubricItems using an LLM.
     Supports PDF, DOCX, TXT, CSV, XLSX.
+    Identical rubric content is served from the LLM response cache unless use_cache is False.
     """
+    from langchain_core.prompts import ChatPromptTemplate
+
     aggregated_text = ""
+    errors = []
     
-    for file in files:
-        try:
-            text = rag.extract_text_from_file(file)
-            aggregated_text += f"\n--- File: {file.filename} ---\n{text}\n"
-        except Exception as e:
-            print(f"Error extracting text from {file.filename}: {e}")
+    # Files are parsed in parallel; results come back in upload order
+    for filename, text, error in rag.extract_texts(files):
+        if error is not None:
+            print(f"Error extracting text from {filename}: {error}")
+            errors.append(f"{filename}: {error}")
+        else:
+            aggregated_text += f"\n--- File: {filename} ---\n{text}\n"
 
     if not aggregated_text.strip():
-        raise ValueError("No text could be extracted from the uploaded files.")
+        detail = f" Errors: {'; '.join(errors)}" if errors else ""
+        raise ValueError(f"No text could be extracted from the uploaded files.{detail}")
 
     # LLM Extraction Logic
     system_prompt = """You are an expert Rubric Creator and Data Parser.
@@ -69,19 +84,23 @@ def parse_rubric(files: List[UploadFile]) -> List[RubricItem]:
     }}
     """
     
-    human_prompt = f"RUBRIC CONTENT:\n{aggregated_text}"
+    # Passed as a template variable so braces in the rubric text are not parsed as placeholders
+    human_prompt = "RUBRIC CONTENT:\n{aggregated_text}"
     
     prompt = ChatPromptTemplate.from_messages([
         ("system", system_prompt),
         ("human", human_prompt)
     ])
     
-    # Bind JSON mode
-    json_llm = llm.bind(response_format={"type": "json_object"})
-    chain = prompt | json_llm
-    
     try:
-        response = chain.invoke({})
+        messages = prompt.format_messages(aggregated_text=aggregated_text)
+        # Bind JSON mode
+        response = llm_cache.invoke_cached(
+            get_llm(), messages, RUBRIC_PROMPT_VERSION,
+            use_cache=use_cache,
+            validate=_is_rubric_json,
+            response_format={"type": "json_object"}
+        )
         parsed_data = json.loads(response.content)
         items = [RubricItem(**item) for item in parsed_data.get("items", [])]
         return items
@@ -0,0 +1,176 @@
+import os
+import threading
+from typing import List, Optional
+
+# Constants
+# Local tokenizer used to measure prompts. DeepSeek's own tokenizer is not published as a
+# tiktoken encoding; cl100k_base counts within a few percent of it for English and code.
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "cl100k_base")
+# Context window of the grading model and the share reserved for the response
+MODEL_CONTEXT_TOKENS = int(os.getenv("MODEL_CONTEXT_TOKENS", "64000"))
+RESPONSE_RESERVE_TOKENS = int(os.getenv("RESPONSE_RESERVE_TOKENS", "4000"))
+# Tokens for rubric + retrieved context + submission in every prompt (instructions come on top)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "8000"))
+# Share of the budget planned for the rubric. The rubric is never cut: a longer one raises
+# the budget by the difference, within the model's window
+RUBRIC_TOKEN_BUDGET = int(os.getenv("RUBRIC_TOKEN_BUDGET", "1500"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))
+# Used when the tokenizer cannot be loaded (e.g. offline without a cached encoding)
+CHARS_PER_TOKEN = 4
+
+TRUNCATION_MARKER = "... [TRUNCATED]"
+
+_encoding = None
+_encoding_failed = False
+_encoding_lock = threading.Lock()
+
+
+def get_encoding():
+    """
+    The tiktoken encoding, loaded on first use; None if it is unavailable.
+    """
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        with _encoding_lock:
+            if _encoding is None and not _encoding_failed:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+                except Exception as e:
+                    print(f"WARNING: Could not load tokenizer '{TOKENIZER_ENCODING}' ({e}). Estimating {CHARS_PER_TOKEN} chars per token.")
+                    _encoding_failed = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    encoding = get_encoding()
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cuts text to at most max_tokens (marker included), marking the cut.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    return _head(text, max(max_tokens - count_tokens(TRUNCATION_MARKER), 0)) + TRUNCATION_MARKER
+
+
+def _head(text: str, max_tokens: int) -> str:
+    encoding = get_encoding()
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+def pack_prompt(rubric_str: str, context: List[str], submission_text: str,
+                budget: Optional[int] = None) -> dict:
+    """
+    Splits the prompt token budget across the three variable sections, in priority order:
+    1. the rubric, always whole (every item must be graded); beyond RUBRIC_TOKEN_BUDGET
+       the budget grows by the excess, up to the model's window,
+    2. retrieved chunks, whole and in ranked order, while they fit in CONTEXT_TOKEN_BUDGET,
+    3. the submission, which gets everything left (truncated only past that).
+    Returns the packed sections and the tokens each one uses.
+    """
+    window = MODEL_CONTEXT_TOKENS - RESPONSE_RESERVE_TOKENS
+    if budget is None:
+        budget = min(PROMPT_TOKEN_BUDGET, window)
+
+    rubric_tokens = count_tokens(rubric_str)
+    if rubric_tokens > RUBRIC_TOKEN_BUDGET:
+        # Room for the extra rubric comes from the window first, then from context and submission
+        budget = max(budget, min(budget + rubric_tokens - RUBRIC_TOKEN_BUDGET, window))
+        print(f"Prompt budget: rubric uses {rubric_tokens} tokens (RUBRIC_TOKEN_BUDGET {RUBRIC_TOKEN_BUDGET}); "
+              f"kept whole, budget raised to {budget}")
+
+    # Chunks arrive best-first; a chunk that does not fit is dropped rather than cut,
+    # and lower-ranked chunks may still fill the space left
+    context_budget = min(CONTEXT_TOKEN_BUDGET, max(budget - rubric_tokens, 0))
+    chunks = []
+    context_tokens = 0
+    for chunk in context:
+        chunk_tokens = count_tokens(chunk)
+        if context_tokens + chunk_tokens > context_budget:
+            continue
+        chunks.append(chunk)
+        context_tokens += chunk_tokens
+
+    submission_budget = max(budget - rubric_tokens - context_tokens, 0)
+    submission_packed = truncate_to_tokens(submission_text, submission_budget)
+
+    return {
+        "rubric_str": rubric_str,
+        "context_str": "\n\n".join(chunks),
+        "submission_text": submission_packed,
+        "usage": {
+            "budget": budget,
+            "rubric_tokens": rubric_tokens,
+            "context_tokens": context_tokens,
+            "submission_tokens": count_tokens(submission_packed),
+            "context_chunks": len(chunks),
+            "context_chunks_dropped": len(context) - len(chunks),
+            "submission_truncated": submission_packed is not submission_text
+        }
+    }
+
+
+def _token_slices(text: str, max_tokens: int) -> List[str]:
+    """
+    Cuts text into consecutive slices of at most max_tokens that join back to exactly
+    text. Slices are cut on token IDs, moving a cut by a token where it would split a
+    multibyte character across two slices.
+    """
+    encoding = get_encoding()
+    if encoding is None:
+        size = max(max_tokens * CHARS_PER_TOKEN, 1)
+        return [text[start:start + size] for start in range(0, len(text), size)]
+
+    tokens = encoding.encode(text, disallowed_special=())
+    slices = []
+    start = 0
+    while start < len(tokens):
+        end = min(start + max(max_tokens, 1), len(tokens))
+        candidates = list(range(end, start, -1)) + list(range(end + 1, len(tokens) + 1))
+        for end in candidates:
+            try:
+                slices.append(encoding.decode_bytes(tokens[start:end]).decode("utf-8"))
+                break
+            except UnicodeDecodeError:
+                continue
+        start = end
+    return slices
+
+
+def split_to_tokens(text: str, max_tokens: int) -> List[str]:
+    """
+    Splits text into sections of at most max_tokens, breaking between paragraphs
+    (or lines) where possible so each section reads on its own.
+    """
+    sections = []
+    current = []
+    current_tokens = 0
+    for block in text.split("\n\n"):
+        pieces = [block]
+        if count_tokens(block) > max_tokens:
+            pieces = block.split("\n")
+        for piece in pieces:
+            piece_tokens = count_tokens(piece)
+            # A single oversized line is cut into fixed-size slices
+            if piece_tokens > max_tokens:
+                if current:
+                    sections.append("\n\n".join(current))
+                    current, current_tokens = [], 0
+                *slices, piece = _token_slices(piece, max_tokens)
+                sections.extend(slices)
+                piece_tokens = count_tokens(piece)
+            if current and current_tokens + piece_tokens > max_tokens:
+                sections.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        sections.append("\n\n".join(current))
+    return [section for section in sections if section.strip()]
@@ -0,0 +1,66 @@
+import os
+import time
+import asyncio
+from typing import Dict
+from backend.src import rag
+from backend.src import agent
+from backend.src import rubric_parser
+from backend.src import token_budget
+
+# Load the heavy components in the background when the API starts
+WARMUP_ON_STARTUP = os.getenv("GRADEWISE_WARMUP", "true").lower() not in ("0", "false", "no")
+
+# Component name -> load time in seconds, once loaded
+_loaded: Dict[str, float] = {}
+_errors: Dict[str, str] = {}
+_started = False
+
+
+def _load_llm_clients():
+    agent.get_llm()
+    rubric_parser.get_llm()
+
+def _load_embedding_model():
+    # Encode once so the first real query doesn't pay for lazy initialisation
+    rag.get_embedding_function().embed_query("warm-up")
+
+COMPONENTS = {
+    "graph": agent.get_app,
+    "tokenizer": token_budget.get_encoding,
+    "llm_clients": _load_llm_clients,
+    "embedding_model": _load_embedding_model,
+    "vector_store": rag.get_vector_store,
+    "lexical_index": rag.get_lexical_index,
+}
+
+
+def _warm_up_sync():
+    for name, load in COMPONENTS.items():
+        start = time.perf_counter()
+        try:
+            load()
+            _loaded[name] = round(time.perf_counter() - start, 3)
+            print(f"Warm-up: {name} ready in {_loaded[name]:.2f}s")
+        except Exception as e:
+            print(f"Warm-up: failed to load {name}: {e}")
+            _errors[name] = str(e)
+
+
+async def warm_up():
+    """
+    Loads the grading graph, tokenizer, LLM clients, embedding model and vector store in a
+    worker thread so the server can accept requests (and answer /ready) meanwhile.
+    """
+    global _started
+    _started = True
+    await asyncio.to_thread(_warm_up_sync)
+
+
+def status() -> dict:
+    return {
+        "ready": all(name in _loaded for name in COMPONENTS),
+        "warmup_started": _started,
+        "components": {name: name in _loaded for name in COMPONENTS},
+        "load_seconds": dict(_loaded),
+        "errors": dict(_errors)
+    }
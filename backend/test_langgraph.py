@@ -5,6 +5,7 @@ This script verifies the grading workflow with dummy data and mocked RAG retriev
 
 import sys
 import os
+import asyncio
 # Add parent directory to path to allow imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
@@ -57,9 +58,9 @@ DUMMY_CONTEXT = [
 ]
 
 
-def mock_retrieve_context(query: str):
-    """Mock function to replace rag.retrieve_context"""
-    print(f"[MOCK] Retrieving context for query: {query[:50]}...")
+def mock_retrieve_context(submission_text: str, rubric):
+    """Mock function to replace rag.retrieve_submission_context, the graph's retrieval entry point"""
+    print(f"[MOCK] Retrieving context for submission: {submission_text[:50]}...")
     return DUMMY_CONTEXT
 
 
@@ -70,7 +71,7 @@ def main():
     print()
     
     # Mock the RAG retrieval function
-    with patch('backend.src.rag.retrieve_context', side_effect=mock_retrieve_context):
+    with patch('backend.src.rag.retrieve_submission_context', side_effect=mock_retrieve_context):
         print("[*] Test Configuration:")
         print(f"   - Rubric Items: {len(DUMMY_RUBRIC)}")
         print(f"   - Max Possible Score: {sum(item.max_points for item in DUMMY_RUBRIC)}")
@@ -91,7 +92,7 @@ def main():
         
         try:
             # Invoke the workflow
-            result = agent.app.invoke(inputs)
+            result = asyncio.run(agent.app.ainvoke(inputs))
             
             print()
             print("=" * 80)
@@ -0,0 +1,64 @@
+import os
+import sys
+import hashlib
+import math
+from typing import List
+
+import pytest
+
+# Tests never reach a real provider
+os.environ.setdefault("DEEPSEEK_API_KEY", "test")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from langchain_core.embeddings import Embeddings
+from backend.src import rag, context_cache, embedding_cache
+
+
+class BagOfWordsEmbeddings(Embeddings):
+    """
+    Deterministic stand-in for the sentence-transformer: words hashed into a fixed-size
+    vector, so texts sharing vocabulary are close.
+    """
+
+    dimensions = 256
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for word in text.lower().split():
+            bucket = int(hashlib.md5(word.strip(".,:;!?").encode("utf-8")).hexdigest(), 16) % self.dimensions
+            vector[bucket] += 1.0
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(texts)
+
+
+@pytest.fixture
+def vector_store(tmp_path, monkeypatch):
+    """
+    An empty Chroma collection in a temp directory, with bag-of-words embeddings and a
+    temp embedding store.
+    """
+    embedding = BagOfWordsEmbeddings()
+    store = embedding_cache.EmbeddingStore(str(tmp_path / "embedding_cache.sqlite3"))
+    monkeypatch.setattr(embedding_cache, "get_store", lambda: store)
+    monkeypatch.setattr(rag, "CHROMA_PATH", str(tmp_path / "chroma"))
+    monkeypatch.setattr(rag, "get_embedding_function", lambda: embedding)
+    monkeypatch.setattr(rag, "_vector_store", None)
+    monkeypatch.setattr(rag, "_lexical_index", None)
+    context_cache.invalidate()
+    yield rag.get_vector_store()
+    context_cache.invalidate()
+
+
+def add_chunks(store, source: str, texts: List[str]):
+    store.add_texts(texts, metadatas=[{"source": source}] * len(texts), ids=[rag.chunk_id(source, text) for text in texts])
@@ -0,0 +1,36 @@
+import uuid
+
+from backend.src import rag
+from backend.tests.conftest import add_chunks
+from backend.tests.test_retrieval import BIOLOGY, GEOMETRY, PLANT_ESSAY, RUBRIC
+
+
+def test_compaction_keeps_one_copy_of_each_chunk(vector_store):
+    add_chunks(vector_store, "biology.txt", BIOLOGY)
+    add_chunks(vector_store, "tires.txt", GEOMETRY)
+    # Chunks ingested again under random IDs, as before IDs were derived from the content
+    vector_store.add_texts(BIOLOGY[:2], metadatas=[{"source": "biology.txt"}] * 2, ids=[uuid.uuid4().hex for _ in range(2)])
+
+    report = rag.compact_collection(page_size=2)
+
+    assert (report["chunks_before"], report["chunks_after"], report["duplicates_removed"]) == (8, 6, 2)
+    compacted = rag.get_vector_store()
+    assert compacted._collection.name == rag.CHROMA_COLLECTION
+    stored = compacted.get(include=["documents"])
+    assert sorted(stored["documents"]) == sorted(BIOLOGY + GEOMETRY)
+    assert set(stored["ids"]) == {rag.chunk_id(source, text) for source, texts in (("biology.txt", BIOLOGY), ("tires.txt", GEOMETRY)) for text in texts}
+    assert rag.retrieve_context(PLANT_ESSAY, RUBRIC)[0] in BIOLOGY
+
+
+def test_compaction_recovers_from_an_interrupted_swap(vector_store):
+    add_chunks(vector_store, "biology.txt", BIOLOGY)
+    client = vector_store._client
+    # Killed after the live collection was retired, before the staging one took its place
+    vector_store._collection.modify(name=rag.CHROMA_RETIRED_COLLECTION)
+    client.create_collection(rag.CHROMA_STAGING_COLLECTION).add(ids=["partial"], documents=["partial"], embeddings=[[0.0] * 256])
+    rag._vector_store = None
+
+    recovered = rag.get_vector_store()
+
+    assert sorted(recovered.get()["documents"]) == sorted(BIOLOGY)
+    assert rag._collection_names(client) == {rag.CHROMA_COLLECTION}
@@ -0,0 +1,60 @@
+import time
+
+from backend.src import rag, context_cache
+from backend.src.context_cache import AssignmentContextCache
+from backend.tests.conftest import add_chunks
+from backend.tests.test_retrieval import RUBRIC, BIOLOGY, GEOMETRY
+
+
+def test_entries_are_computed_once_until_invalidated():
+    cache = AssignmentContextCache()
+    computed = []
+
+    def compute():
+        computed.append(1)
+        return {"chunks": [len(computed)]}
+
+    assert cache.get_or_compute("rubric", compute) == {"chunks": [1]}
+    assert cache.get_or_compute("rubric", compute) == {"chunks": [1]}
+    cache.invalidate()
+    assert cache.get_or_compute("rubric", compute) == {"chunks": [2]}
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_a_result_computed_across_an_invalidation_is_not_cached():
+    cache = AssignmentContextCache()
+
+    def stale():
+        # The corpus changes while the context is being searched
+        cache.invalidate()
+        return {"chunks": ["stale"]}
+
+    assert cache.get_or_compute("rubric", stale) == {"chunks": ["stale"]}
+    assert cache.get_or_compute("rubric", lambda: {"chunks": ["fresh"]}) == {"chunks": ["fresh"]}
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    cache = AssignmentContextCache(ttl=60)
+    cache.get_or_compute("rubric", lambda: {"chunks": ["old"]})
+
+    later = time.monotonic() + 61
+    monkeypatch.setattr(context_cache.time, "monotonic", lambda: later)
+    assert cache.get_or_compute("rubric", lambda: {"chunks": ["new"]}) == {"chunks": ["new"]}
+
+
+def test_assignment_key_depends_on_the_rubric_only():
+    other = [item.model_copy(update={"max_points": 20}) for item in RUBRIC]
+
+    assert context_cache.assignment_key(RUBRIC) == context_cache.assignment_key(list(RUBRIC))
+    assert context_cache.assignment_key(RUBRIC) != context_cache.assignment_key(other)
+
+
+def test_deleting_a_source_drops_its_cached_context(vector_store, monkeypatch):
+    monkeypatch.setattr(context_cache, "CONTEXT_CACHE_ENABLED", True)
+    add_chunks(vector_store, "biology.txt", BIOLOGY)
+    add_chunks(vector_store, "tires.txt", GEOMETRY)
+    assert set(BIOLOGY) <= set(rag.get_assignment_context(RUBRIC)["chunks"])
+
+    assert rag.delete_source("biology.txt") == len(BIOLOGY)
+
+    assert not set(BIOLOGY) & set(rag.get_assignment_context(RUBRIC)["chunks"])
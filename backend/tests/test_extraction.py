@@ -0,0 +1,36 @@
+import io
+from concurrent.futures import Future
+
+from fastapi import UploadFile
+
+from backend.src import rag
+
+
+def _upload(name: str, content: bytes) -> UploadFile:
+    return UploadFile(file=io.BytesIO(content), filename=name)
+
+
+def test_files_are_extracted_in_upload_order(monkeypatch):
+    monkeypatch.setattr(rag, "EXTRACTION_WORKERS", 2)
+    files = [_upload("a.txt", b"alpha"), _upload("b.exe", b"MZ"), _upload("c.py", b"print('c')")]
+
+    results = rag.extract_texts(files, timeout=60)
+
+    assert results[0] == ("a.txt", "alpha", None)
+    assert results[1][:2] == ("b.exe", None) and "Unsupported file type" in results[1][2]
+    assert results[2] == ("c.py", "print('c')", None)
+
+
+def test_a_cancelled_extraction_is_reported_as_an_error():
+    future = Future()
+    future.cancel()
+
+    assert rag._extraction_result("a.pdf", future) == ("a.pdf", None, "Extraction was cancelled")
+
+
+def test_an_exception_without_a_message_still_reports_an_error():
+    future = Future()
+    future.set_exception(ValueError())
+
+    filename, text, error = rag._extraction_result("a.pdf", future)
+    assert text is None and error
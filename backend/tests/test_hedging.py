@@ -0,0 +1,52 @@
+from backend.src import hedging, llm_gateway
+
+
+def test_budget_allows_one_hedge_per_earned_credit():
+    budget = hedging.HedgeBudget(extra_percent=25)
+
+    for _ in range(3):
+        budget.earn()
+    assert not budget.spend()
+
+    budget.earn()
+    assert budget.spend()
+    assert not budget.spend()
+
+
+def test_budget_credits_are_capped():
+    budget = hedging.HedgeBudget(extra_percent=50, max_credits=2.0)
+    for _ in range(100):
+        budget.earn()
+
+    assert [budget.spend() for _ in range(3)] == [True, True, False]
+
+
+def test_delay_is_the_percentile_of_recent_latencies(monkeypatch):
+    monkeypatch.setattr(hedging, "HEDGE_MIN_SAMPLES", 10)
+    monkeypatch.setattr(hedging, "HEDGE_PERCENTILE", 90)
+    monkeypatch.setattr(hedging, "HEDGE_MIN_DELAY_SECONDS", 0.5)
+    tracker = hedging.LatencyTracker(window=10)
+
+    for seconds in range(1, 10):
+        tracker.record(float(seconds))
+    assert tracker.delay() == hedging.HEDGE_INITIAL_DELAY_SECONDS
+
+    tracker.record(10.0)
+    assert tracker.delay() == 9.0
+    # Only the latest `window` latencies count
+    for _ in range(10):
+        tracker.record(0.1)
+    assert tracker.delay() == 0.5
+
+
+def test_gateway_latencies_are_recorded_for_the_prompt_in_scope(monkeypatch):
+    monkeypatch.setattr(hedging, "_trackers", {})
+    endpoint = llm_gateway.ENDPOINTS["strong"]
+
+    llm_gateway._observe_latency(endpoint, 1.5)
+    assert hedging._trackers == {}
+
+    with hedging.latency_scope("grader-test"):
+        llm_gateway._observe_latency(endpoint, 1.5)
+    tracker = hedging._trackers[f"{endpoint.model}:grader-test"]
+    assert list(tracker._latencies) == [1.5]
@@ -0,0 +1,168 @@
+import asyncio
+
+import pytest
+
+from backend.src import agent, jobs
+from backend.src.models import RubricItem, StudentSubmission, GradeResult
+
+RUBRIC = [RubricItem(criteria="Thesis", max_points=5, description="States a clear thesis.")]
+OPTIONS = {"use_cache": True, "profile": "standard", "criterion_fanout": False, "cascade": False}
+
+
+def _grade(score: float = 4.0) -> GradeResult:
+    return GradeResult(score=score, feedback="Good work.")
+
+
+def _submissions(*texts: str):
+    return [StudentSubmission(student_id=f"s{n}", text=text) for n, text in enumerate(texts)]
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    queue = jobs.JobQueue(str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(jobs, "get_queue", lambda: queue)
+    return queue
+
+
+def test_a_leased_item_is_not_claimed_twice(queue):
+    job_id, _, _ = queue.create(_submissions("first", "second"), RUBRIC, 1, OPTIONS)
+
+    item = queue.claim("w1")
+    assert (item["job_id"], item["position"], item["attempt"]) == (job_id, 0, 1)
+    # The job's one slot is taken until the lease is released or expires
+    assert queue.claim("w2") is None
+
+    assert queue.complete(item, "w1", _grade(), 1.0)
+    assert queue.claim("w2")["position"] == 1
+
+
+def test_an_expired_lease_is_claimed_again(queue, monkeypatch):
+    queue.create(_submissions("essay"), RUBRIC, 1, OPTIONS)
+    monkeypatch.setattr(jobs, "JOB_LEASE_SECONDS", 0.0)
+    stale = queue.claim("w1")
+
+    retried = queue.claim("w2")
+    assert retried["attempt"] == 2
+    # Only the worker holding the lease can record a result
+    assert not queue.complete(stale, "w1", _grade(), 1.0)
+    assert queue.complete(retried, "w2", _grade(), 1.0)
+
+
+def test_an_expired_last_attempt_fails_the_item(queue, monkeypatch):
+    job_id, _, _ = queue.create(_submissions("essay"), RUBRIC, 1, OPTIONS)
+    monkeypatch.setattr(jobs, "JOB_LEASE_SECONDS", 0.0)
+    monkeypatch.setattr(jobs, "JOB_MAX_ATTEMPTS", 1)
+    queue.claim("w1")
+
+    assert queue.claim("w2") is None
+    job, items = queue.get(job_id)
+    assert job["finished"]
+    assert items[0][1] == "failed"
+
+
+def test_a_graded_submission_is_reused_by_later_jobs(queue):
+    queue.create(_submissions("essay"), RUBRIC, 1, OPTIONS)
+    item = queue.claim("w1")
+    queue.complete(item, "w1", _grade(3.0), 1.0)
+
+    _, reused, _ = queue.create(_submissions("essay"), RUBRIC, 1, OPTIONS)
+    assert reused == 1
+    _, reused, _ = queue.create(_submissions("essay"), RUBRIC, 1, {**OPTIONS, "use_cache": False})
+    assert reused == 0
+    _, reused, _ = queue.create(_submissions("essay"), RUBRIC, 1, {**OPTIONS, "profile": "fast"})
+    assert reused == 0
+
+
+def test_a_submission_repeated_within_a_job_is_graded_once(queue):
+    subs = [StudentSubmission(student_id="s1", text="essay")] * 2 + [StudentSubmission(student_id="s2", text="essay")]
+    job_id, _, duplicates = queue.create(subs, RUBRIC, 4, OPTIONS)
+    assert duplicates == 1
+
+    first = queue.claim("w1")
+    other = queue.claim("w2")
+    assert (first["position"], other["position"]) == (0, 2)
+    assert queue.claim("w3") is None
+
+    queue.complete(first, "w1", _grade(2.0), 1.0)
+    queue.complete(other, "w2", _grade(5.0), 1.0)
+    assert queue.finish_if_done(job_id)
+    _, items = queue.get(job_id)
+    assert [(status, attempts) for _, status, attempts, *_ in items] == [("completed", 1), ("completed", 0), ("completed", 1)]
+    assert items[1][3] == items[0][3]
+
+
+def test_purge_rolls_back_on_error(queue, monkeypatch):
+    job_id, _, _ = queue.create(_submissions("essay"), RUBRIC, 1, OPTIONS)
+    queue._conn.execute("UPDATE batch_jobs SET finished_at = 0")
+
+    conn = queue._conn
+
+    class FailingConnection:
+        def execute(self, sql, *args):
+            if sql.startswith("DELETE FROM batch_jobs"):
+                raise RuntimeError("disk I/O error")
+            return conn.execute(sql, *args)
+
+    monkeypatch.setattr(queue, "_conn", FailingConnection())
+    with pytest.raises(RuntimeError):
+        queue.purge()
+    monkeypatch.setattr(queue, "_conn", conn)
+
+    assert not conn.in_transaction
+    assert queue.get(job_id)[1]
+    assert queue.purge() == 1
+
+
+class BlockingApp:
+    """
+    Stands in for the grading graph: blocks until released, then returns a grade.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def ainvoke(self, inputs):
+        self.calls += 1
+        await self.release.wait()
+        return {"grade_result": _grade()}
+
+
+async def _wait_until(condition, timeout: float = 5.0):
+    for _ in range(int(timeout / 0.02)):
+        if await condition():
+            return
+        await asyncio.sleep(0.02)
+    raise AssertionError("condition not met in time")
+
+
+def test_items_interrupted_by_a_shutdown_resume_without_losing_an_attempt(queue, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_WORKERS", 2)
+    monkeypatch.setattr(jobs, "JOB_POLL_SECONDS", 0.02)
+
+    async def scenario():
+        app = BlockingApp()
+        monkeypatch.setattr(agent, "app", app)
+        job = await jobs.create_job(_submissions("first", "second"), RUBRIC, 2)
+
+        async def both_running():
+            return app.calls == 2
+        await _wait_until(both_running)
+        await jobs.stop_workers()
+
+        interrupted = await jobs.get_job(job.job_id)
+        assert [(item.status, item.attempts) for item in interrupted.results] == [("pending", 0), ("pending", 0)]
+
+        app.release.set()
+        jobs.start_workers()
+
+        async def finished():
+            return (await jobs.get_job(job.job_id)).status == "completed"
+        await _wait_until(finished)
+        await jobs.stop_workers()
+
+        done = await jobs.get_job(job.job_id)
+        assert [(item.status, item.attempts) for item in done.results] == [("completed", 1), ("completed", 1)]
+        assert done.completed == 2
+
+    asyncio.run(scenario())
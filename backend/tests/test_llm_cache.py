@@ -0,0 +1,82 @@
+import asyncio
+import threading
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from backend.src import llm_cache
+
+
+class FakeLLM:
+    model_name = "fake-model"
+    temperature = 0.0
+
+    def __init__(self, content: str):
+        self.content = content
+        self.calls = 0
+
+    def bind(self, **kwargs):
+        return self
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        return AIMessage(content=self.content)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = llm_cache.LLMCache(str(tmp_path / "llm_cache.sqlite3"))
+    monkeypatch.setattr(llm_cache, "get_cache", lambda: cache)
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_ENABLED", True)
+    return cache
+
+
+def test_repeated_calls_are_served_from_the_cache(cache):
+    llm = FakeLLM('{"score": 3}')
+    messages = [HumanMessage(content="Grade this.")]
+
+    first = asyncio.run(llm_cache.ainvoke_cached(llm, messages, "v1"))
+    second = asyncio.run(llm_cache.ainvoke_cached(llm, messages, "v1"))
+    other_version = asyncio.run(llm_cache.ainvoke_cached(llm, messages, "v2"))
+
+    assert first.content == second.content == other_version.content == '{"score": 3}'
+    assert second.response_metadata["cache_hit"]
+    assert llm.calls == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_invalid_responses_are_not_cached(cache):
+    llm = FakeLLM("not json")
+    messages = [HumanMessage(content="Grade this.")]
+
+    for _ in range(2):
+        asyncio.run(llm_cache.ainvoke_cached(llm, messages, "v1", validate=lambda content: content.startswith("{")))
+
+    assert llm.calls == 2
+
+
+def test_cache_io_runs_off_the_event_loop(cache, monkeypatch):
+    threads = []
+    get, put = cache.get, cache.put
+    monkeypatch.setattr(cache, "get", lambda key: threads.append(threading.get_ident()) or get(key))
+    monkeypatch.setattr(cache, "put", lambda key, content: threads.append(threading.get_ident()) or put(key, content))
+
+    async def call():
+        await llm_cache.ainvoke_cached(FakeLLM("answer"), [HumanMessage(content="Hi")], "v1")
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(call())
+    assert len(threads) == 2 and loop_thread not in threads
+
+
+def test_cache_hits_are_not_counted_as_llm_calls():
+    from backend.src.agent import _usage
+
+    state = {"llm_calls": 1, "cache_hits": 0}
+    hit = AIMessage(content="{}", response_metadata={"cache_hit": True})
+    miss = AIMessage(content="{}", usage_metadata={"input_tokens": 100, "output_tokens": 20, "total_tokens": 120})
+
+    state.update(_usage(state, hit))
+    assert (state["llm_calls"], state["cache_hits"], state["input_tokens"]) == (1, 1, 0)
+    state.update(_usage(state, miss))
+    assert (state["llm_calls"], state["cache_hits"], state["input_tokens"]) == (2, 1, 100)
@@ -0,0 +1,77 @@
+import pytest
+
+from backend.src import llm_gateway
+from backend.src.llm_gateway import TokenBucket
+
+
+def test_requests_within_capacity_do_not_wait():
+    bucket = TokenBucket(per_minute=600, burst_seconds=6.0)
+
+    assert bucket.capacity == pytest.approx(600 / 66 * 6)
+    assert bucket.reserve(50) == 0.0
+
+
+def test_requests_beyond_capacity_wait_for_the_refill():
+    bucket = TokenBucket(per_minute=60)
+
+    assert bucket.reserve(1) == 0.0
+    assert bucket.reserve(1) == pytest.approx(1.0, abs=0.01)
+    # Callers are served in arrival order: the next one waits behind the previous reservation
+    assert bucket.reserve(1) == pytest.approx(2.0, abs=0.01)
+
+
+def test_min_capacity_fits_one_full_request():
+    bucket = TokenBucket(per_minute=6000, burst_seconds=0.0, min_capacity=5000)
+
+    assert bucket.capacity == 5000
+    assert bucket.reserve(5000) == 0.0
+    assert bucket.reserve(100) == pytest.approx(1.0, abs=0.01)
+
+
+def test_min_capacity_is_capped_at_the_per_minute_limit():
+    bucket = TokenBucket(per_minute=100, min_capacity=5000)
+
+    assert bucket.capacity == 100
+    # A reservation larger than the bucket takes the whole bucket instead of waiting forever
+    assert bucket.reserve(1000) == 0.0
+
+
+def test_adjust_refunds_an_overestimate():
+    bucket = TokenBucket(per_minute=60, min_capacity=10)
+    bucket.reserve(10)
+
+    bucket.adjust(-5)
+    assert bucket.reserve(5) == 0.0
+
+
+def test_drain_slows_every_caller_down():
+    bucket = TokenBucket(per_minute=60, min_capacity=10)
+
+    bucket.drain()
+    assert bucket.reserve(1) == pytest.approx(1.0, abs=0.01)
+
+
+def test_unlimited_bucket_never_waits():
+    bucket = TokenBucket(per_minute=0)
+
+    assert bucket.reserve(10 ** 6) == 0.0
+
+
+@pytest.mark.parametrize("status, retryable", [(429, True), (500, True), (503, True), (400, False), (408, False), (409, False)])
+def test_only_rate_limits_and_server_errors_are_retried(status, retryable):
+    assert llm_gateway._retryable(status) is retryable
+
+
+def test_oversized_reservations_are_logged(capsys):
+    bucket = TokenBucket(per_minute=100)
+
+    bucket.reserve(1000)
+
+    assert "exceeds the bucket" in capsys.readouterr().out
+
+
+def test_cheap_tier_budget_fits_a_full_cascade_grade():
+    from backend.src import agent
+
+    calls_per_grade = agent.CASCADE_SAMPLES + 1
+    assert llm_gateway.ENDPOINTS["cheap"].token_bucket.per_minute >= calls_per_grade * llm_gateway.LLM_MAX_REQUEST_TOKENS
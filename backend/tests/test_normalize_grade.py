@@ -0,0 +1,82 @@
+from backend.src.agent import _normalize_grade
+from backend.src.models import RubricItem
+
+RUBRIC = [
+    RubricItem(criteria="Thesis", max_points=5, description="States a clear thesis."),
+    RubricItem(criteria="Evidence", max_points=10, description="Supports the thesis with evidence."),
+]
+
+
+def test_total_is_the_sum_of_the_criteria():
+    grade = _normalize_grade({
+        "score": 99,
+        "criteria_scores": [
+            {"criteria": "Thesis", "score": 4, "comment": "Thesis is vague."},
+            {"criteria": "Evidence", "score": 10, "comment": ""},
+        ],
+        "critique_points": ["Sharpen the thesis."]
+    }, RUBRIC)
+
+    assert grade["score"] == 14
+    assert grade["missing_criteria"] == []
+    assert grade["critique_points"] == ["Sharpen the thesis."]
+    assert any("Reported total 99" in c for c in grade["local_corrections"])
+
+
+def test_scores_are_clamped_to_the_rubric():
+    grade = _normalize_grade({
+        "criteria_scores": [
+            {"criteria": "Thesis", "score": 7, "comment": ""},
+            {"criteria": "Evidence", "score": -2, "comment": "No sources."},
+        ]
+    }, RUBRIC)
+
+    assert [c["score"] for c in grade["criteria_scores"]] == [5.0, 0.0]
+    assert grade["score"] == 5.0
+    assert len([c for c in grade["local_corrections"] if "clamped" in c]) == 2
+
+
+def test_criteria_are_matched_by_name_ignoring_case_and_order():
+    grade = _normalize_grade({
+        "criteria_scores": [
+            {"criteria": " evidence ", "score": 8, "comment": ""},
+            {"criteria": "THESIS", "score": 3, "comment": ""},
+        ]
+    }, RUBRIC)
+
+    assert [(c["criteria"], c["score"]) for c in grade["criteria_scores"]] == [("Thesis", 3.0), ("Evidence", 8.0)]
+
+
+def test_renamed_criteria_are_matched_by_position():
+    grade = _normalize_grade({
+        "criteria_scores": [
+            {"criteria": "Clear thesis", "score": 2, "comment": ""},
+            {"criteria": "Use of evidence", "score": 6, "comment": ""},
+        ]
+    }, RUBRIC)
+
+    assert [(c["criteria"], c["score"]) for c in grade["criteria_scores"]] == [("Thesis", 2.0), ("Evidence", 6.0)]
+    assert grade["missing_criteria"] == []
+
+
+def test_unscored_criteria_are_left_for_the_judge():
+    grade = _normalize_grade({
+        "criteria_scores": [
+            {"criteria": "Thesis", "score": "n/a", "comment": ""},
+        ]
+    }, RUBRIC)
+
+    assert grade["missing_criteria"] == ["Thesis", "Evidence"]
+    assert grade["criteria_scores"] == []
+
+
+def test_critique_points_are_filled_in_from_comments():
+    grade = _normalize_grade({
+        "criteria_scores": [
+            {"criteria": "Thesis", "score": 5, "comment": "Clear."},
+            {"criteria": "Evidence", "score": 6, "comment": "Cite the sources."},
+        ]
+    }, RUBRIC)
+
+    assert grade["critique_points"] == ["Evidence: Cite the sources."]
+    assert grade["rubric_performance"]["Evidence"] == "6/10 - Cite the sources."
@@ -0,0 +1,47 @@
+from backend.src.agent import check_validation
+from backend.src.models import RubricItem
+
+RUBRIC = [RubricItem(criteria="Thesis", max_points=5, description="States a clear thesis.")]
+
+
+def _rejected(**grade_data) -> dict:
+    return {
+        "rubric": RUBRIC,
+        "is_valid": False,
+        "revision_number": 1,
+        "grade_data": {"critique_points": [], "missing_criteria": [], **grade_data}
+    }
+
+
+def test_an_inconsistent_grade_is_repaired():
+    assert check_validation(_rejected()) == "repair_grade"
+
+
+def test_a_grade_missing_criteria_is_graded_again():
+    assert check_validation(_rejected(missing_criteria=["Thesis"])) == "grade_submission"
+    assert check_validation({**_rejected(missing_criteria=["Thesis"]), "profile": "fast"}) == "grade_fast"
+
+
+def test_a_rejected_repair_is_graded_again():
+    assert check_validation({**_rejected(), "repair_attempted": True}) == "grade_submission"
+
+
+def test_a_repaired_fast_grade_gets_new_feedback(monkeypatch):
+    import asyncio
+    import json
+    from langchain_core.messages import AIMessage
+    from backend.src import agent, llm_cache
+
+    repaired = {"criteria_scores": [{"criteria": "Thesis", "score": 2, "comment": "Vague."}], "critique_points": ["Vague."]}
+
+    async def fake_ainvoke_cached(*args, **kwargs):
+        return AIMessage(content=json.dumps(repaired))
+
+    monkeypatch.setattr(llm_cache, "ainvoke_cached", fake_ainvoke_cached)
+    monkeypatch.setattr(agent, "get_llm", lambda tier="strong": None)
+    state = {**_rejected(score=5.0, criteria_scores=[], feedback="Excellent, nothing to improve!"), "profile": "fast"}
+
+    update = asyncio.run(agent.repair_grade(state))
+
+    assert "feedback" not in update["grade_data"]
+    assert check_validation({**state, **update, "is_valid": True}) == "generate_feedback"
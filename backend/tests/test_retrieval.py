@@ -0,0 +1,44 @@
+import pytest
+
+from backend.src import rag, context_cache
+from backend.src.models import RubricItem
+from backend.tests.conftest import add_chunks
+
+RUBRIC = [RubricItem(criteria="Understanding", max_points=10, description="Explains the concepts from the course materials accurately.")]
+
+BIOLOGY = [
+    "Photosynthesis converts light energy into chemical energy stored in glucose inside the chloroplast.",
+    "Chlorophyll in plant leaves absorbs red and blue light and reflects green light.",
+    "Plants take in carbon dioxide through stomata and release oxygen during photosynthesis.",
+]
+GEOMETRY = [
+    "The volume of a tire is computed from its width, aspect ratio and wheel diameter.",
+    "Use math.pi and the tire width in millimeters when computing the volume in liters.",
+    "Round the computed tire volume to two decimal places before printing it.",
+]
+
+PLANT_ESSAY = "Plants use chlorophyll in their leaves to absorb light, and photosynthesis turns carbon dioxide into glucose and oxygen."
+TIRE_ESSAY = "My program asks for the tire width, aspect ratio and wheel diameter, then computes the tire volume with math.pi."
+
+
+@pytest.mark.parametrize("cache_enabled", [False, True])
+def test_submissions_on_different_topics_get_different_context(vector_store, monkeypatch, cache_enabled):
+    monkeypatch.setattr(context_cache, "CONTEXT_CACHE_ENABLED", cache_enabled)
+    add_chunks(vector_store, "biology.txt", BIOLOGY)
+    add_chunks(vector_store, "tires.txt", GEOMETRY)
+
+    plant_context = rag.retrieve_submission_context(PLANT_ESSAY, RUBRIC)
+    tire_context = rag.retrieve_submission_context(TIRE_ESSAY, RUBRIC)
+
+    assert plant_context != tire_context
+    assert plant_context[0] in BIOLOGY
+    assert tire_context[0] in GEOMETRY
+
+
+def test_cached_context_without_refine_ignores_the_submission(vector_store, monkeypatch):
+    monkeypatch.setattr(context_cache, "CONTEXT_CACHE_ENABLED", True)
+    monkeypatch.setattr(rag, "CONTEXT_REFINE", False)
+    add_chunks(vector_store, "biology.txt", BIOLOGY)
+    add_chunks(vector_store, "tires.txt", GEOMETRY)
+
+    assert rag.retrieve_submission_context(PLANT_ESSAY, RUBRIC) == rag.retrieve_submission_context(TIRE_ESSAY, RUBRIC)
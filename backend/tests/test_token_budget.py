@@ -0,0 +1,44 @@
+from backend.src import token_budget
+
+
+def _rubric(items: int) -> str:
+    return "\n".join(f"- Criterion {n} (Max Points: 5): Explains concept number {n} accurately and with examples." for n in range(items))
+
+
+def test_a_rubric_over_its_share_is_kept_whole(monkeypatch):
+    monkeypatch.setattr(token_budget, "RUBRIC_TOKEN_BUDGET", 100)
+    rubric = _rubric(40)
+    submission = "word " * 5000
+
+    packed = token_budget.pack_prompt(rubric, ["A retrieved chunk."], submission, budget=2000)
+    usage = packed["usage"]
+
+    assert packed["rubric_str"] == rubric
+    # The budget grew by the rubric's excess, so the submission keeps its room
+    rubric_tokens = token_budget.count_tokens(rubric)
+    assert usage["budget"] == 2000 + rubric_tokens - 100
+    assert usage["submission_tokens"] >= 2000 - 100 - usage["context_tokens"] - 5
+
+
+def test_the_rubric_is_kept_whole_even_past_the_model_window(monkeypatch):
+    monkeypatch.setattr(token_budget, "RUBRIC_TOKEN_BUDGET", 10)
+    monkeypatch.setattr(token_budget, "MODEL_CONTEXT_TOKENS", 600)
+    monkeypatch.setattr(token_budget, "RESPONSE_RESERVE_TOKENS", 100)
+    rubric = _rubric(40)
+
+    packed = token_budget.pack_prompt(rubric, ["A retrieved chunk."], "word " * 1000)
+
+    assert packed["rubric_str"] == rubric
+    assert packed["usage"]["context_tokens"] == 0
+    assert packed["usage"]["submission_truncated"]
+
+
+def test_context_chunks_are_kept_whole_in_ranked_order(monkeypatch):
+    monkeypatch.setattr(token_budget, "CONTEXT_TOKEN_BUDGET", 30)
+    chunks = ["first " * 10, "second " * 30, "third " * 10]
+
+    packed = token_budget.pack_prompt("- Item (Max Points: 5): d", chunks, "Short essay.", budget=1000)
+
+    assert packed["context_str"] == "\n\n".join([chunks[0], chunks[2]])
+    assert packed["usage"]["context_chunks_dropped"] == 1
+    assert not packed["usage"]["submission_truncated"]
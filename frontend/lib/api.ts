@@ -16,12 +16,21 @@ export interface RubricItem {
     description: string;
 }
 
+export interface CriterionScore {
+    criteria: string;
+    score: number;
+    max_points: number;
+    comment: string;
+}
+
 export interface GradeResult {
     score: number;
     feedback: string;
     citations: string[];
     thinking_process: string[];
     confidence_score: number;
+    criteria_scores: CriterionScore[];
+    metrics: Record<string, number | string>;
 }
 
 export const GradeWiseAPI = {